@@ -1,8 +1,21 @@
+import os
+import logging
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from bson.objectid import ObjectId
 from datetime import datetime, timedelta
-from models import get_all_collections
+from http_cache import conditional_response
+from cache import response_cache, invalidate_tags
+from models import User, get_all_collections, find_profiles_by_user_ids, user_cache
+from passwords import metrics as password_metrics
+from pagination import InvalidCursor, paginate, parse_page_size, page_response
+from resilience import db_guard, mongo_breaker
+from settings import settings_store, clean_settings
+from rollups import GRANULARITIES, bucket_start, exact_granularity, read_rollups, period_label
+from ranking import refresh_score
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
 
 # ✅ CORREÇÃO: Remover url_prefix daqui
 admin_api_routes = Blueprint('admin_api', __name__)
@@ -11,79 +24,126 @@ def is_admin():
     """Verificar se o usuário atual é administrador"""
     return current_user.is_authenticated and current_user.user_type == 'admin'
 
+def _facet_count(facet_result):
+    """Extrai o valor de um estágio $count dentro de um $facet"""
+    return facet_result[0]['count'] if facet_result else 0
+
+# Prazo dos relatórios (agregações sobre períodos longos)
+REPORT_DEADLINE_MS = 8000
+
+# Validade dos resultados em response_cache (segundos). As escritas invalidam
+# por tag; o TTL limita o atraso do que não passa por estas rotas
+STATS_CACHE_TTL = int(os.environ.get('ADMIN_STATS_CACHE_TTL', 30))
+REPORTS_CACHE_TTL = int(os.environ.get('ADMIN_REPORTS_CACHE_TTL', 300))
+
+# Ordem estável das listagens paginadas (servida pelos índices *_created_at_id)
+LISTING_SORT = [('created_at', -1), ('_id', -1)]
+
+@response_cache.cached('admin_stats', ttl=STATS_CACHE_TTL, tags=('users', 'services', 'professionals'))
+def build_admin_stats():
+    """Estatísticas gerais (em cache; invalidadas pelas tags users/services/professionals)"""
+    # Leituras pesadas: perfil analytics (secundários, pool próprio)
+    collections = get_all_collections('analytics')
+    
+    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    round_trips = 0
+    
+    # Usuários: total, por tipo e novos este mês numa única agregação
+    total_users = total_professionals = total_clients = new_users_month = 0
+    if collections['users'] is not None:
+        users_facets = next(collections['users'].aggregate([
+            {
+                '$facet': {
+                    'total': [{'$count': 'count'}],
+                    'by_type': [{'$group': {'_id': '$user_type', 'count': {'$sum': 1}}}],
+                    'month': [
+                        {'$match': {'created_at': {'$gte': current_month}}},
+                        {'$count': 'count'}
+                    ]
+                }
+            }
+        ]))
+        round_trips += 1
+        
+        by_type = {item['_id']: item['count'] for item in users_facets['by_type']}
+        total_users = _facet_count(users_facets['total'])
+        total_professionals = by_type.get('professional', 0)
+        total_clients = by_type.get('client', 0)
+        new_users_month = _facet_count(users_facets['month'])
+    
+    # Serviços: contagem e receita por status, e serviços deste mês
+    total_services = active_services = completed_services = services_month = 0
+    total_revenue = 0
+    if collections['services'] is not None:
+        services_facets = next(collections['services'].aggregate([
+            {
+                '$facet': {
+                    'by_status': [
+                        {
+                            '$group': {
+                                '_id': '$status',
+                                'count': {'$sum': 1},
+                                'revenue': {'$sum': {'$ifNull': ['$price', 0]}}
+                            }
+                        }
+                    ],
+                    'month': [
+                        {'$match': {'created_at': {'$gte': current_month}}},
+                        {'$count': 'count'}
+                    ]
+                }
+            }
+        ]))
+        round_trips += 1
+        
+        by_status = {item['_id']: item for item in services_facets['by_status']}
+        total_services = sum(item['count'] for item in by_status.values())
+        completed_services = by_status.get('completed', {}).get('count', 0)
+        cancelled_services = by_status.get('cancelled', {}).get('count', 0)
+        # Serviços ativos (não concluídos ou cancelados)
+        active_services = total_services - completed_services - cancelled_services
+        # Receita total (soma de todos os serviços concluídos)
+        total_revenue = by_status.get('completed', {}).get('revenue', 0)
+        services_month = _facet_count(services_facets['month'])
+    
+    # Verificações pendentes (profissionais não verificados)
+    pending_verifications = 0
+    if collections['professionals'] is not None:
+        pending_verifications = collections['professionals'].count_documents({'is_verified': False})
+        round_trips += 1
+    
+    # Total de reports (implementação básica)
+    total_reports = 0  # Será implementado quando tiver collection de reports
+    
+    logger.info(f"build_admin_stats: {round_trips} round trips ao MongoDB")
+    
+    stats = {
+        'totalUsers': total_users,
+        'totalProfessionals': total_professionals,
+        'totalClients': total_clients,
+        'totalServices': total_services,
+        'activeServices': active_services,
+        'completedServices': completed_services,
+        'pendingVerifications': pending_verifications,
+        'totalReports': total_reports,
+        'totalRevenue': total_revenue,
+        'newUsersMonth': new_users_month,
+        'servicesMonth': services_month
+    }
+    
+    return stats
+
 @admin_api_routes.route('/stats')
 @login_required
+@conditional_response
+@db_guard()
 def api_admin_stats():
     """Obter estatísticas gerais da plataforma"""
     if not is_admin():
         return jsonify({'error': 'Acesso não autorizado'}), 403
     
-    collections = get_all_collections()
-    
     try:
-        # Total de usuários
-        total_users = collections['users'].count_documents({}) if collections['users'] else 0
-        
-        # Total de profissionais
-        total_professionals = collections['users'].count_documents({'user_type': 'professional'}) if collections['users'] else 0
-        
-        # Total de clientes
-        total_clients = collections['users'].count_documents({'user_type': 'client'}) if collections['users'] else 0
-        
-        # Total de serviços
-        total_services = collections['services'].count_documents({}) if collections['services'] else 0
-        
-        # Serviços ativos (não concluídos ou cancelados)
-        active_services = collections['services'].count_documents({
-            'status': {'$nin': ['completed', 'cancelled']}
-        }) if collections['services'] else 0
-        
-        # Serviços concluídos
-        completed_services = collections['services'].count_documents({
-            'status': 'completed'
-        }) if collections['services'] else 0
-        
-        # Verificações pendentes (profissionais não verificados)
-        pending_verifications = collections['professionals'].count_documents({
-            'is_verified': False
-        }) if collections['professionals'] else 0
-        
-        # Total de reports (implementação básica)
-        total_reports = 0  # Será implementado quando tiver collection de reports
-        
-        # Receita total (soma de todos os serviços concluídos)
-        total_revenue = 0
-        if collections['services']:
-            completed_services_list = collections['services'].find({'status': 'completed'})
-            for service in completed_services_list:
-                total_revenue += service.get('price', 0)
-        
-        # Novos usuários este mês
-        current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        new_users_month = collections['users'].count_documents({
-            'created_at': {'$gte': current_month}
-        }) if collections['users'] else 0
-        
-        # Serviços este mês
-        services_month = collections['services'].count_documents({
-            'created_at': {'$gte': current_month}
-        }) if collections['services'] else 0
-        
-        stats = {
-            'totalUsers': total_users,
-            'totalProfessionals': total_professionals,
-            'totalClients': total_clients,
-            'totalServices': total_services,
-            'activeServices': active_services,
-            'completedServices': completed_services,
-            'pendingVerifications': pending_verifications,
-            'totalReports': total_reports,
-            'totalRevenue': total_revenue,
-            'newUsersMonth': new_users_month,
-            'servicesMonth': services_month
-        }
-        
-        return jsonify({'success': True, 'stats': stats})
+        return jsonify({'success': True, 'stats': build_admin_stats()})
         
     except Exception as e:
         print(f"Erro em api_admin_stats: {e}")
@@ -91,18 +151,40 @@ def api_admin_stats():
 
 @admin_api_routes.route('/users')
 @login_required
+@conditional_response
+@db_guard()
 def api_admin_users():
-    """Obter lista de usuários para gestão"""
+    """Obter lista de usuários para gestão
+
+    Paginação por cursor: ?limit=&cursor=&user_type=. O cursor da próxima
+    página vem no cabeçalho X-Next-Cursor (ausente na última página).
+    """
     if not is_admin():
         return jsonify({'error': 'Acesso não autorizado'}), 403
     
     collections = get_all_collections()
+    page_size = parse_page_size(request.args.get('limit'), default=20)
+    
+    query = {}
+    if request.args.get('user_type'):
+        query['user_type'] = request.args['user_type']
     
     try:
         users_list = []
-        if collections['users']:
-            # Buscar últimos 20 usuários
-            users_data = list(collections['users'].find().sort('created_at', -1).limit(20))
+        next_cursor = None
+        if collections['users'] is not None:
+            users_data, next_cursor = paginate(
+                collections['users'], query, LISTING_SORT, page_size,
+                cursor=request.args.get('cursor'),
+                projection={'password_hash': 0}
+            )
+            
+            # Perfis profissionais de toda a página numa única query
+            professionals_by_user = find_profiles_by_user_ids(
+                collections['professionals'],
+                [user['_id'] for user in users_data if user.get('user_type') == 'professional'],
+                {'full_name': 1, 'is_verified': 1}
+            )
             
             for user in users_data:
                 user_info = {
@@ -116,54 +198,75 @@ def api_admin_users():
                 }
                 
                 # Para profissionais, verificar status de verificação
-                if user['user_type'] == 'professional' and collections['professionals']:
-                    professional_data = collections['professionals'].find_one({'user_id': user['_id']})
-                    if professional_data:
-                        user_info['full_name'] = professional_data.get('full_name', user_info['full_name'])
-                        if not professional_data.get('is_verified', False):
-                            user_info['status'] = 'pending'
+                professional_data = professionals_by_user.get(user['_id'])
+                if professional_data:
+                    user_info['full_name'] = professional_data.get('full_name', user_info['full_name'])
+                    if not professional_data.get('is_verified', False):
+                        user_info['status'] = 'pending'
                 
                 users_list.append(user_info)
         
-        return jsonify(users_list)
+        return page_response(users_list, next_cursor)
         
+    except InvalidCursor:
+        return jsonify({'error': 'Cursor inválido'}), 400
     except Exception as e:
         print(f"Erro em api_admin_users: {e}")
         return jsonify({'error': 'Erro ao carregar usuários'}), 500
 
 @admin_api_routes.route('/services')
 @login_required
+@conditional_response
+@db_guard()
 def api_admin_services():
-    """Obter lista de serviços para gestão"""
+    """Obter lista de serviços para gestão
+
+    Paginação por cursor: ?limit=&cursor=&status=. O cursor da próxima
+    página vem no cabeçalho X-Next-Cursor (ausente na última página).
+    """
     if not is_admin():
         return jsonify({'error': 'Acesso não autorizado'}), 403
     
     collections = get_all_collections()
+    page_size = parse_page_size(request.args.get('limit'), default=15)
+    
+    query = {}
+    if request.args.get('status'):
+        query['status'] = request.args['status']
     
     try:
         services_list = []
-        if collections['services']:
-            # Buscar últimos 15 serviços
-            services_data = list(collections['services'].find().sort('created_at', -1).limit(15))
+        next_cursor = None
+        if collections['services'] is not None:
+            services_data, next_cursor = paginate(
+                collections['services'], query, LISTING_SORT, page_size,
+                cursor=request.args.get('cursor')
+            )
+            
+            # Nomes de profissionais e clientes: uma query por collection
+            professionals_by_user = find_profiles_by_user_ids(
+                collections['professionals'],
+                [service.get('professional_id') for service in services_data],
+                {'full_name': 1}
+            )
+            clients_by_user = find_profiles_by_user_ids(
+                collections['clients'],
+                [service.get('client_id') for service in services_data],
+                {'full_name': 1}
+            )
             
             for service in services_data:
-                # Buscar nome do profissional
+                # Nome do profissional
                 professional_name = 'N/A'
-                if collections['professionals'] and 'professional_id' in service:
-                    professional_data = collections['professionals'].find_one({
-                        'user_id': service['professional_id']
-                    })
-                    if professional_data:
-                        professional_name = professional_data.get('full_name', 'Profissional')
+                professional_data = professionals_by_user.get(service.get('professional_id'))
+                if professional_data:
+                    professional_name = professional_data.get('full_name', 'Profissional')
                 
-                # Buscar nome do cliente
+                # Nome do cliente
                 client_name = 'N/A'
-                if collections['clients'] and 'client_id' in service:
-                    client_data = collections['clients'].find_one({
-                        'user_id': service['client_id']
-                    })
-                    if client_data:
-                        client_name = client_data.get('full_name', 'Cliente')
+                client_data = clients_by_user.get(service.get('client_id'))
+                if client_data:
+                    client_name = client_data.get('full_name', 'Cliente')
                 
                 services_list.append({
                     'id': str(service['_id']),
@@ -176,14 +279,18 @@ def api_admin_services():
                     'description': service.get('description', '')
                 })
         
-        return jsonify(services_list)
+        return page_response(services_list, next_cursor)
         
+    except InvalidCursor:
+        return jsonify({'error': 'Cursor inválido'}), 400
     except Exception as e:
         print(f"Erro em api_admin_services: {e}")
         return jsonify({'error': 'Erro ao carregar serviços'}), 500
 
 @admin_api_routes.route('/activities')
 @login_required
+@conditional_response
+@db_guard(fallback=lambda: jsonify(get_fallback_activities()))
 def api_admin_activities():
     """Obter atividades recentes da plataforma"""
     if not is_admin():
@@ -195,7 +302,7 @@ def api_admin_activities():
         activities_list = []
         
         # Atividades de novos usuários (últimas 24 horas)
-        if collections['users']:
+        if collections['users'] is not None:
             last_24h = datetime.utcnow() - timedelta(hours=24)
             new_users = list(collections['users'].find({
                 'created_at': {'$gte': last_24h}
@@ -212,7 +319,7 @@ def api_admin_activities():
                 })
         
         # Atividades de serviços concluídos (últimas 24 horas)
-        if collections['services']:
+        if collections['services'] is not None:
             completed_services = list(collections['services'].find({
                 'status': 'completed',
                 'completed_at': {'$gte': datetime.utcnow() - timedelta(hours=24)}
@@ -273,6 +380,7 @@ def get_fallback_activities():
 
 @admin_api_routes.route('/system-status')
 @login_required
+@conditional_response
 def api_admin_system_status():
     """Obter status do sistema"""
     if not is_admin():
@@ -295,12 +403,35 @@ def api_admin_system_status():
         print(f"Erro em api_admin_system_status: {e}")
         return jsonify({'error': 'Erro ao verificar status do sistema'}), 500
 
+@admin_api_routes.route('/metrics')
+@login_required
+def api_admin_metrics():
+    """Métricas internas do processo atual (caches)"""
+    if not is_admin():
+        return jsonify({'error': 'Acesso não autorizado'}), 403
+    
+    return jsonify({
+        'success': True,
+        'metrics': {
+            'caches': {
+                'users': user_cache.metrics(),
+                'responses': response_cache.metrics()
+            },
+            'circuit_breakers': {
+                'mongodb': mongo_breaker.metrics()
+            },
+            'password_hashing': password_metrics()
+        }
+    })
+
 # =============================================================================
 # CONFIGURAÇÕES DO SISTEMA - DADOS REAIS
 # =============================================================================
 
 @admin_api_routes.route('/settings')
 @login_required
+@conditional_response
+@db_guard()
 def api_admin_settings():
     """Obter configurações do sistema"""
     if not is_admin():
@@ -309,33 +440,12 @@ def api_admin_settings():
     try:
         collections = get_all_collections()
         
-        # Buscar configurações do MongoDB
-        settings_data = {}
-        if collections.get('settings'):
-            settings_data = collections['settings'].find_one({}) or {}
-        
-        # Valores padrão
-        default_settings = {
-            'siteName': 'TxunaJob',
-            'siteDescription': 'Plataforma de serviços profissionais em Moçambique',
-            'adminEmail': 'admin@txunajob.com',
-            'comissionRate': 15,
-            'maxServices': 10,
-            'autoApprove': False,
-            'passwordMinLength': 8,
-            'maxLoginAttempts': 5,
-            'sessionTimeout': 120,
-            'emailNotifications': True,
-            'pushNotifications': True,
-            'smsNotifications': False,
-            'maintenanceMode': False,
-            'maintenanceMessage': 'Sistema em manutenção. Volte em breve!'
-        }
-        
-        # Mesclar configurações (DB tem prioridade)
-        final_settings = {**default_settings, **settings_data}
+        # O painel mostra sempre a versão mais recente (uma leitura da versão por _id)
+        if collections['settings'] is not None:
+            settings_store.refresh(collections['settings'])
         
-        return jsonify({'success': True, 'settings': final_settings})
+        snapshot = settings_store.snapshot()
+        return jsonify({'success': True, 'settings': snapshot['settings'], 'version': snapshot['version']})
         
     except Exception as e:
         print(f"Erro em api_admin_settings: {e}")
@@ -343,33 +453,30 @@ def api_admin_settings():
 
 @admin_api_routes.route('/settings/save', methods=['POST'])
 @login_required
+@db_guard()
 def api_save_settings():
-    """Salvar configurações do sistema"""
+    """Salvar configurações do sistema (os workers aplicam a nova versão em até SETTINGS_POLL_SECONDS)"""
     if not is_admin():
         return jsonify({'error': 'Acesso não autorizado'}), 403
     
     try:
-        settings_data = request.get_json()
+        settings_data = request.get_json(silent=True)
         if not settings_data:
             return jsonify({'error': 'Dados de configuração inválidos'}), 400
         
-        collections = get_all_collections()
+        try:
+            settings_data = clean_settings(settings_data)
+        except ValueError as e:
+            return jsonify({'error': f'Configuração inválida - {e}'}), 400
         
-        # Salvar no MongoDB
-        if collections.get('settings'):
-            result = collections['settings'].update_one(
-                {},
-                {'$set': settings_data},
-                upsert=True
-            )
-            
-            if result.acknowledged:
-                return jsonify({'success': True, 'message': 'Configurações salvas com sucesso'})
-            else:
-                return jsonify({'error': 'Erro ao salvar no banco de dados'}), 500
-        else:
+        collections = get_all_collections()
+        if collections['settings'] is None:
             return jsonify({'error': 'Collection de configurações não disponível'}), 500
         
+        version = settings_store.save(collections['settings'], settings_data, updated_by=str(current_user.id))
+        logger.info(f"Configurações salvas por {current_user.username}: versão {version}")
+        return jsonify({'success': True, 'message': 'Configurações salvas com sucesso', 'version': version})
+        
     except Exception as e:
         print(f"Erro em api_save_settings: {e}")
         return jsonify({'error': 'Erro ao salvar configurações'}), 500
@@ -380,6 +487,7 @@ def api_save_settings():
 
 @admin_api_routes.route('/users/<user_id>/verify', methods=['POST'])
 @login_required
+@db_guard()
 def api_verify_user(user_id):
     """Verificar um profissional"""
     if not is_admin():
@@ -407,6 +515,9 @@ def api_verify_user(user_id):
         )
         
         if result.modified_count == 1:
+            # is_verified entra no score
+            refresh_score(collections['professionals'], ObjectId(user_id))
+            invalidate_tags('professionals')
             return jsonify({'success': True, 'message': 'Profissional verificado com sucesso'})
         else:
             return jsonify({'error': 'Profissional não encontrado'}), 404
@@ -417,6 +528,7 @@ def api_verify_user(user_id):
 
 @admin_api_routes.route('/users/<user_id>/reject', methods=['POST'])
 @login_required
+@db_guard()
 def api_reject_user(user_id):
     """Rejeitar verificação de profissional"""
     if not is_admin():
@@ -438,6 +550,7 @@ def api_reject_user(user_id):
         )
         
         if result.modified_count == 1:
+            invalidate_tags('professionals')
             return jsonify({'success': True, 'message': 'Verificação rejeitada'})
         else:
             return jsonify({'error': 'Profissional não encontrado'}), 404
@@ -448,6 +561,7 @@ def api_reject_user(user_id):
 
 @admin_api_routes.route('/users/<user_id>/suspend', methods=['POST'])
 @login_required
+@db_guard()
 def api_suspend_user(user_id):
     """Suspender um usuário"""
     if not is_admin():
@@ -469,6 +583,7 @@ def api_suspend_user(user_id):
         )
         
         if result.modified_count == 1:
+            User.invalidate(user_id)
             return jsonify({'success': True, 'message': 'Usuário suspenso'})
         else:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -479,6 +594,7 @@ def api_suspend_user(user_id):
 
 @admin_api_routes.route('/users/<user_id>/activate', methods=['POST'])
 @login_required
+@db_guard()
 def api_activate_user(user_id):
     """Ativar um usuário suspenso"""
     if not is_admin():
@@ -500,6 +616,7 @@ def api_activate_user(user_id):
         )
         
         if result.modified_count == 1:
+            User.invalidate(user_id)
             return jsonify({'success': True, 'message': 'Usuário ativado com sucesso'})
         else:
             return jsonify({'error': 'Usuário não encontrado ou não está suspenso'}), 404
@@ -512,147 +629,156 @@ def api_activate_user(user_id):
 # ROTAS DE RELATÓRIOS
 # =============================================================================
 
+def _report_range(default_days=None):
+    """Granularidade e intervalo de um relatório (?granularity=day|month&start=&end=, AAAA-MM-DD)
+
+    Sem start, o intervalo começa no bucket de há default_days dias; sem end,
+    fica aberto. Assim os mesmos parâmetros dão a mesma chave em response_cache.
+    Levanta ValueError para parâmetros inválidos.
+    """
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        raise ValueError(granularity)
+    
+    end = datetime.strptime(request.args['end'], '%Y-%m-%d') if request.args.get('end') else None
+    if request.args.get('start'):
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d')
+    elif default_days:
+        start = bucket_start((end or datetime.utcnow()) - timedelta(days=default_days), granularity)
+    else:
+        start = None
+    
+    return granularity, start, end
+
+@response_cache.cached('users_growth', ttl=REPORTS_CACHE_TTL, tags=('rollups',))
+def build_users_growth(granularity, start, end):
+    """Novos usuários por período e tipo, a partir dos rollups"""
+    collections = get_all_collections('analytics')
+    
+    growth_data = []
+    if collections['rollups'] is not None:
+        for bucket in read_rollups(collections['rollups'], 'users_by_type', granularity, start, end):
+            growth_data.append({
+                'period': period_label(bucket['period'], granularity),
+                'users': bucket['count'],
+                'by_type': {user_type: values['count'] for user_type, values in bucket['values'].items()}
+            })
+    
+    return growth_data
+
 @admin_api_routes.route('/reports/users-growth')
 @login_required
+@db_guard(deadline_ms=REPORT_DEADLINE_MS)
 def api_users_growth_report():
-    """Relatório de crescimento de usuários"""
+    """Relatório de crescimento de usuários (novos usuários por período e tipo)"""
     if not is_admin():
         return jsonify({'error': 'Acesso não autorizado'}), 403
     
-    collections = get_all_collections()
+    try:
+        granularity, start, end = _report_range(default_days=180)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de relatório inválidos'}), 400
     
     try:
-        # Últimos 6 meses
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=180)
-        
-        pipeline = [
-            {
-                '$match': {
-                    'created_at': {'$gte': start_date, '$lte': end_date}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        'year': {'$year': '$created_at'},
-                        'month': {'$month': '$created_at'}
-                    },
-                    'count': {'$sum': 1}
-                }
-            },
-            {
-                '$sort': {'_id.year': 1, '_id.month': 1}
-            }
-        ]
-        
-        if collections['users']:
-            result = list(collections['users'].aggregate(pipeline))
-            
-            # Formatar resultado
-            growth_data = []
-            for item in result:
-                growth_data.append({
-                    'period': f"{item['_id']['month']}/{item['_id']['year']}",
-                    'users': item['count']
-                })
-            
-            return jsonify({'success': True, 'data': growth_data})
-        else:
-            return jsonify({'success': True, 'data': []})
+        growth_data = build_users_growth(granularity, start, end)
+        return jsonify({'success': True, 'granularity': granularity, 'data': growth_data})
             
     except Exception as e:
         print(f"Erro em api_users_growth_report: {e}")
         return jsonify({'error': 'Erro ao gerar relatório'}), 500
 
+@response_cache.cached('services_analytics', ttl=REPORTS_CACHE_TTL, tags=('rollups',))
+def build_services_analytics(start, end):
+    """Totais de serviços por status e receita por categoria, a partir dos rollups"""
+    collections = get_all_collections('analytics')
+    # Intervalos que não são meses inteiros somam os buckets diários
+    granularity = exact_granularity(start, end)
+    
+    analytics = {
+        'totalServices': 0,
+        'completedServices': 0,
+        'pendingServices': 0,
+        'cancelledServices': 0,
+        'totalRevenue': 0,
+        'averageServiceValue': 0,
+        'byCategory': {}
+    }
+    
+    if collections['rollups'] is not None:
+        # Serviços por status (pela data de criação)
+        for bucket in read_rollups(collections['rollups'], 'services_by_status', granularity, start, end):
+            analytics['totalServices'] += bucket['count']
+            for status, key in (('completed', 'completedServices'), ('pending', 'pendingServices'), ('cancelled', 'cancelledServices')):
+                analytics[key] += bucket['values'].get(status, {}).get('count', 0)
+        
+        # Receita e valor médio (pela data de conclusão)
+        completed_count = 0
+        for bucket in read_rollups(collections['rollups'], 'revenue_by_category', granularity, start, end):
+            completed_count += bucket['count']
+            analytics['totalRevenue'] += bucket['revenue']
+            for category, values in bucket['values'].items():
+                totals = analytics['byCategory'].setdefault(category, {'count': 0, 'revenue': 0})
+                totals['count'] += values['count']
+                totals['revenue'] += values['revenue']
+        
+        if completed_count:
+            analytics['averageServiceValue'] = analytics['totalRevenue'] / completed_count
+    
+    return analytics
+
 @admin_api_routes.route('/reports/services-analytics')
 @login_required
+@db_guard(deadline_ms=REPORT_DEADLINE_MS)
 def api_services_analytics_report():
-    """Relatório analítico de serviços"""
+    """Relatório analítico de serviços (todo o histórico, ou ?start=&end=)"""
     if not is_admin():
         return jsonify({'error': 'Acesso não autorizado'}), 403
     
-    collections = get_all_collections()
+    try:
+        _, start, end = _report_range()
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de relatório inválidos'}), 400
     
     try:
-        analytics = {
-            'totalServices': 0,
-            'completedServices': 0,
-            'pendingServices': 0,
-            'cancelledServices': 0,
-            'totalRevenue': 0,
-            'averageServiceValue': 0
-        }
-        
-        if collections['services']:
-            # Contagem por status
-            analytics['totalServices'] = collections['services'].count_documents({})
-            analytics['completedServices'] = collections['services'].count_documents({'status': 'completed'})
-            analytics['pendingServices'] = collections['services'].count_documents({'status': 'pending'})
-            analytics['cancelledServices'] = collections['services'].count_documents({'status': 'cancelled'})
-            
-            # Receita total e valor médio
-            completed_services = list(collections['services'].find({'status': 'completed'}))
-            total_revenue = sum(service.get('price', 0) for service in completed_services)
-            
-            analytics['totalRevenue'] = total_revenue
-            if completed_services:
-                analytics['averageServiceValue'] = total_revenue / len(completed_services)
-        
-        return jsonify({'success': True, 'analytics': analytics})
+        return jsonify({'success': True, 'analytics': build_services_analytics(start, end)})
         
     except Exception as e:
         print(f"Erro em api_services_analytics_report: {e}")
         return jsonify({'error': 'Erro ao gerar relatório'}), 500
 
+@response_cache.cached('financial_report', ttl=REPORTS_CACHE_TTL, tags=('rollups',))
+def build_financial_report(granularity, start, end):
+    """Receita de serviços concluídos por período e categoria, a partir dos rollups"""
+    collections = get_all_collections('analytics')
+    
+    financial_data = []
+    if collections['rollups'] is not None:
+        for bucket in read_rollups(collections['rollups'], 'revenue_by_category', granularity, start, end):
+            financial_data.append({
+                'period': period_label(bucket['period'], granularity),
+                'revenue': bucket['revenue'],
+                'services_count': bucket['count'],
+                'by_category': bucket['values']
+            })
+    
+    return financial_data
+
 @admin_api_routes.route('/reports/financial')
 @login_required
+@db_guard(deadline_ms=REPORT_DEADLINE_MS)
 def api_financial_report():
-    """Relatório financeiro"""
+    """Relatório financeiro (receita de serviços concluídos por período e categoria)"""
     if not is_admin():
         return jsonify({'error': 'Acesso não autorizado'}), 403
     
-    collections = get_all_collections()
+    try:
+        granularity, start, end = _report_range(default_days=180)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de relatório inválidos'}), 400
     
     try:
-        # Receita dos últimos 6 meses
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=180)
-        
-        pipeline = [
-            {
-                '$match': {
-                    'status': 'completed',
-                    'completed_at': {'$gte': start_date, '$lte': end_date}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        'year': {'$year': '$completed_at'},
-                        'month': {'$month': '$completed_at'}
-                    },
-                    'revenue': {'$sum': '$price'},
-                    'services_count': {'$sum': 1}
-                }
-            },
-            {
-                '$sort': {'_id.year': 1, '_id.month': 1}
-            }
-        ]
-        
-        financial_data = []
-        if collections['services']:
-            result = list(collections['services'].aggregate(pipeline))
-            
-            for item in result:
-                financial_data.append({
-                    'period': f"{item['_id']['month']}/{item['_id']['year']}",
-                    'revenue': item['revenue'],
-                    'services_count': item['services_count']
-                })
-        
-        return jsonify({'success': True, 'data': financial_data})
+        financial_data = build_financial_report(granularity, start, end)
+        return jsonify({'success': True, 'granularity': granularity, 'data': financial_data})
         
     except Exception as e:
         print(f"Erro em api_financial_report: {e}")
@@ -660,6 +786,7 @@ def api_financial_report():
 
 @admin_api_routes.route('/users/<user_id>')
 @login_required
+@db_guard()
 def api_get_user_details(user_id):
     """Obter detalhes completos de um usuário"""
     if not is_admin():
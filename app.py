@@ -1,8 +1,15 @@
+import time
+
+# Início da importação: base para medir o tempo de arranque a frio
+_import_started = time.perf_counter()
+
 import os
 import logging
-from datetime import datetime
-from flask import Flask, render_template
-from flask_login import LoginManager
+import threading
+import click
+from datetime import datetime, timedelta
+from flask import Flask, render_template, request, session, jsonify
+from flask_login import LoginManager, current_user
 from dotenv import load_dotenv
 
 # Carregar variáveis do .env
@@ -16,10 +23,21 @@ logging.basicConfig(
 logger = logging.getLogger('txunajob')
 
 # Importações dos módulos
-from config import configure_app, security_checks
+from config import (configure_app, configure_database, security_checks, get_mongo_connection,
+                    get_database_name, start_background_reconnect, SCHEMA_VERSION, read_schema_marker, write_schema_marker, bootstrap_schema)
+from indexes import index_drift, ensure_indexes
+from rollups import refresh_rollups
+from geo import refresh_geocodes, backfill_points
+from ranking import recompute_rankings, score_unranked
+from cache import invalidate_tags
+from availability import identity_filter
+from settings import settings_store
 from auth import auth_routes
 from professional_api import professional_api_routes
 from admin_api import admin_api_routes
+from public_api import public_api_routes
+from chat_api import chat_api_routes
+from realtime import socketio, init_realtime
 from models import User
 from auth import create_default_admin
 from models import get_all_collections
@@ -32,6 +50,11 @@ _current_app = None
 def get_app():
     return _current_app
 
+# Bootstrap do database (schema + admin padrão), executado uma vez por processo
+_bootstrap_lock = threading.Lock()
+_bootstrap_retry_at = 0.0
+BOOTSTRAP_RETRY_SECONDS = 30
+
 # Configuração do Login Manager
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -46,17 +69,23 @@ def load_user(user_id):
         logger.error(f"Erro ao carregar usuário: {str(e)[:100]}...")
         return None
 
-def init_app():
-    """Inicializa a aplicação com todas as configurações"""
+def init_app(connect_database=True):
+    """Inicializa a aplicação com todas as configurações
+
+    connect_database=False prepara a app sem criar o cliente MongoDB (pre-fork);
+    cada processo chama start_database(app) depois.
+    """
     global _current_app
     
+    init_started = time.perf_counter()
     logger.info("Iniciando configuração da aplicação...")
     
     # Configurar app Flask
-    configure_app(app)
+    configure_app(app, connect_database=False)
     
     # Inicializar extensões
     login_manager.init_app(app)
+    init_realtime(app)
     
     # Registrar middleware de segurança
     app.before_request(security_checks)
@@ -65,27 +94,224 @@ def init_app():
     app.register_blueprint(auth_routes, url_prefix='/auth')
     app.register_blueprint(professional_api_routes, url_prefix='/api')
     app.register_blueprint(admin_api_routes, url_prefix='/api/admin')
+    app.register_blueprint(chat_api_routes, url_prefix='/api/chat')
+    app.register_blueprint(public_api_routes, url_prefix='/api')
     
-    # Configuração final
-    with app.app_context():
-        try:
-            # Criar admin padrão se necessário
-            collections = get_all_collections()
-            # Verificação segura de modo manutenção
-            if (collections['users'] is not None and 
-                collections['clients'] is not None and 
-                collections['professionals'] is not None):
-                create_default_admin(collections)
-                logger.info("Verificação de admin padrão concluída")
-            else:
-                logger.warning("Modo manutenção - Admin padrão não criado")
-        except Exception as e:
-            logger.error(f"Erro na inicialização do admin: {str(e)[:100]}...")
+    # Bootstrap do database: imediato, ou no primeiro request em modo diferido
+    app.bootstrapped = False
+    app.startup_metrics = {'mode': 'deferred' if app.deferred_init else 'eager', 'bootstrap_ms': None}
+    app.before_request(ensure_bootstrapped)
+    app.before_request(enforce_settings)
+    settings_store.on_change(lambda values: apply_settings(app, values))
+    apply_settings(app, settings_store.values)
+    
+    if connect_database:
+        start_database(app)
     
     _current_app = app
-    logger.info("Aplicação inicializada com sucesso")
+    app.startup_metrics['import_ms'] = round((init_started - _import_started) * 1000, 1)
+    app.startup_metrics['init_ms'] = round((time.perf_counter() - init_started) * 1000, 1)
+    logger.info(f"Aplicação inicializada com sucesso - arranque: {app.startup_metrics}")
     return app
 
+def start_database(app):
+    """Conecta ao MongoDB e executa o bootstrap conforme o modo de inicialização"""
+    configure_database(app)
+    
+    # Sem database no arranque: reconectar em segundo plano em vez de ficar
+    # em modo manutenção até o processo reiniciar
+    if not app.mongo_client:
+        start_background_reconnect(app, on_connected=bootstrap_after_reconnect)
+    elif not app.deferred_init:
+        with app.app_context():
+            bootstrap_database(app)
+
+def bootstrap_database(app):
+    """Cria schema e admin padrão apenas se o marcador persistido estiver desatualizado
+
+    Numa instância já inicializada custa uma única leitura (meta.schema).
+    Retorna True quando o database ficou pronto.
+    """
+    if app.mongo_db is None:
+        logger.warning("Modo manutenção - bootstrap do database ignorado")
+        return False
+    
+    started = time.perf_counter()
+    try:
+        marker = read_schema_marker(app.mongo_db)
+        
+        schema_ready = True
+        if marker.get('version') != SCHEMA_VERSION:
+            pending = bootstrap_schema(app.mongo_db)
+            # Perfis anteriores ao ranking: sem score ficariam fora das páginas seguintes da listagem
+            unranked = score_unranked(app.mongo_db.professionals)
+            if unranked:
+                logger.info(f"Ranking inicial calculado para {unranked} profissionais")
+            app.startup_metrics['index_drift'] = pending or None
+            if pending:
+                # Sem marcador: ensure_bootstrapped tenta de novo após BOOTSTRAP_RETRY_SECONDS
+                schema_ready = False
+                logger.error(f"Índices por aplicar, schema não marcado como concluído: {pending}")
+            else:
+                write_schema_marker(app.mongo_db, version=SCHEMA_VERSION)
+        
+        if not marker.get('default_admin'):
+            if create_default_admin(get_all_collections()):
+                write_schema_marker(app.mongo_db, default_admin=True)
+            logger.info("Verificação de admin padrão concluída")
+        
+        # Snapshot das configurações; depois só a versão é verificada, numa thread
+        settings_store.load(app.mongo_db.settings)
+        settings_store.start_watcher(lambda: app.collections.get('settings'))
+        
+        app.bootstrapped = schema_ready
+        
+        # Pré-filtro de /api/check-username (em modo diferido as verificações vão ao índice)
+        if not app.deferred_init:
+            identity_filter.warm_in_background(app.mongo_db.users)
+        return schema_ready
+    
+    except Exception as e:
+        logger.error(f"Erro no bootstrap do database: {str(e)[:100]}...")
+        return False
+    
+    finally:
+        app.startup_metrics['bootstrap_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Bootstrap do database: {app.startup_metrics['bootstrap_ms']} ms")
+
+def bootstrap_after_reconnect(app):
+    """Chamado pela thread de reconexão assim que o database fica disponível"""
+    with app.app_context():
+        bootstrap_database(app)
+
+def ensure_bootstrapped():
+    """before_request: bootstrap no primeiro request (modo diferido ou após falha)"""
+    global _bootstrap_retry_at
+    if app.bootstrapped or app.mongo_db is None or time.monotonic() < _bootstrap_retry_at:
+        return
+    
+    with _bootstrap_lock:
+        # Quem esperou pelo lock enquanto outro falhava não repete o bootstrap
+        if app.bootstrapped or time.monotonic() < _bootstrap_retry_at:
+            return
+        if not bootstrap_database(app):
+            # Database indisponível: tentar de novo mais tarde, sem bloquear cada request
+            _bootstrap_retry_at = time.monotonic() + BOOTSTRAP_RETRY_SECONDS
+
+# Caminhos que continuam acessíveis com o modo manutenção ligado
+MAINTENANCE_EXEMPT_PREFIXES = ('/static/', '/auth/login', '/auth/logout', '/health', '/api/admin/')
+
+def apply_settings(application, values):
+    """Aplica ao processo as configurações que não dependem do request"""
+    # sessionTimeout = 0 mantém o padrão do Flask (31 dias)
+    if values.get('sessionTimeout'):
+        application.permanent_session_lifetime = timedelta(minutes=values['sessionTimeout'])
+
+def enforce_settings():
+    """before_request: modo manutenção e expiração da sessão a partir do snapshot em memória"""
+    # Sessões autenticadas expiram após sessionTimeout minutos sem atividade
+    if '_user_id' in session and not session.permanent:
+        session.permanent = True
+    
+    if not settings_store.get('maintenanceMode') or request.path.startswith(MAINTENANCE_EXEMPT_PREFIXES):
+        return
+    # Só aqui o usuário é carregado: admins continuam a usar o sistema
+    if current_user.is_authenticated and current_user.user_type == 'admin':
+        return
+    
+    message = settings_store.get('maintenanceMessage')
+    if request.path.startswith('/api/'):
+        return jsonify({'error': message, 'maintenance': True}), 503
+    return render_template('maintenance.html', message=message), 503
+
+# =============================================
+# COMANDOS CLI
+# =============================================
+
+def _cli_database(profile='interactive'):
+    """Database para comandos CLI (sem executar o bootstrap completo)"""
+    client = get_mongo_connection(profile=profile)
+    if not client:
+        raise click.ClickException("Não foi possível conectar ao MongoDB")
+    return client[get_database_name()]
+
+@app.cli.group('indexes')
+def indexes_cli():
+    """Gestão dos índices declarados em indexes.py"""
+
+@indexes_cli.command('check')
+def indexes_check():
+    """Reporta divergências entre índices declarados e existentes"""
+    drift = index_drift(_cli_database())
+    if not drift:
+        click.echo("Índices em conformidade com o registro")
+        return
+    
+    for collection_name, report in drift.items():
+        for kind in ('missing', 'changed', 'extra'):
+            for name in report[kind]:
+                click.echo(f"{collection_name}: {kind} {name}")
+    
+    if any(report['missing'] or report['changed'] for report in drift.values()):
+        raise SystemExit(1)
+
+@indexes_cli.command('sync')
+@click.option('--drop-changed', is_flag=True, help='Recriar índices com definição divergente')
+def indexes_sync(drop_changed):
+    """Cria os índices em falta (idempotente)"""
+    remaining = ensure_indexes(_cli_database(), drop_changed=drop_changed)
+    pending = {name: report for name, report in remaining.items() if report['missing'] or report['changed']}
+    if pending:
+        click.echo(f"Divergências restantes: {pending}")
+        raise SystemExit(1)
+    click.echo("Índices sincronizados")
+
+@app.cli.group('rollups')
+def rollups_cli():
+    """Buckets pré-agregados dos relatórios do admin (rollups.py)"""
+
+@rollups_cli.command('refresh')
+@click.option('--full', is_flag=True, help='Reconstruir todos os buckets em vez do refresh incremental')
+def rollups_refresh(full):
+    """Atualiza os rollups diários e mensais (agendar via cron, ex: a cada 15 minutos)"""
+    summary = refresh_rollups(_cli_database(profile='bulk'), full=full)
+    # Só alcança os workers com RESPONSE_CACHE_BACKEND=sqlite; em memória vale o TTL
+    invalidate_tags('rollups')
+    for metric_name, days in summary.items():
+        click.echo(f"{metric_name}: {days if days == 'full' else f'{days} dias recalculados'}")
+
+def _backfill_points(db):
+    summary = backfill_points(db)
+    click.echo(f"Coordenadas preenchidas: {summary['professionals']} profissionais, {summary['services']} serviços")
+
+@app.cli.group('geo')
+def geo_cli():
+    """Coordenadas de locais para a busca por proximidade (geo.py)"""
+
+@geo_cli.command('refresh')
+@click.option('--limit', default=500, show_default=True, help='Máximo de nomes pendentes consultados')
+def geo_refresh(limit):
+    """Resolve nomes pendentes no geocoder externo e preenche as coordenadas em falta"""
+    db = _cli_database(profile='bulk')
+    summary = refresh_geocodes(db, limit=limit)
+    click.echo(f"Geocodes: {summary['resolved']} resolvidos, {summary['not_found']} não encontrados")
+    _backfill_points(db)
+
+@geo_cli.command('backfill')
+def geo_backfill():
+    """Preenche coordenadas em falta só com o gazetteer e os geocodes já resolvidos"""
+    _backfill_points(_cli_database(profile='bulk'))
+
+@app.cli.group('ranking')
+def ranking_cli():
+    """Score de ordenação dos profissionais (ranking.py)"""
+
+@ranking_cli.command('recompute')
+def ranking_recompute():
+    """Recalcula o score de todos os profissionais (agendar via cron, ex: diariamente de madrugada)"""
+    total = recompute_rankings(_cli_database(profile='bulk'))
+    click.echo(f"Ranking recalculado para {total} profissionais")
+
 # =============================================
 # ROTAS PRINCIPAIS
 # =============================================
@@ -157,7 +383,7 @@ def create_admin_route():
     
     try:
         collections = get_all_collections()
-        if collections['users']:
+        if collections['users'] is not None:
             # Verificar se admin já existe
             existing_admin = collections['users'].find_one({'user_type': 'admin'})
             if existing_admin:
@@ -168,14 +394,14 @@ def create_admin_route():
                 '''
             
             # Criar admin
-            from werkzeug.security import generate_password_hash
+            from passwords import hash_password
             from datetime import datetime
             
             admin_user = {
                 'username': 'admin',
                 'email': 'admin@txunajob.com',
                 'user_type': 'admin',
-                'password_hash': generate_password_hash('admin123'),
+                'password_hash': hash_password('admin123'),
                 'created_at': datetime.utcnow(),
                 'full_name': 'Administrador do Sistema',
                 'phone': '+258841234567',
@@ -217,7 +443,9 @@ def health_check():
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "database": "connected" if get_app().mongo_client else "disconnected",
         "environment": app.config.get('ENV', 'unknown'),
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "startup": getattr(app, 'startup_metrics', None),
+        "connection": getattr(app, 'mongo_state', None)
     }
     
     # Verificar conexão com database se disponível
@@ -234,6 +462,10 @@ def health_check():
                 collections['clients'] is not None
             ])
             
+            # Índices (incluindo os únicos de users) ainda por aplicar
+            if app.startup_metrics.get('index_drift'):
+                health_status["status"] = "degraded"
+            
         except Exception as e:
             health_status["database"] = "error"
             health_status["status"] = "degraded"
@@ -308,8 +540,9 @@ if __name__ == '__main__':
         logger.info("Health Check disponível em /health")
         logger.info("=== ===================== ===")
     
-    # Iniciar servidor
-    app.run(
+    # Iniciar servidor (Socket.IO precisa do seu próprio runner)
+    socketio.run(
+        app,
         debug=debug,
         host=host,
         port=port
@@ -1,36 +1,50 @@
 import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
 import json
 import os
 from datetime import datetime
+from availability import identity_filter
+from cache import LRUCache, invalidate_tags
+from geo import resolve_location
+from ranking import refresh_score
 from models import User, get_all_collections
+from passwords import HashingBusy, hash_password, needs_rehash
+from realtime import publish_user_registered
+from registration import IdentityTaken, create_account
+from settings import settings_store
 
 # Configurar logging
 logger = logging.getLogger('txunajob')
 
 auth_routes = Blueprint('auth', __name__)
 
+# Falhas de login por username (por worker); o limite é maxLoginAttempts nas configurações
+LOGIN_LOCKOUT_SECONDS = int(os.environ.get('LOGIN_LOCKOUT_SECONDS', 900))
+failed_logins = LRUCache(maxsize=10000, ttl=LOGIN_LOCKOUT_SECONDS)
+
 def create_default_admin(collections):
-    """Cria admin padrão se não existir"""
+    """Cria admin padrão se não existir
+
+    Retorna True quando já existe (ou foi criado) um admin, False caso contrário.
+    """
     # CORREÇÃO: Verificação segura de modo manutenção
     if (collections['users'] is None or 
         collections['clients'] is None or 
         collections['professionals'] is None):
         logger.warning("Modo manutenção - Admin padrão não criado")
-        return
+        return False
     
     # Verificar se já existe admin
     try:
         existing_admin = collections['users'].find_one({'user_type': 'admin'})
         if existing_admin:
             logger.info("Admin já existe no sistema")
-            return
+            return True
     except Exception as e:
         logger.error(f"Erro ao verificar admin existente: {str(e)[:100]}...")
-        return
+        return False
     
     admin_username = os.environ.get('DEFAULT_ADMIN_USERNAME')
     admin_email = os.environ.get('DEFAULT_ADMIN_EMAIL')
@@ -38,21 +52,12 @@ def create_default_admin(collections):
     
     if not all([admin_username, admin_email, admin_password]):
         logger.warning("Credenciais de admin padrão incompletas")
-        return
-    
-    # Verificar se o usuário já existe
-    try:
-        if collections['users'].find_one({'username': admin_username}):
-            logger.info(f"Usuário {admin_username} já existe")
-            return
-    except Exception as e:
-        logger.error(f"Erro ao verificar usuário existente: {str(e)[:100]}...")
-        return
+        return False
     
     user_data = {
         'username': admin_username,
         'email': admin_email,
-        'password_hash': generate_password_hash(admin_password),
+        'password_hash': hash_password(admin_password),
         'user_type': 'admin',
         'phone': '',
         'location': '',
@@ -60,17 +65,34 @@ def create_default_admin(collections):
     }
     
     try:
-        user_id = collections['users'].insert_one(user_data).inserted_id
         admin_data = {
-            'user_id': user_id,
             'permissions': json.dumps({'all': True}),
             'created_at': datetime.utcnow()
         }
-        if collections['admins'] is not None:
-            collections['admins'].insert_one(admin_data)
+        create_account(collections, user_data, 'admins', admin_data)
         logger.info("Admin padrão criado com sucesso")
+        return True
+    except IdentityTaken:
+        logger.info(f"Usuário {admin_username} já existe")
+        return False
     except Exception as e:
         logger.error(f"Erro ao criar admin padrão: {str(e)[:100]}...")
+        return False
+
+def upgrade_password_hash(user, password):
+    """Regera o hash com o método/custo atual após um login bem-sucedido"""
+    if not needs_rehash(user.password_hash):
+        return
+    
+    try:
+        get_all_collections()['users'].update_one(
+            {'_id': ObjectId(user.id), 'password_hash': user.password_hash},
+            {'$set': {'password_hash': hash_password(password), 'updated_at': datetime.utcnow()}}
+        )
+        logger.info(f"Hash de senha atualizado: {user.username}")
+    except Exception as e:
+        # Fica para o próximo login (inclusive com a fila de hashing cheia)
+        logger.warning(f"Hash de senha não atualizado: {str(e)[:100]}...")
 
 @auth_routes.route('/login', methods=['GET', 'POST'])
 def login():
@@ -91,8 +113,24 @@ def login():
             flash('Por favor, preencha todos os campos', 'error')
             return render_template('auth/login.html')
         
-        user = User.find_by_username(username)
-        if user and user.check_password(password):
+        # maxLoginAttempts = 0 desativa o bloqueio
+        attempts = failed_logins.get(username, 0)
+        max_attempts = settings_store.get('maxLoginAttempts')
+        if max_attempts and attempts >= max_attempts:
+            logger.warning(f"Login bloqueado após {attempts} tentativas: {username}")
+            flash('Muitas tentativas de login. Tente novamente mais tarde.', 'error')
+            return render_template('auth/login.html'), 429
+        
+        try:
+            user = User.find_by_username(username)
+            authenticated = user is not None and user.check_password(password)
+        except HashingBusy:
+            flash('Servidor ocupado. Tente novamente em instantes.', 'error')
+            return render_template('auth/login.html'), 429
+        
+        if authenticated:
+            failed_logins.delete(username)
+            upgrade_password_hash(user, password)
             login_user(user)
             logger.info(f"Login bem-sucedido: {username} ({user.user_type})")
             flash('Login realizado com sucesso!', 'success')
@@ -106,6 +144,8 @@ def login():
             else:
                 return redirect(url_for('index'))
         else:
+            # A janela recomeça a cada falha (LOGIN_LOCKOUT_SECONDS após a última)
+            failed_logins.set(username, attempts + 1)
             logger.warning(f"Tentativa de login falhou para usuário: {username}")
             flash('Usuário ou senha incorretos', 'error')
     
@@ -138,24 +178,17 @@ def register_client():
             flash('A senha deve ter pelo menos 6 caracteres', 'error')
             return redirect(url_for('auth.register_client'))
         
-        # CORREÇÃO: Verificações seguras
+        # Hash fora da thread do request; fila cheia responde 429 de imediato
         try:
-            if collections['users'].find_one({'username': username}):
-                flash('Nome de usuário já existe', 'error')
-                return redirect(url_for('auth.register_client'))
-            
-            if collections['users'].find_one({'email': email}):
-                flash('Email já está em uso', 'error')
-                return redirect(url_for('auth.register_client'))
-        except Exception as e:
-            logger.error(f"Erro ao verificar usuário existente: {str(e)[:100]}...")
-            flash('Erro no sistema. Tente novamente.', 'error')
-            return redirect(url_for('auth.register_client'))
+            password_hash = hash_password(password)
+        except HashingBusy:
+            flash('Servidor ocupado. Tente novamente em instantes.', 'error')
+            return render_template('auth/register_client.html'), 429
         
         user_data = {
             'username': username,
             'email': email,
-            'password_hash': generate_password_hash(password),
+            'password_hash': password_hash,
             'user_type': 'client',
             'phone': phone or '',
             'location': location or '',
@@ -163,17 +196,20 @@ def register_client():
         }
         
         try:
-            user_id = collections['users'].insert_one(user_data).inserted_id
             client_data = {
-                'user_id': user_id,
                 'full_name': full_name,
                 'preferences': ''
             }
-            if collections['clients'] is not None:
-                collections['clients'].insert_one(client_data)
+            create_account(collections, user_data, 'clients', client_data)
             logger.info(f"Novo cliente registrado: {username}")
+            invalidate_tags('users')
+            identity_filter.add(user_data)
+            publish_user_registered({**user_data, 'full_name': full_name})
             flash('Conta de cliente criada com sucesso!', 'success')
             return redirect(url_for('auth.login'))
+        except IdentityTaken as e:
+            flash('Nome de usuário já existe' if e.field == 'username' else 'Email já está em uso', 'error')
+            return redirect(url_for('auth.register_client'))
         except Exception as e:
             logger.error(f"Erro ao criar cliente: {str(e)[:100]}...")
             flash('Erro ao criar conta. Tente novamente.', 'error')
@@ -211,26 +247,19 @@ def register_professional():
             flash('A senha deve ter pelo menos 6 caracteres', 'error')
             return redirect(url_for('auth.register_professional'))
         
-        # CORREÇÃO: Verificações seguras
+        # Hash fora da thread do request; fila cheia responde 429 de imediato
         try:
-            if collections['users'].find_one({'username': username}):
-                flash('Nome de usuário já existe', 'error')
-                return redirect(url_for('auth.register_professional'))
-            
-            if collections['users'].find_one({'email': email}):
-                flash('Email já está em uso', 'error')
-                return redirect(url_for('auth.register_professional'))
-        except Exception as e:
-            logger.error(f"Erro ao verificar usuário existente: {str(e)[:100]}...")
-            flash('Erro no sistema. Tente novamente.', 'error')
-            return redirect(url_for('auth.register_professional'))
+            password_hash = hash_password(password)
+        except HashingBusy:
+            flash('Servidor ocupado. Tente novamente em instantes.', 'error')
+            return render_template('auth/register_pro.html'), 429
         
         final_specialty = other_specialty if specialty == 'other' else specialty
         
         user_data = {
             'username': username,
             'email': email,
-            'password_hash': generate_password_hash(password),
+            'password_hash': password_hash,
             'user_type': 'professional',
             'phone': phone or '',
             'location': location or '',
@@ -238,21 +267,35 @@ def register_professional():
         }
         
         try:
-            user_id = collections['users'].insert_one(user_data).inserted_id
             professional_data = {
-                'user_id': user_id,
                 'full_name': full_name,
                 'specialty': final_specialty,
                 'experience': int(experience) if experience else 0,
                 'description': description or '',
                 'hourly_rate': 0.0,
-                'is_verified': False
+                'is_verified': False,
+                # Substituído já a seguir por refresh_score; nunca fica sem o campo
+                'ranking_score': 0.0
             }
-            if collections['professionals'] is not None:
-                collections['professionals'].insert_one(professional_data)
+            # Coordenadas para a busca por proximidade (gazetteer/geocodes, sem serviços externos)
+            point = resolve_location(collections['users'].database, location, record_pending=True)
+            if point:
+                professional_data['geo'] = point
+            user_id = create_account(collections, user_data, 'professionals', professional_data)
+            # Score inicial: as listagens ordenam por ranking_score (o recálculo noturno cobre falhas)
+            try:
+                refresh_score(collections['professionals'], user_id)
+            except Exception as e:
+                logger.warning(f"Falha ao calcular ranking inicial: {str(e)[:100]}...")
             logger.info(f"Novo profissional registrado: {username} - {final_specialty}")
+            invalidate_tags('users')
+            identity_filter.add(user_data)
+            publish_user_registered({**user_data, 'full_name': full_name})
             flash('Conta de profissional criada com sucesso!', 'success')
             return redirect(url_for('auth.login'))
+        except IdentityTaken as e:
+            flash('Nome de usuário já existe' if e.field == 'username' else 'Email já está em uso', 'error')
+            return redirect(url_for('auth.register_professional'))
         except Exception as e:
             logger.error(f"Erro ao criar profissional: {str(e)[:100]}...")
             flash('Erro ao criar conta. Tente novamente.', 'error')
@@ -319,24 +362,17 @@ def register_admin():
             flash('A senha de admin deve ter pelo menos 8 caracteres', 'error')
             return redirect(url_for('auth.register_admin'))
         
-        # CORREÇÃO: Verificações seguras
+        # Hash fora da thread do request; fila cheia responde 429 de imediato
         try:
-            if collections['users'].find_one({'username': username}):
-                flash('Nome de usuário já existe', 'error')
-                return redirect(url_for('auth.register_admin'))
-            
-            if collections['users'].find_one({'email': email}):
-                flash('Email já está em uso', 'error')
-                return redirect(url_for('auth.register_admin'))
-        except Exception as e:
-            logger.error(f"Erro ao verificar usuário: {str(e)[:100]}...")
-            flash('Erro no sistema. Tente novamente.', 'error')
-            return redirect(url_for('auth.register_admin'))
+            password_hash = hash_password(password)
+        except HashingBusy:
+            flash('Servidor ocupado. Tente novamente em instantes.', 'error')
+            return render_template('auth/register_admin.html', is_first_admin=not admin_exists), 429
         
         user_data = {
             'username': username,
             'email': email,
-            'password_hash': generate_password_hash(password),
+            'password_hash': password_hash,
             'user_type': 'admin',
             'phone': '',
             'location': '',
@@ -344,15 +380,15 @@ def register_admin():
         }
         
         try:
-            user_id = collections['users'].insert_one(user_data).inserted_id
             admin_data = {
-                'user_id': user_id,
                 'permissions': json.dumps({'all': True}),
                 'created_at': datetime.utcnow()
             }
-            if collections['admins'] is not None:
-                collections['admins'].insert_one(admin_data)
+            create_account(collections, user_data, 'admins', admin_data)
             logger.info(f"Novo admin criado: {username}")
+            invalidate_tags('users')
+            identity_filter.add(user_data)
+            publish_user_registered({**user_data, 'full_name': full_name})
             flash('Conta de administrador criada com sucesso!', 'success')
             
             if admin_exists and current_user.is_authenticated and current_user.user_type == 'admin':
@@ -360,6 +396,9 @@ def register_admin():
             else:
                 return redirect(url_for('auth.login'))
                 
+        except IdentityTaken as e:
+            flash('Nome de usuário já existe' if e.field == 'username' else 'Email já está em uso', 'error')
+            return redirect(url_for('auth.register_admin'))
         except Exception as e:
             logger.error(f"Erro ao criar admin: {str(e)[:100]}...")
             flash('Erro ao criar conta. Tente novamente.', 'error')
@@ -0,0 +1,147 @@
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Campos de users com índice único verificáveis em /api/check-username
+IDENTITY_FIELDS = ('username', 'email')
+
+# Capacidade mínima de cada filtro e taxa de falsos positivos desejada
+FILTER_CAPACITY = int(os.environ.get('IDENTITY_FILTER_CAPACITY', 100000))
+FILTER_ERROR_RATE = float(os.environ.get('IDENTITY_FILTER_ERROR_RATE', 0.01))
+
+# Intervalo máximo sem incorporar registros feitos noutros workers
+FILTER_SYNC_SECONDS = float(os.environ.get('IDENTITY_FILTER_SYNC_SECONDS', 5))
+
+# Margem da sincronização incremental (escritas em curso, relógios)
+SYNC_OVERLAP = timedelta(seconds=30)
+
+class BloomFilter:
+    """Bloom filter em memória: 'não contém' é definitivo, 'contém' é provável"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing (Kirsch-Mitzenmacher) sobre um único digest
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class IdentityFilter:
+    """Pré-filtro de usernames/emails já registrados (um Bloom filter por campo)
+
+    warm() carrega todos os valores de users; depois disso um valor ausente do
+    filtro está livre sem consultar o MongoDB. Registros feitos neste worker
+    entram via add(); os de outros workers são incorporados por sync(), uma
+    consulta incremental por created_at no máximo a cada FILTER_SYNC_SECONDS.
+    Antes do warm() terminar (ou em modo diferido, onde não é feito) todas as
+    verificações vão ao índice único.
+    """
+
+    def __init__(self, capacity=FILTER_CAPACITY, error_rate=FILTER_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filters = None
+        self.synced_at = None
+        self._next_sync = 0
+        self._lock = threading.Lock()
+        self._warming = False
+
+    @property
+    def ready(self):
+        return self.filters is not None
+
+    def warm(self, collection):
+        """Reconstrói os filtros a partir de todos os usuários"""
+        started = time.perf_counter()
+        synced_at = datetime.utcnow()
+        capacity = max(self.capacity, 2 * collection.estimated_document_count())
+        filters = {field: BloomFilter(capacity, self.error_rate) for field in IDENTITY_FIELDS}
+
+        projection = {field: 1 for field in IDENTITY_FIELDS}
+        projection['_id'] = 0
+        for user in collection.find({}, projection, batch_size=5000):
+            self._add_to(filters, user)
+
+        with self._lock:
+            self.filters = filters
+            self.synced_at = synced_at
+            self._next_sync = time.monotonic() + FILTER_SYNC_SECONDS
+        logger.info(f"Filtro de identidades carregado (capacidade {capacity}) em {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def warm_in_background(self, collection):
+        """warm() numa thread, sem atrasar o arranque do worker"""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+
+        def run():
+            try:
+                self.warm(collection)
+            except Exception as e:
+                logger.warning(f"Filtro de identidades não carregado: {str(e)[:100]}...")
+            finally:
+                self._warming = False
+
+        threading.Thread(target=run, name='identity-filter-warm', daemon=True).start()
+
+    def sync(self, collection):
+        """Incorpora usuários criados desde a última sincronização (no máximo a cada FILTER_SYNC_SECONDS)"""
+        with self._lock:
+            if not self.ready or time.monotonic() < self._next_sync:
+                return
+            self._next_sync = time.monotonic() + FILTER_SYNC_SECONDS
+            since = self.synced_at - SYNC_OVERLAP
+
+        synced_at = datetime.utcnow()
+        projection = {field: 1 for field in IDENTITY_FIELDS}
+        projection['_id'] = 0
+        for user in collection.find({'created_at': {'$gte': since}}, projection):
+            self._add_to(self.filters, user)
+        self.synced_at = synced_at
+
+    def _add_to(self, filters, user):
+        for field in IDENTITY_FIELDS:
+            if user.get(field):
+                filters[field].add(user[field])
+
+    def add(self, user):
+        """Registra os valores de um usuário acabado de criar"""
+        if self.ready:
+            self._add_to(self.filters, user)
+
+    def might_exist(self, field, value):
+        """False apenas quando o valor certamente não está registrado"""
+        filters = self.filters
+        return filters is None or value in filters[field]
+
+identity_filter = IdentityFilter()
+
+def is_available(collection, field, value):
+    """Disponibilidade de um username/email: pré-filtro e, se necessário, o índice único"""
+    try:
+        identity_filter.sync(collection)
+    except Exception as e:
+        logger.warning(f"Falha ao sincronizar filtro de identidades: {str(e)[:100]}...")
+
+    if not identity_filter.might_exist(field, value):
+        return True
+    return collection.find_one({field: value}, {'_id': 1}) is None
@@ -0,0 +1,243 @@
+"""Benchmark de carga do chat (Socket.IO + eventlet)
+
+Sobe um servidor local num subprocesso (um único worker eventlet) apontado
+para um database descartável no MongoDB local, cria pares de usuários e
+conversas diretamente no database e abre uma conexão Socket.IO por usuário,
+autenticada com um cookie de sessão assinado com o mesmo SECRET_KEY.
+
+Mede:
+  - conexões estabelecidas e tempo de conexão
+  - latência send_message -> new_message no destinatário
+  - mensagens por segundo persistidas e entregues
+
+O cliente de carga precisa do extra de cliente do python-socketio:
+    pip install "python-socketio[client]"
+
+Uso:
+    python benchmarks/chat_load.py --clients 2000 --messages 5
+"""
+import os
+import sys
+import time
+import secrets
+import argparse
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_DATABASE = 'txunajob_bench_chat'
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def serve(port):
+    """Servidor de teste: app completa com Socket.IO em eventlet"""
+    from app import init_app
+    from realtime import socketio
+
+    app = init_app()
+    socketio.run(app, host='127.0.0.1', port=port, log_output=False)
+
+def seed(db, pairs):
+    """Cria pares de usuários e uma conversa por par; retorna [(chat_id, a, b)]"""
+    from bson.objectid import ObjectId
+    from chat_api import participants_key
+
+    now = datetime.utcnow()
+    users, chats, conversations = [], [], []
+
+    for index in range(pairs):
+        a, b = ObjectId(), ObjectId()
+        for user_id, suffix in ((a, 'a'), (b, 'b')):
+            users.append({
+                '_id': user_id,
+                'username': f'bench_{index}_{suffix}',
+                'email': f'bench_{index}_{suffix}@bench.local',
+                'password_hash': '!',
+                'user_type': 'client',
+                'created_at': now
+            })
+        chat_id = ObjectId()
+        chats.append({
+            '_id': chat_id,
+            'participants': [a, b],
+            'participants_key': participants_key(a, b),
+            'created_at': now,
+            'last_message_at': now,
+            'unread': {}
+        })
+        conversations.append((str(chat_id), str(a), str(b)))
+
+    db.users.insert_many(users)
+    db.chats.insert_many(chats)
+    return conversations
+
+def session_cookie(secret_key, user_id):
+    """Cookie de sessão Flask-Login equivalente a um login real"""
+    from flask import Flask
+    from flask.sessions import SecureCookieSessionInterface
+
+    signer = Flask('bench')
+    signer.secret_key = secret_key
+    serializer = SecureCookieSessionInterface().get_signing_serializer(signer)
+    return serializer.dumps({'_user_id': user_id, '_fresh': True})
+
+def run_load(url, secret_key, conversations, messages_per_sender, connect_rate):
+    import eventlet
+    import socketio
+
+    connect_times, latencies, errors = [], [], []
+    received = {'count': 0}
+
+    def make_client(user_id, chat_id):
+        client = socketio.Client(reconnection=False)
+
+        @client.on('new_message')
+        def on_message(message):
+            sent_at = float(message['content'].split('|', 1)[0])
+            latencies.append((time.time() - sent_at) * 1000)
+            received['count'] += 1
+
+        started = time.perf_counter()
+        try:
+            client.connect(url, headers={'Cookie': f'session={session_cookie(secret_key, user_id)}'},
+                           transports=['websocket'], wait_timeout=30)
+            ack = client.call('join_chat', {'chat_id': chat_id}, timeout=30)
+            if not ack or not ack.get('success'):
+                raise RuntimeError(f"join_chat falhou: {ack}")
+            connect_times.append((time.perf_counter() - started) * 1000)
+            return client
+        except Exception as e:
+            errors.append(str(e)[:100])
+            return None
+
+    # Conectar todos os clientes (taxa limitada para não medir só o handshake)
+    pool = eventlet.GreenPool(size=len(conversations) * 2)
+    senders, receivers = [], []
+    for chat_id, user_a, user_b in conversations:
+        senders.append((pool.spawn(make_client, user_a, chat_id), chat_id))
+        receivers.append(pool.spawn(make_client, user_b, chat_id))
+        eventlet.sleep(1.0 / connect_rate)
+    pool.waitall()
+
+    sender_clients = [(thread.wait(), chat_id) for thread, chat_id in senders]
+    receiver_clients = [thread.wait() for thread in receivers]
+    connected = sum(1 for client, _ in sender_clients if client) + sum(1 for client in receiver_clients if client)
+
+    # Cada remetente envia N mensagens e espera o ack de persistência
+    def send_all(client, chat_id):
+        for _ in range(messages_per_sender):
+            ack = client.call('send_message', {'chat_id': chat_id, 'content': f'{time.time()}|bench'}, timeout=30)
+            if not ack or not ack.get('success'):
+                errors.append(f"send_message: {ack}")
+
+    started = time.perf_counter()
+    for client, chat_id in sender_clients:
+        if client:
+            pool.spawn(send_all, client, chat_id)
+    pool.waitall()
+
+    expected = sum(1 for client, _ in sender_clients if client) * messages_per_sender
+    deadline = time.time() + 30
+    while received['count'] < expected and time.time() < deadline:
+        eventlet.sleep(0.1)
+    elapsed = time.perf_counter() - started
+
+    for client, _ in sender_clients:
+        if client:
+            client.disconnect()
+    for client in receiver_clients:
+        if client:
+            client.disconnect()
+
+    return {
+        'target': len(conversations) * 2,
+        'connected': connected,
+        'connect_p50': percentile(connect_times, 50),
+        'connect_p95': percentile(connect_times, 95),
+        'sent': expected,
+        'received': received['count'],
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_p99': percentile(latencies, 99),
+        'throughput': received['count'] / elapsed if elapsed else 0,
+        'errors': errors
+    }
+
+def main():
+    # Servidor e cliente de carga usam green threads: patch antes de qualquer import de rede
+    import eventlet
+    eventlet.monkey_patch()
+
+    parser = argparse.ArgumentParser(description='Benchmark de carga do chat')
+    parser.add_argument('--clients', type=int, default=1000, help='Conexões simultâneas (pares x 2)')
+    parser.add_argument('--messages', type=int, default=5, help='Mensagens por remetente')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--connect-rate', type=float, default=200, help='Novas conexões por segundo')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    from pymongo import MongoClient
+
+    host = os.environ.get('MONGODB_LOCAL_HOST', 'localhost')
+    port = os.environ.get('MONGODB_LOCAL_PORT', '27017')
+    mongo = MongoClient(f"mongodb://{host}:{port}", serverSelectionTimeoutMS=5000)
+    mongo.drop_database(BENCH_DATABASE)
+
+    secret_key = secrets.token_hex(32)
+    env = {
+        **os.environ,
+        'SECRET_KEY': secret_key,
+        'MONGODB_DATABASE': BENCH_DATABASE,
+        'FLASK_ENV': 'development',
+        'DEBUG': 'false'
+    }
+    # Forçar o MongoDB local no servidor de teste
+    env.pop('MONGODB_PASSWORD', None)
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(args.port)],
+        env=env, cwd=ROOT
+    )
+
+    try:
+        # Esperar o servidor (e o bootstrap de collections/índices) ficar pronto
+        import urllib.request
+        url = f"http://127.0.0.1:{args.port}"
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{url}/health", timeout=1)
+                break
+            except Exception:
+                time.sleep(0.2)
+        else:
+            raise SystemExit("Servidor de teste não respondeu")
+
+        conversations = seed(mongo[BENCH_DATABASE], max(1, args.clients // 2))
+        result = run_load(url, secret_key, conversations, args.messages, args.connect_rate)
+
+        print(f"Conexões:        {result['connected']}/{result['target']}")
+        print(f"Conexão (ms):    p50={result['connect_p50']:.1f} p95={result['connect_p95']:.1f}")
+        print(f"Mensagens:       {result['received']}/{result['sent']} entregues")
+        print(f"Latência (ms):   p50={result['latency_p50']:.1f} p95={result['latency_p95']:.1f} p99={result['latency_p99']:.1f}")
+        print(f"Throughput:      {result['throughput']:.0f} msg/s")
+        if result['errors']:
+            print(f"Erros ({len(result['errors'])}): {result['errors'][:5]}")
+
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        mongo.drop_database(BENCH_DATABASE)
+
+if __name__ == '__main__':
+    main()
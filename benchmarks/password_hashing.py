@@ -0,0 +1,99 @@
+"""Benchmark de logins (verificação de senha) por método/custo de hash
+
+Para cada método do werkzeug (--methods) e cada executor (--executors) de
+passwords.py, clientes concorrentes chamam verify_password em ciclo, como
+logins simultâneos. Em paralelo, uma thread "vizinha" mede o atraso de uma
+tarefa leve a cada 10 ms: é o que sofrem os outros requests do worker
+quando o hashing corre na thread do request (inline) e disputa o GIL.
+
+Mede logins por segundo, latência (p50/p99), recusas por fila cheia (os 429
+da rota de login) e o p99 do atraso da thread vizinha.
+
+Não precisa de MongoDB.
+
+Uso:
+    python benchmarks/password_hashing.py --methods scrypt:16384:8:1,scrypt,pbkdf2:sha256:600000 --concurrency 32
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_load import percentile
+
+def neighbour(stop, delays):
+    """Tarefa leve periódica: o atraso além dos 10 ms é tempo à espera do GIL"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(0.01)
+        delays.append((time.perf_counter() - started - 0.01) * 1000)
+
+def run_load(password_hash, concurrency, duration):
+    import passwords
+
+    latencies, busy = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(_):
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                if not passwords.verify_password(password_hash, 'senha-de-teste'):
+                    raise RuntimeError('verificação falhou')
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+            except passwords.HashingBusy:
+                with lock:
+                    busy[0] += 1
+                # O cliente real recebe 429 e tenta de novo mais tarde
+                time.sleep(0.05)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return latencies, busy[0]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de logins por custo de hash')
+    parser.add_argument('--methods', default='scrypt:16384:8:1,scrypt,pbkdf2:sha256:600000', help='Métodos do werkzeug, separados por vírgula')
+    parser.add_argument('--executors', default='inline,process', help='Executores de passwords.py, separados por vírgula')
+    parser.add_argument('--concurrency', type=int, default=32, help='Logins simultâneos')
+    parser.add_argument('--duration', type=float, default=10, help='Segundos por combinação')
+    parser.add_argument('--workers', type=int, default=None, help='PASSWORD_HASH_WORKERS')
+    parser.add_argument('--queue', type=int, default=None, help='PASSWORD_HASH_QUEUE')
+    args = parser.parse_args()
+
+    import passwords
+    from werkzeug.security import generate_password_hash
+
+    if args.workers:
+        passwords.PASSWORD_HASH_WORKERS = args.workers
+    queue = args.queue or passwords.PASSWORD_HASH_WORKERS * 4
+
+    print(f"{'método':<24} {'executor':<8} {'login/s':>8} {'p50':>8} {'p99':>8} {'429':>6} {'vizinho p99':>12}")
+    for method in args.methods.split(','):
+        password_hash = generate_password_hash('senha-de-teste', method)
+        for executor in args.executors.split(','):
+            passwords.PASSWORD_HASH_EXECUTOR = executor
+            # Inline não tem fila: o limite seria o próprio número de threads
+            passwords._slots = threading.BoundedSemaphore(queue if executor != 'inline' else args.concurrency)
+
+            stop, delays = threading.Event(), []
+            watcher = threading.Thread(target=neighbour, args=(stop, delays), daemon=True)
+            watcher.start()
+            try:
+                latencies, busy = run_load(password_hash, args.concurrency, args.duration)
+            finally:
+                stop.set()
+                watcher.join()
+
+            print(f"{method:<24} {executor:<8} {len(latencies) / args.duration:>8.1f} {percentile(latencies, 50):>8.1f} "
+                  f"{percentile(latencies, 99):>8.1f} {busy:>6} {percentile(delays, 99):>12.1f}")
+
+if __name__ == '__main__':
+    main()
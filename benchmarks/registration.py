@@ -0,0 +1,134 @@
+"""Benchmark do caminho de escrita do registro (registration.create_account)
+
+Registra contas em paralelo num database descartável do MongoDB local (com
+os índices de indexes.py) e compara:
+
+  - legacy       find_one(username), find_one(email), insert users, insert perfil
+  - two_phase    insert users (índice único decide), insert perfil, compensação
+  - transaction  usuário e perfil numa transação (exige replica set)
+
+Cada modo tem duas fases:
+  - únicos: cada registro com username/email novos (registros por segundo)
+  - corrida: todos os clientes tentam os mesmos --race-names usernames ao
+    mesmo tempo; deve sobrar exatamente um usuário (e um perfil) por nome
+
+O hash da senha é fixo para medir só o MongoDB.
+
+Uso:
+    python benchmarks/registration.py --modes legacy,two_phase,transaction --concurrency 32 --accounts 5000
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_load import percentile
+
+BENCH_DATABASE = 'txunajob_bench_registration'
+
+def account(name):
+    user_data = {
+        'username': name,
+        'email': f'{name}@bench.local',
+        'password_hash': '!',
+        'user_type': 'client',
+        'phone': '',
+        'location': '',
+        'created_at': datetime.utcnow()
+    }
+    return user_data, {'full_name': name, 'preferences': ''}
+
+def legacy_create(collections, user_data, profile_name, profile_data):
+    """Fluxo anterior: verificar e depois inserir (quatro round trips)"""
+    from registration import IdentityTaken
+
+    if collections['users'].find_one({'username': user_data['username']}):
+        raise IdentityTaken('username')
+    if collections['users'].find_one({'email': user_data['email']}):
+        raise IdentityTaken('email')
+    user_id = collections['users'].insert_one(user_data).inserted_id
+    collections[profile_name].insert_one({**profile_data, 'user_id': user_id})
+
+def run_phase(create, collections, names, concurrency):
+    """Registra cada nome de names; retorna (registros/s, latências, criados, recusados, erros)"""
+    from registration import IdentityTaken
+
+    latencies, counters = [], {'created': 0, 'taken': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def register(name):
+        user_data, profile_data = account(name)
+        started = time.perf_counter()
+        try:
+            create(collections, user_data, 'clients', profile_data)
+            outcome = 'created'
+        except IdentityTaken:
+            outcome = 'taken'
+        except Exception:
+            # Sem o índice (ou com a corrida perdida no insert) o fluxo legacy falha aqui
+            outcome = 'errors'
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+            counters[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(register, names))
+    elapsed = time.perf_counter() - started
+    return len(names) / elapsed, latencies, counters
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do caminho de escrita do registro')
+    parser.add_argument('--modes', default='legacy,two_phase,transaction', help='Modos, separados por vírgula')
+    parser.add_argument('--concurrency', type=int, default=32, help='Registros simultâneos')
+    parser.add_argument('--accounts', type=int, default=5000, help='Registros únicos por modo')
+    parser.add_argument('--race-names', type=int, default=50, help='Usernames disputados na fase de corrida')
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    import registration
+    from indexes import ensure_indexes
+
+    host = os.environ.get('MONGODB_LOCAL_HOST', 'localhost')
+    port = os.environ.get('MONGODB_LOCAL_PORT', '27017')
+    mongo = MongoClient(f"mongodb://{host}:{port}", serverSelectionTimeoutMS=5000, maxPoolSize=args.concurrency)
+    supports_transactions = mongo.topology_description.topology_type_name in registration._TRANSACTION_TOPOLOGIES
+    db = mongo[BENCH_DATABASE]
+
+    print(f"{'modo':<12} {'fase':<8} {'reg/s':>8} {'p50':>8} {'p99':>8} {'criados':>8} {'recusados':>9} {'erros':>6} {'duplicados':>10}")
+    try:
+        for mode in args.modes.split(','):
+            if mode == 'transaction' and not supports_transactions:
+                print(f"{mode:<12} ignorado: o MongoDB local não é replica set")
+                continue
+
+            mongo.drop_database(BENCH_DATABASE)
+            ensure_indexes(db)
+            collections = {name: db[name] for name in ('users', 'clients')}
+            registration.REGISTRATION_WRITE_MODE = mode
+            create = legacy_create if mode == 'legacy' else registration.create_account
+
+            unique_names = [f'{mode}_{index}' for index in range(args.accounts)]
+            race_names = [f'{mode}_race_{index % args.race_names}'
+                          for index in range(args.race_names * args.concurrency)]
+
+            for phase, names in (('únicos', unique_names), ('corrida', race_names)):
+                rate, latencies, counters = run_phase(create, collections, names, args.concurrency)
+                # Contas a mais que nomes distintos, ou perfis sem usuário (e vice-versa)
+                users = db.users.count_documents({})
+                expected = len(set(unique_names if phase == 'únicos' else unique_names + race_names))
+                duplicates = users - expected
+                orphans = abs(db.clients.count_documents({}) - users)
+                print(f"{mode:<12} {phase:<8} {rate:>8.1f} {percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f} "
+                      f"{counters['created']:>8} {counters['taken']:>9} {counters['errors']:>6} {max(duplicates, orphans, 0):>10}")
+    finally:
+        mongo.drop_database(BENCH_DATABASE)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Benchmark dos workers do gunicorn (sync vs eventlet) nos endpoints de dashboard
+
+Para cada classe de worker sobe o gunicorn com gunicorn.conf.py (server:app)
+apontado para um database descartável no MongoDB local, com um profissional
+(e os seus serviços) e um admin criados diretamente no database. Clientes
+concorrentes, autenticados por cookie de sessão assinado com o mesmo
+SECRET_KEY, chamam em ciclo:
+
+  - /api/professional/dashboard
+  - /api/admin/stats
+
+Mede requests por segundo e latência (p50/p95/p99) por endpoint.
+
+Uso:
+    python benchmarks/server_workers.py --classes sync,eventlet --concurrency 50 --duration 20
+"""
+import os
+import sys
+import time
+import random
+import secrets
+import argparse
+import subprocess
+import http.client
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_load import percentile, session_cookie
+
+BENCH_DATABASE = 'txunajob_bench_server'
+
+ENDPOINTS = {
+    'dashboard': ('/api/professional/dashboard', 'professional'),
+    'admin_stats': ('/api/admin/stats', 'admin')
+}
+
+def seed(db, services):
+    """Cria um profissional com N serviços (clientes variados) e um admin"""
+    from bson.objectid import ObjectId
+
+    now = datetime.utcnow()
+    professional_id, admin_id = ObjectId(), ObjectId()
+    client_ids = [ObjectId() for _ in range(50)]
+
+    users = [
+        {'_id': professional_id, 'username': 'bench_pro', 'email': 'pro@bench.local',
+         'password_hash': '!', 'user_type': 'professional', 'created_at': now},
+        {'_id': admin_id, 'username': 'bench_admin', 'email': 'admin@bench.local',
+         'password_hash': '!', 'user_type': 'admin', 'created_at': now}
+    ]
+    users += [
+        {'_id': client_id, 'username': f'bench_client_{index}', 'email': f'client_{index}@bench.local',
+         'password_hash': '!', 'user_type': 'client', 'created_at': now - timedelta(days=index)}
+        for index, client_id in enumerate(client_ids)
+    ]
+    db.users.insert_many(users)
+    db.professionals.insert_one({'user_id': professional_id, 'full_name': 'Profissional Bench',
+                                 'specialty': 'Eletricista', 'is_verified': True})
+    db.clients.insert_many([{'user_id': client_id, 'full_name': f'Cliente {index}'}
+                            for index, client_id in enumerate(client_ids)])
+
+    statuses = ['pending', 'accepted', 'in_progress', 'completed', 'cancelled']
+    db.services.insert_many([
+        {
+            'professional_id': professional_id,
+            'client_id': random.choice(client_ids),
+            'title': f'Serviço {index}',
+            'status': random.choice(statuses),
+            'price': random.randint(500, 5000),
+            'rating': random.choice([None, 3, 4, 5]),
+            'created_at': now - timedelta(hours=index),
+            'scheduled_date': now + timedelta(hours=random.randint(0, 24 * 7))
+        }
+        for index in range(services)
+    ])
+
+    return {'professional': str(professional_id), 'admin': str(admin_id)}
+
+def start_server(worker_class, port, env):
+    server_env = {**env, 'WEB_WORKER_CLASS': worker_class, 'PORT': str(port)}
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'server:app'],
+        env=server_env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.3)
+    raise SystemExit(f"Servidor na porta {port} não respondeu")
+
+def run_load(port, cookies, concurrency, duration):
+    """Cada cliente alterna entre os endpoints numa conexão keep-alive"""
+    latencies = {name: [] for name in ENDPOINTS}
+    errors = {name: 0 for name in ENDPOINTS}
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        names = list(ENDPOINTS)
+        step = index
+        while time.perf_counter() < stop_at:
+            name = names[step % len(names)]
+            step += 1
+            path, role = ENDPOINTS[name]
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': f'session={cookies[role]}'})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[name] += 1
+                    continue
+                latencies[name].append((time.perf_counter() - started) * 1000)
+            except (OSError, http.client.HTTPException):
+                errors[name] += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        connection.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+
+    return {
+        name: {
+            'requests': len(latencies[name]),
+            'rps': len(latencies[name]) / duration,
+            'p50': percentile(latencies[name], 50),
+            'p95': percentile(latencies[name], 95),
+            'p99': percentile(latencies[name], 99),
+            'errors': errors[name]
+        }
+        for name in ENDPOINTS
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sync vs eventlet nos endpoints de dashboard')
+    parser.add_argument('--classes', default='sync,eventlet', help='Classes de worker, separadas por vírgula')
+    parser.add_argument('--concurrency', type=int, default=50, help='Clientes simultâneos')
+    parser.add_argument('--duration', type=float, default=20, help='Segundos de carga por classe')
+    parser.add_argument('--services', type=int, default=500, help='Serviços do profissional de teste')
+    parser.add_argument('--workers', type=int, default=None, help='WEB_CONCURRENCY (padrão: derivado dos cores)')
+    parser.add_argument('--port', type=int, default=5060)
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+
+    host = os.environ.get('MONGODB_LOCAL_HOST', 'localhost')
+    port = os.environ.get('MONGODB_LOCAL_PORT', '27017')
+    mongo = MongoClient(f"mongodb://{host}:{port}", serverSelectionTimeoutMS=5000)
+    mongo.drop_database(BENCH_DATABASE)
+
+    secret_key = secrets.token_hex(32)
+    env = {
+        **os.environ,
+        'SECRET_KEY': secret_key,
+        'MONGODB_DATABASE': BENCH_DATABASE,
+        'FLASK_ENV': 'development',
+        'DEBUG': 'false'
+    }
+    # Forçar o MongoDB local no servidor de teste
+    env.pop('MONGODB_PASSWORD', None)
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+
+    try:
+        user_ids = seed(mongo[BENCH_DATABASE], args.services)
+        cookies = {role: session_cookie(secret_key, user_id) for role, user_id in user_ids.items()}
+
+        results = {}
+        for worker_class in args.classes.split(','):
+            server = start_server(worker_class, args.port, env)
+            try:
+                wait_ready(args.port)
+                results[worker_class] = run_load(args.port, cookies, args.concurrency, args.duration)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        print(f"{'classe':<10} {'endpoint':<12} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'erros':>6}")
+        for worker_class, endpoints in results.items():
+            for name, result in endpoints.items():
+                print(f"{worker_class:<10} {name:<12} {result['rps']:>8.1f} {result['p50']:>8.1f} "
+                      f"{result['p95']:>8.1f} {result['p99']:>8.1f} {result['errors']:>6}")
+
+    finally:
+        mongo.drop_database(BENCH_DATABASE)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark da busca de serviços (search.search_services) sobre 1M de serviços
+
+Semeia um database descartável no MongoDB local com --services anúncios
+(status 'available') de títulos, tags e descrições geradas a partir de um
+vocabulário por categoria, aplica os índices de indexes.py e mede a latência
+(p50/p95/p99) de cada tipo de consulta:
+
+  - termo comum / termo raro (relevância)
+  - termo + categoria
+  - listagem por categoria (sem termo)
+  - página profunda (10ª página via cursor) por termo e por categoria
+  - facetas ($facet) sem filtros e com termo
+
+A semeadura é reaproveitada entre execuções (--reseed para refazer).
+
+Uso:
+    python benchmarks/service_search.py --services 1000000 --iterations 200
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_load import percentile
+
+BENCH_DATABASE = 'txunajob_bench_search'
+
+VOCABULARY = {
+    'electrician': ['instalação', 'elétrica', 'tomadas', 'quadro', 'iluminação', 'curto-circuito', 'disjuntor'],
+    'plumber': ['canalização', 'torneira', 'fuga', 'esgoto', 'autoclismo', 'tubagem', 'desentupimento'],
+    'carpenter': ['móveis', 'portas', 'armários', 'madeira', 'janelas', 'prateleiras', 'restauro'],
+    'painter': ['pintura', 'paredes', 'fachada', 'verniz', 'interiores', 'textura', 'impermeabilização'],
+    'mechanic': ['motor', 'travões', 'embraiagem', 'diagnóstico', 'suspensão', 'revisão', 'óleo'],
+    'technician': ['computador', 'formatação', 'rede', 'impressora', 'vírus', 'wifi', 'telemóvel'],
+    'cleaner': ['limpeza', 'escritórios', 'vidros', 'carpetes', 'mudanças', 'pós-obra', 'desinfeção'],
+    'gardener': ['jardim', 'relva', 'poda', 'rega', 'plantas', 'paisagismo', 'sebes'],
+    'builder': ['construção', 'alvenaria', 'reboco', 'telhado', 'pavimento', 'muro', 'remodelação'],
+}
+COMMON_WORDS = ['serviço', 'rápido', 'profissional', 'qualidade', 'urgente', 'garantia', 'orçamento']
+LOCATIONS = ['Maputo', 'Matola', 'Beira', 'Nampula', 'Quelimane', 'Tete', 'Xai-Xai', 'Inhambane', 'Pemba', 'Lichinga']
+
+def make_service(index, now):
+    category = random.choice(list(VOCABULARY))
+    words = VOCABULARY[category]
+    # Termos raros (raro0..raro9, cada um em ~1 de 100 000 serviços) para buscas seletivas
+    rare = [f'raro{index // 10000 % 10}'] if index % 10000 == 0 else []
+    return {
+        'title': f"{random.choice(words).capitalize()} {random.choice(words)} {random.choice(COMMON_WORDS)}",
+        'description': ' '.join(random.choices(words + COMMON_WORDS, k=25) + rare),
+        'category': category,
+        'price': float(random.randint(500, 20000)),
+        'status': 'available',
+        'location': random.choice(LOCATIONS),
+        'duration': f'{random.randint(1, 8)}h',
+        'tags': random.sample(words, 3),
+        'professional_name': f'Profissional {index % 5000}',
+        'created_at': now - timedelta(minutes=index),
+        'updated_at': now
+    }
+
+def seed(db, services, batch=10000):
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    for offset in range(0, services, batch):
+        db.services.insert_many([make_service(index, now) for index in range(offset, min(offset + batch, services))],
+                                ordered=False)
+    print(f"{services} serviços semeados em {time.perf_counter() - started:.0f} s")
+
+def measure(function, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def deep_page(collection, pages, **kwargs):
+    from search import search_services
+
+    cursor = None
+    for _ in range(pages):
+        _, cursor = search_services(collection, cursor=cursor, **kwargs)
+        if cursor is None:
+            break
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da busca de serviços')
+    parser.add_argument('--services', type=int, default=1000000, help='Serviços semeados')
+    parser.add_argument('--iterations', type=int, default=200, help='Execuções por consulta')
+    parser.add_argument('--reseed', action='store_true', help='Apagar e semear de novo')
+    parser.add_argument('--drop', action='store_true', help='Apagar o database no fim')
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    from indexes import ensure_indexes
+    from search import search_services, facet_services
+
+    host = os.environ.get('MONGODB_LOCAL_HOST', 'localhost')
+    port = os.environ.get('MONGODB_LOCAL_PORT', '27017')
+    mongo = MongoClient(f"mongodb://{host}:{port}", serverSelectionTimeoutMS=5000)
+    db = mongo[BENCH_DATABASE]
+
+    try:
+        if args.reseed:
+            mongo.drop_database(BENCH_DATABASE)
+        if db.services.estimated_document_count() < args.services:
+            db.services.drop()
+            seed(db, args.services)
+        started = time.perf_counter()
+        ensure_indexes(db)
+        print(f"Índices aplicados em {time.perf_counter() - started:.0f} s")
+
+        services = db.services
+        queries = {
+            'termo comum': lambda: search_services(services, text='canalização'),
+            'termo raro': lambda: search_services(services, text='raro7'),
+            'dois termos': lambda: search_services(services, text='pintura fachada'),
+            'termo+categoria': lambda: search_services(services, text='urgente', category='plumber'),
+            'termo+local': lambda: search_services(services, text='jardim', location='Beira'),
+            'categoria': lambda: search_services(services, category='mechanic'),
+            'página 10 termo': lambda: deep_page(services, 10, text='motor'),
+            'página 10 categoria': lambda: deep_page(services, 10, category='builder'),
+            # Facetas: sem filtros (servida em cache pela rota) e com termo
+            'facetas sem filtros': lambda: facet_services(services),
+            'facetas termo': lambda: facet_services(services, text='limpeza'),
+        }
+
+        print(f"{'consulta':<22} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for name, query in queries.items():
+            query()  # aquecer cache do servidor
+            latencies = measure(query, args.iterations)
+            print(f"{name:<22} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f}")
+
+    finally:
+        if args.drop:
+            mongo.drop_database(BENCH_DATABASE)
+
+if __name__ == '__main__':
+    main()
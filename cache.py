@@ -0,0 +1,390 @@
+import os
+import time
+import random
+import sqlite3
+import logging
+import tempfile
+import threading
+from functools import wraps
+from collections import OrderedDict
+from bson import json_util
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+_MISSING = object()
+
+class LRUCache:
+    """Cache em memória com limite de entradas (LRU) e expiração por TTL
+
+    Seguro para uso entre threads. Vale apenas para o processo atual: cada
+    worker tem a sua cópia.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class MemoryCounters:
+    """Contadores em memória (versões de tags), sem expiração nem despejo"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def counter(self, key):
+        return self._values.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + 1
+
+class SQLiteCache:
+    """Cache partilhado entre workers do mesmo host num ficheiro SQLite
+
+    Os valores são serializados em JSON estendido (BSON), para suportar
+    ObjectId e datetime dos documentos do MongoDB.
+
+    Nada é aberto na construção: as instâncias criadas no import (no master,
+    com preload_app) só ligam ao ficheiro no primeiro uso em cada worker.
+    """
+
+    def __init__(self, path, namespace, ttl=60):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self._local = threading.local()
+        self._pid = None
+
+    def _connection(self):
+        # sqlite3 não permite partilhar ligações entre threads nem entre
+        # processos: uma por (pid, thread); após o fork descarta as herdadas
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._create_schema(connection)
+            self._local.connection = connection
+        return connection
+
+    def _create_schema(self, connection):
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'namespace TEXT, key TEXT, value TEXT, expires_at REAL, '
+                'PRIMARY KEY (namespace, key))'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS counters ('
+                'namespace TEXT, key TEXT, value INTEGER, '
+                'PRIMARY KEY (namespace, key))'
+            )
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?',
+            (self.namespace, key)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return json_util.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.namespace, key, json_util.dumps(value), time.time() + (ttl or self.ttl))
+            )
+            # Limpeza ocasional das entradas expiradas
+            if random.random() < 0.01:
+                connection.execute('DELETE FROM cache WHERE expires_at < ?', (time.time(),))
+
+    def counter(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE namespace = ? AND key = ?',
+            (self.namespace, key)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key):
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT INTO counters (namespace, key, value) VALUES (?, ?, 1) '
+                'ON CONFLICT (namespace, key) DO UPDATE SET value = value + 1',
+                (self.namespace, key)
+            )
+
+    def delete(self, key):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+
+class CacheStats:
+    """Contadores de acertos/falhas de um cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def incr(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self):
+        hits = self.local_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'errors': self.errors,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            # Cada acerto é uma consulta ao MongoDB que não foi feita
+            'db_round_trips_saved': hits
+        }
+
+class TieredCache:
+    """Cache em dois níveis: LRU local + (opcional) SQLite partilhado
+
+    get_or_load(key, loader) consulta o nível local, depois o partilhado e só
+    então chama loader(); resultados None não são guardados. Como o nível
+    local de outros workers não é invalidado, o TTL local define o atraso
+    máximo com que uma alteração chega a esses workers.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60, shared_path=None, shared_ttl=None):
+        self.name = name
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.shared = None
+        self.stats = CacheStats()
+
+        if shared_path:
+            # Ligação aberta no primeiro uso; falhas contam em stats.errors
+            self.shared = SQLiteCache(shared_path, name, ttl=shared_ttl or ttl)
+
+    def get_or_load(self, key, loader):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats.incr('local_hits')
+            return value
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key, _MISSING)
+            except sqlite3.Error:
+                self.stats.incr('errors')
+                value = _MISSING
+            if value is not _MISSING:
+                self.stats.incr('shared_hits')
+                self.local.set(key, value)
+                return value
+
+        self.stats.incr('misses')
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except sqlite3.Error:
+                self.stats.incr('errors')
+
+    def invalidate(self, key):
+        self.stats.incr('invalidations')
+        self.local.delete(key)
+        if self.shared is not None:
+            try:
+                self.shared.delete(key)
+            except sqlite3.Error:
+                self.stats.incr('errors')
+
+    def metrics(self):
+        return {
+            **self.stats.snapshot(),
+            'size': len(self.local),
+            'maxsize': self.local.maxsize,
+            'ttl': self.local.ttl,
+            'shared': self.shared is not None
+        }
+
+def tiered_cache_from_env(name, prefix, maxsize=1024, ttl=60):
+    """TieredCache configurado por variáveis <PREFIX>_SIZE, _TTL e _SHARED_PATH"""
+    return TieredCache(
+        name,
+        maxsize=int(os.environ.get(f'{prefix}_SIZE', maxsize)),
+        ttl=float(os.environ.get(f'{prefix}_TTL', ttl)),
+        shared_path=os.environ.get(f'{prefix}_SHARED_PATH') or None
+    )
+
+class _Flight:
+    """Cálculo em curso partilhado por pedidos concorrentes à mesma chave"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class TaggedCache:
+    """Cache de resultados com TTL, invalidação por tags e single-flight
+
+    Cada tag tem uma versão (contador); a chave de cada entrada inclui as
+    versões atuais das suas tags, por isso invalidate_tags('services') torna
+    inacessíveis todas as entradas marcadas com 'services' sem as procurar.
+    Pedidos concorrentes que falham a mesma chave esperam pelo primeiro em
+    vez de calcularem o mesmo resultado (dentro do processo).
+
+    O store é o LRU em memória (por worker) ou o SQLite partilhado; com o
+    SQLite as entradas e as versões das tags valem para todos os workers do host.
+    """
+
+    def __init__(self, store, counters, default_ttl=30, wait_timeout=30):
+        self.store = store
+        self.counters = counters
+        self.default_ttl = default_ttl
+        self.wait_timeout = wait_timeout
+        self.stats = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, name):
+        if name not in self.stats:
+            self.stats[name] = CacheStats()
+        return self.stats[name]
+
+    def _versioned_key(self, key, tags):
+        versions = ','.join(f'{tag}={self.counters.counter(f"tag:{tag}")}' for tag in tags)
+        return f'{key}|{versions}'
+
+    def get_or_compute(self, name, key, compute, ttl=None, tags=()):
+        stats = self._stats(name)
+        try:
+            full_key = self._versioned_key(key, tags)
+            value = self.store.get(full_key, _MISSING)
+        except sqlite3.Error:
+            stats.incr('errors')
+            return compute()
+
+        if value is not _MISSING:
+            stats.incr('local_hits')
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[full_key] = _Flight()
+
+        if not leader:
+            # Outro pedido já está a calcular: esperar pelo resultado dele
+            if flight.event.wait(self.wait_timeout) and flight.error is None:
+                stats.incr('shared_hits')
+                return flight.value
+            return compute()
+
+        stats.incr('misses')
+        try:
+            flight.value = compute()
+            try:
+                self.store.set(full_key, flight.value, ttl or self.default_ttl)
+            except sqlite3.Error:
+                stats.incr('errors')
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            flight.event.set()
+            with self._lock:
+                self._inflight.pop(full_key, None)
+
+    def cached(self, name, ttl=None, tags=()):
+        """Decorator para funções de cálculo (não views: a autorização fica na rota)
+
+        A chave é o nome mais os argumentos da chamada, que devem ter repr estável.
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                key = f'{name}:{args!r}:{sorted(kwargs.items())!r}'
+                return self.get_or_compute(name, key, lambda: function(*args, **kwargs), ttl=ttl, tags=tags)
+            return wrapper
+        return decorator
+
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            try:
+                self.counters.incr(f'tag:{tag}')
+            except sqlite3.Error:
+                logger.warning(f"Falha ao invalidar tag '{tag}' do cache")
+
+    def metrics(self):
+        # 'shared_hits' aqui são pedidos servidos pelo cálculo de outro (single-flight)
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+def tagged_cache_from_env(name, prefix, maxsize=1024, ttl=30):
+    """TaggedCache configurado por <PREFIX>_BACKEND (memory|sqlite), _PATH, _SIZE e _TTL"""
+    backend = os.environ.get(f'{prefix}_BACKEND', 'memory')
+    ttl = float(os.environ.get(f'{prefix}_TTL', ttl))
+
+    if backend == 'sqlite':
+        path = os.environ.get(f'{prefix}_PATH') or os.path.join(tempfile.gettempdir(), 'txunajob-cache.sqlite3')
+        # Ligação aberta no primeiro uso em cada worker; falhas caem no cálculo direto
+        store = SQLiteCache(path, name, ttl=ttl)
+        return TaggedCache(store, store, default_ttl=ttl)
+
+    store = LRUCache(maxsize=int(os.environ.get(f'{prefix}_SIZE', maxsize)), ttl=ttl)
+    return TaggedCache(store, MemoryCounters(), default_ttl=ttl)
+
+# Resultados calculados das rotas do admin (estatísticas e relatórios)
+response_cache = tagged_cache_from_env('responses', 'RESPONSE_CACHE')
+
+def invalidate_tags(*tags):
+    """Invalida as entradas de response_cache marcadas com qualquer das tags"""
+    response_cache.invalidate_tags(*tags)
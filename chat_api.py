@@ -0,0 +1,355 @@
+import logging
+from datetime import datetime
+from flask import Blueprint, jsonify, request, session
+from flask_login import login_required, current_user
+from flask_socketio import join_room, leave_room, emit
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from models import get_all_collections
+from realtime import socketio, user_room
+from resilience import db_guard, socket_guard
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+chat_api_routes = Blueprint('chat_api', __name__)
+
+# Limites de mensagens
+MAX_MESSAGE_LENGTH = 2000
+DEFAULT_HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 100
+
+def chat_room(chat_id):
+    """Sala Socket.IO de uma conversa"""
+    return f"chat:{chat_id}"
+
+def participants_key(user_a, user_b):
+    """Chave única e independente da ordem para o par de participantes"""
+    return ':'.join(sorted([str(user_a), str(user_b)]))
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def serialize_message(message):
+    return {
+        'id': str(message['_id']),
+        'chat_id': str(message['chat_id']),
+        'sender_id': str(message['sender_id']),
+        'receiver_id': str(message['receiver_id']),
+        'content': message.get('content', ''),
+        'created_at': _isoformat(message.get('created_at')),
+        'delivered_at': _isoformat(message.get('delivered_at')),
+        'is_read': message.get('is_read', False)
+    }
+
+def get_chat_for_user(collections, chat_id, user_id):
+    """Conversa com o id dado, apenas se o usuário for participante"""
+    try:
+        return collections['chats'].find_one({
+            '_id': ObjectId(chat_id),
+            'participants': ObjectId(user_id)
+        })
+    except InvalidId:
+        return None
+
+def other_participant(chat, user_id):
+    return next((p for p in chat['participants'] if str(p) != str(user_id)), None)
+
+# =============================================================================
+# API REST - LISTA DE CONVERSAS E HISTÓRICO
+# =============================================================================
+
+@chat_api_routes.route('/conversations')
+@login_required
+@db_guard()
+def api_chat_conversations():
+    """Conversas do usuário atual, mais recentes primeiro"""
+    collections = get_all_collections()
+    if collections['chats'] is None:
+        return jsonify({'error': 'Chat indisponível'}), 503
+
+    try:
+        user_id = ObjectId(current_user.id)
+        chats = list(collections['chats'].find(
+            {'participants': user_id}
+        ).sort('last_message_at', -1).limit(50))
+
+        # Nomes dos outros participantes numa única query
+        other_ids = [other_participant(chat, current_user.id) for chat in chats]
+        users_by_id = {}
+        if collections['users'] is not None and other_ids:
+            users_by_id = {
+                user['_id']: user for user in collections['users'].find(
+                    {'_id': {'$in': [uid for uid in other_ids if uid is not None]}},
+                    {'username': 1, 'user_type': 1}
+                )
+            }
+
+        conversations = []
+        for chat, other_id in zip(chats, other_ids):
+            other_user = users_by_id.get(other_id, {})
+            last_message = chat.get('last_message') or {}
+            conversations.append({
+                'id': str(chat['_id']),
+                'other_user_id': str(other_id) if other_id else None,
+                'other_user': other_user.get('username', 'Usuário'),
+                'user_type': other_user.get('user_type', ''),
+                'last_message': last_message.get('content', ''),
+                'timestamp': _isoformat(chat.get('last_message_at', chat.get('created_at'))),
+                'unread': chat.get('unread', {}).get(current_user.id, 0)
+            })
+
+        return jsonify(conversations)
+
+    except Exception as e:
+        print(f"Erro em api_chat_conversations: {e}")
+        return jsonify({'error': 'Erro ao carregar conversas'}), 500
+
+@chat_api_routes.route('/conversations', methods=['POST'])
+@login_required
+@db_guard()
+def api_chat_start_conversation():
+    """Obter ou criar a conversa com outro usuário (por user_id ou username)"""
+    collections = get_all_collections()
+    if collections['chats'] is None or collections['users'] is None:
+        return jsonify({'error': 'Chat indisponível'}), 503
+
+    data = request.get_json() or {}
+
+    try:
+        if data.get('user_id'):
+            other_user = collections['users'].find_one({'_id': ObjectId(data['user_id'])}, {'_id': 1})
+        elif data.get('username'):
+            other_user = collections['users'].find_one({'username': data['username']}, {'_id': 1})
+        else:
+            return jsonify({'error': 'Informe user_id ou username'}), 400
+    except InvalidId:
+        return jsonify({'error': 'Usuário inválido'}), 400
+
+    if not other_user:
+        return jsonify({'error': 'Usuário não encontrado'}), 404
+    if str(other_user['_id']) == current_user.id:
+        return jsonify({'error': 'Não é possível conversar consigo mesmo'}), 400
+
+    try:
+        now = datetime.utcnow()
+        user_id = ObjectId(current_user.id)
+        # Upsert pela chave única do par: idempotente mesmo com pedidos concorrentes
+        chat = collections['chats'].find_one_and_update(
+            {'participants_key': participants_key(user_id, other_user['_id'])},
+            {
+                '$setOnInsert': {
+                    'participants': [user_id, other_user['_id']],
+                    'created_at': now,
+                    'last_message_at': now,
+                    'unread': {}
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        return jsonify({'success': True, 'chat_id': str(chat['_id'])})
+
+    except Exception as e:
+        print(f"Erro em api_chat_start_conversation: {e}")
+        return jsonify({'error': 'Erro ao iniciar conversa'}), 500
+
+@chat_api_routes.route('/conversations/<chat_id>/messages')
+@login_required
+@db_guard()
+def api_chat_messages(chat_id):
+    """Histórico de mensagens (paginação por 'before' = id da mensagem mais antiga)"""
+    collections = get_all_collections()
+    if collections['chats'] is None or collections['messages'] is None:
+        return jsonify({'error': 'Chat indisponível'}), 503
+
+    chat = get_chat_for_user(collections, chat_id, current_user.id)
+    if not chat:
+        return jsonify({'error': 'Conversa não encontrada'}), 404
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_HISTORY_LIMIT)), MAX_HISTORY_LIMIT))
+    except ValueError:
+        limit = DEFAULT_HISTORY_LIMIT
+
+    query = {'chat_id': chat['_id']}
+    before = request.args.get('before')
+    if before:
+        try:
+            query['_id'] = {'$lt': ObjectId(before)}
+        except InvalidId:
+            return jsonify({'error': 'Cursor inválido'}), 400
+
+    try:
+        messages = list(collections['messages'].find(query).sort('_id', -1).limit(limit))
+        messages.reverse()
+        return jsonify([serialize_message(message) for message in messages])
+
+    except Exception as e:
+        print(f"Erro em api_chat_messages: {e}")
+        return jsonify({'error': 'Erro ao carregar mensagens'}), 500
+
+# =============================================================================
+# SOCKET.IO - TEMPO REAL
+# =============================================================================
+# A associação conversa -> outro participante fica em cache na sessão da
+# conexão após join_chat, para que send_message não precise de consultar a
+# conversa a cada mensagem.
+
+def _session_chats():
+    # Dentro de handlers Socket.IO, flask.session é uma cópia por conexão
+    return session.setdefault('chat_rooms', {})
+
+@socketio.on('join_chat')
+@socket_guard()
+def handle_join_chat(data):
+    """Entrar na sala de uma conversa (valida participação uma única vez)"""
+    if not current_user.is_authenticated:
+        return {'success': False, 'error': 'Não autenticado'}
+
+    chat_id = (data or {}).get('chat_id')
+    collections = get_all_collections()
+    if collections['chats'] is None:
+        return {'success': False, 'error': 'Chat indisponível'}
+
+    chat = get_chat_for_user(collections, chat_id, current_user.id)
+    if not chat:
+        return {'success': False, 'error': 'Conversa não encontrada'}
+
+    _session_chats()[chat_id] = str(other_participant(chat, current_user.id))
+    join_room(chat_room(chat_id))
+    return {'success': True}
+
+@socketio.on('leave_chat')
+def handle_leave_chat(data):
+    chat_id = (data or {}).get('chat_id')
+    if chat_id:
+        _session_chats().pop(chat_id, None)
+        leave_room(chat_room(chat_id))
+
+@socketio.on('send_message')
+@socket_guard()
+def handle_send_message(data):
+    """Persistir e distribuir uma mensagem; o retorno é o ack para o remetente"""
+    if not current_user.is_authenticated:
+        return {'success': False, 'error': 'Não autenticado'}
+
+    data = data or {}
+    chat_id = data.get('chat_id')
+    content = (data.get('content') or '').strip()
+
+    receiver_id = _session_chats().get(chat_id)
+    if not receiver_id:
+        return {'success': False, 'error': 'Entre na conversa antes de enviar mensagens'}
+    if not content:
+        return {'success': False, 'error': 'Mensagem vazia'}
+    if len(content) > MAX_MESSAGE_LENGTH:
+        return {'success': False, 'error': 'Mensagem muito longa'}
+
+    collections = get_all_collections()
+    if collections['messages'] is None or collections['chats'] is None:
+        return {'success': False, 'error': 'Chat indisponível'}
+
+    try:
+        now = datetime.utcnow()
+        message = {
+            'chat_id': ObjectId(chat_id),
+            'sender_id': ObjectId(current_user.id),
+            'receiver_id': ObjectId(receiver_id),
+            'content': content,
+            'created_at': now,
+            'delivered_at': None,
+            'is_read': False
+        }
+        message['_id'] = collections['messages'].insert_one(message).inserted_id
+
+        collections['chats'].update_one(
+            {'_id': ObjectId(chat_id)},
+            {
+                '$set': {
+                    'last_message_at': now,
+                    'last_message': {'content': content[:200], 'sender_id': message['sender_id']}
+                },
+                '$inc': {f'unread.{receiver_id}': 1}
+            }
+        )
+
+        payload = serialize_message(message)
+        # Sala da conversa (quem está com ela aberta) + sala do destinatário
+        # (notificação noutras páginas); o Socket.IO não duplica entregas
+        emit('new_message', payload, to=[chat_room(chat_id), user_room(receiver_id)], include_self=False)
+        return {'success': True, 'message': payload}
+
+    except PyMongoError:
+        # socket_guard emite chat_error e conta a falha no breaker
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao enviar mensagem: {str(e)[:100]}...")
+        return {'success': False, 'error': 'Erro ao enviar mensagem'}
+
+@socketio.on('message_delivered')
+@socket_guard()
+def handle_message_delivered(data):
+    """Confirmação de entrega enviada pelo destinatário"""
+    if not current_user.is_authenticated:
+        return
+
+    data = data or {}
+    chat_id = data.get('chat_id')
+    if chat_id not in _session_chats():
+        return
+
+    try:
+        message_ids = [ObjectId(message_id) for message_id in data.get('message_ids', [])]
+    except InvalidId:
+        return
+    if not message_ids:
+        return
+
+    collections = get_all_collections()
+    if collections['messages'] is None:
+        return
+
+    now = datetime.utcnow()
+    collections['messages'].update_many(
+        {'_id': {'$in': message_ids}, 'receiver_id': ObjectId(current_user.id), 'delivered_at': None},
+        {'$set': {'delivered_at': now}}
+    )
+    emit('messages_delivered', {
+        'chat_id': chat_id,
+        'message_ids': [str(message_id) for message_id in message_ids],
+        'delivered_at': now.isoformat()
+    }, to=chat_room(chat_id), include_self=False)
+
+@socketio.on('mark_read')
+@socket_guard()
+def handle_mark_read(data):
+    """Marcar como lidas todas as mensagens recebidas numa conversa"""
+    if not current_user.is_authenticated:
+        return
+
+    chat_id = (data or {}).get('chat_id')
+    if chat_id not in _session_chats():
+        return
+
+    collections = get_all_collections()
+    if collections['messages'] is None or collections['chats'] is None:
+        return {'success': False, 'error': 'Chat indisponível'}
+
+    now = datetime.utcnow()
+    collections['messages'].update_many(
+        {'chat_id': ObjectId(chat_id), 'receiver_id': ObjectId(current_user.id), 'is_read': False},
+        {'$set': {'is_read': True, 'read_at': now}}
+    )
+    collections['chats'].update_one(
+        {'_id': ObjectId(chat_id)},
+        {'$set': {f'unread.{current_user.id}': 0}}
+    )
+    emit('messages_read', {
+        'chat_id': chat_id,
+        'reader_id': current_user.id,
+        'read_at': now.isoformat()
+    }, to=chat_room(chat_id), include_self=False)
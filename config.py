@@ -1,15 +1,93 @@
 import os
+import time
+import random
 import secrets
+import hashlib
 import logging
+import threading
+from datetime import datetime
 from flask import Flask, request
 from pymongo import MongoClient
 from urllib.parse import quote_plus
+from indexes import ensure_indexes, INDEX_REGISTRY
+from resilience import mongo_breaker_listener
 
 # Configurar logging
 logger = logging.getLogger('txunajob')
 
-def configure_app(app):
-    """Configura a aplicação Flask com todas as definições necessárias"""
+# Collections da aplicação
+COLLECTIONS = ['users', 'clients', 'professionals', 'admins', 'services', 'chats', 'messages', 'rollups', 'settings', 'geocodes']
+
+# Versão do schema (collections + índices): muda sempre que o registro muda,
+# o que força um novo bootstrap na próxima inicialização
+SCHEMA_VERSION = hashlib.sha1(repr((COLLECTIONS, INDEX_REGISTRY)).encode('utf-8')).hexdigest()[:12]
+
+# Cliente MongoDB do processo. Em serverless, invocações "quentes" reutilizam
+# o mesmo processo e, com ele, o pool de conexões já aberto.
+_mongo_client = None
+
+# Pool de conexões por processo (server.py deriva o valor dos workers/threads)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+
+# Perfis de carga: cada um tem o seu cliente (pool próprio) e as suas
+# garantias de leitura/escrita. Qualquer opção pode ser sobreposta por
+# MONGO_<PERFIL>_<OPÇÃO>, ex: MONGO_ANALYTICS_READ_PREFERENCE=secondary.
+#   interactive  rotas do site e dashboards (o cliente principal)
+#   analytics    relatórios e estatísticas do admin: fora do primário e do pool interativo
+#   bulk         jobs em lote (rollups, recálculos): pool pequeno, escritas w=1
+WORKLOAD_PROFILES = {
+    'interactive': {
+        'max_pool_size': MONGO_MAX_POOL_SIZE,
+        'min_pool_size': MONGO_MIN_POOL_SIZE,
+        'read_preference': 'primary',
+        'read_concern': 'local',
+        'write_concern': 'majority',
+        'timeout_ms': None  # prazos por rota (resilience.db_guard)
+    },
+    'analytics': {
+        'max_pool_size': 10,
+        'min_pool_size': 0,
+        'read_preference': 'secondaryPreferred',
+        'read_concern': 'local',
+        'write_concern': 'majority',
+        'timeout_ms': 30000
+    },
+    'bulk': {
+        'max_pool_size': 5,
+        'min_pool_size': 0,
+        'read_preference': 'primary',
+        'read_concern': 'local',
+        'write_concern': '1',
+        'timeout_ms': 600000
+    },
+}
+
+# Clientes dos perfis além do interativo, criados sob demanda (após o fork)
+_workload_clients = {}
+_workload_lock = threading.Lock()
+
+# Método de conexão usado pelo cliente interativo ('atlas' ou 'local');
+# os clientes dos outros perfis apontam para o mesmo destino
+_connection_source = None
+
+# Reconexão em segundo plano quando o MongoDB não responde no arranque
+RECONNECT_BASE_DELAY = float(os.environ.get('MONGO_RECONNECT_BASE_SECONDS', 1))
+RECONNECT_MAX_DELAY = float(os.environ.get('MONGO_RECONNECT_MAX_SECONDS', 60))
+
+def is_deferred_init():
+    """Inicialização diferida: DEFERRED_INIT=true, ou por padrão na Vercel"""
+    value = os.environ.get('DEFERRED_INIT')
+    if value is not None:
+        return value.lower() == 'true'
+    return bool(os.environ.get('VERCEL'))
+
+def configure_app(app, connect_database=True):
+    """Configura a aplicação Flask com todas as definições necessárias
+
+    Com connect_database=False o cliente MongoDB não é criado aqui: é o caso
+    do servidor pre-fork (server.py), em que cada worker conecta após o fork.
+    """
     
     # Configuração de Segurança
     secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
@@ -25,28 +103,83 @@ def configure_app(app):
     app.config['PORT'] = int(os.environ.get('PORT', 5000))
 
     # Configuração MongoDB
-    app.mongo_client = get_mongo_connection()
+    app.deferred_init = is_deferred_init()
+    if connect_database:
+        configure_database(app)
+    else:
+        app.mongo_client = None
+        app.mongo_state = {'status': 'pending', 'attempts': 0, 'last_error': None, 'since': None}
+        configure_collections(app)
+    
+    # Registrar middleware de segurança
+    app.before_request(security_checks)
+
+def configure_database(app):
+    """Cria (ou reutiliza) o cliente MongoDB do processo e instala as collections"""
+    app.mongo_client = get_shared_mongo_connection(lazy=app.deferred_init)
+    app.mongo_state = {
+        'status': 'deferred' if app.deferred_init and app.mongo_client else 'connected',
+        'attempts': 0,
+        'last_error': None,
+        'since': datetime.utcnow().isoformat() + 'Z'
+    }
     
     if not app.mongo_client:
         logger.error("Não foi possível estabelecer conexão com MongoDB")
+        app.mongo_state['status'] = 'disconnected'
     
     configure_collections(app)
+
+def get_shared_mongo_connection(lazy=False):
+    """Cliente MongoDB do processo, criado na primeira chamada e reutilizado"""
+    global _mongo_client
+    if _mongo_client is None:
+        _mongo_client = get_mongo_connection(lazy=lazy)
+    return _mongo_client
+
+def workload_options(profile):
+    """Opções do MongoClient para um perfil de carga (com sobreposições do ambiente)"""
+    settings = dict(WORKLOAD_PROFILES[profile])
+    for option in settings:
+        env_value = os.environ.get(f'MONGO_{profile.upper()}_{option.upper()}')
+        if env_value is not None:
+            settings[option] = env_value
     
-    # Registrar middleware de segurança
-    app.before_request(security_checks)
+    write_concern = settings['write_concern']
+    options = {
+        'maxPoolSize': int(settings['max_pool_size']),
+        'minPoolSize': int(settings['min_pool_size']),
+        'readPreference': settings['read_preference'],
+        'readConcernLevel': settings['read_concern'],
+        'w': int(write_concern) if str(write_concern).isdigit() else write_concern,
+        'appname': f'txunajob-{profile}'
+    }
+    # timeoutMS (CSOT) define o maxTimeMS de cada operação do perfil
+    if settings['timeout_ms']:
+        options['timeoutMS'] = int(settings['timeout_ms'])
+    return options
+
+def get_mongo_connection(lazy=False, profile='interactive', sources=None):
+    """Estabelece conexão com MongoDB em ordem de prioridade
 
-def get_mongo_connection():
-    """Estabelece conexão com MongoDB em ordem de prioridade"""
-    connection_methods = [
-        get_mongodb_atlas_connection,  # Prioridade: Atlas
-        get_local_mongo_connection     # Fallback: local
-    ]
+    Com lazy=True o cliente é criado sem ping (connect=False): nenhuma espera
+    por seleção de servidor na inicialização, e o fallback local só é usado
+    quando não há credenciais do Atlas.
+    """
+    global _connection_source
+    connection_methods = {
+        'atlas': get_mongodb_atlas_connection,  # Prioridade: Atlas
+        'local': get_local_mongo_connection     # Fallback: local
+    }
     
-    for method in connection_methods:
+    for source in sources or connection_methods:
+        method = connection_methods[source]
         try:
-            client = method()
+            client = method(lazy=lazy, profile=profile)
             if client:
-                logger.info(f"Conectado via {method.__name__}")
+                logger.info(f"Conectado via {method.__name__} (perfil {profile})")
+                if profile == 'interactive':
+                    _connection_source = source
                 return client
         except Exception as e:
             logger.warning(f"Falha no método {method.__name__}: {str(e)[:100]}...")
@@ -54,7 +187,28 @@ def get_mongo_connection():
     
     return None
 
-def get_mongodb_atlas_connection():
+def get_workload_client(profile):
+    """Cliente do perfil de carga (o interativo é o cliente principal do processo)"""
+    if profile == 'interactive' or _connection_source is None:
+        return _mongo_client
+    
+    client = _workload_clients.get(profile)
+    if client is None:
+        with _workload_lock:
+            client = _workload_clients.get(profile)
+            if client is None:
+                client = get_mongo_connection(lazy=True, profile=profile, sources=[_connection_source])
+                if client is None:
+                    return _mongo_client
+                _workload_clients[profile] = client
+    return client
+
+def get_workload_database(profile):
+    """Database do perfil de carga (None sem conexão)"""
+    client = get_workload_client(profile)
+    return client[get_database_name()] if client else None
+
+def get_mongodb_atlas_connection(lazy=False, profile='interactive'):
     """Conecta ao MongoDB Atlas usando variáveis de ambiente"""
     
     # Obter credenciais das variáveis de ambiente
@@ -74,17 +228,24 @@ def get_mongodb_atlas_connection():
     flask_env = os.environ.get('FLASK_ENV', 'development')
     database_name = 'txunajob' if flask_env == 'production' else 'txunajob_dev'
     
-    # Construir URI do MongoDB Atlas
-    uri = f"mongodb+srv://{username_encoded}:{password_encoded}@{mongodb_cluster}/{database_name}?retryWrites=true&w=majority&appName=txunajob"
+    # Construir URI do MongoDB Atlas (write concern e demais opções vêm do perfil)
+    uri = f"mongodb+srv://{username_encoded}:{password_encoded}@{mongodb_cluster}/{database_name}?retryWrites=true"
     
     try:
         client = MongoClient(
             uri, 
             serverSelectionTimeoutMS=10000,
             connectTimeoutMS=15000,
-            socketTimeoutMS=30000
+            socketTimeoutMS=30000,
+            connect=not lazy,
+            event_listeners=[mongo_breaker_listener],
+            **workload_options(profile)
         )
         
+        if lazy:
+            logger.info(f"Cliente MongoDB Atlas criado (conexão diferida) - Database: {database_name}")
+            return client
+        
         client.admin.command('ping')
         logger.info(f"Conectado ao MongoDB Atlas - Database: {database_name}")
         return client
@@ -93,7 +254,7 @@ def get_mongodb_atlas_connection():
         logger.error(f"Erro ao conectar com MongoDB Atlas: {str(e)[:100]}...")
         return None
 
-def get_local_mongo_connection():
+def get_local_mongo_connection(lazy=False, profile='interactive'):
     """Conexão local como fallback para desenvolvimento"""
     try:
         flask_env = os.environ.get('FLASK_ENV', 'development')
@@ -108,9 +269,16 @@ def get_local_mongo_connection():
             uri,
             serverSelectionTimeoutMS=5000,
             connectTimeoutMS=10000,
-            socketTimeoutMS=15000
+            socketTimeoutMS=15000,
+            connect=not lazy,
+            event_listeners=[mongo_breaker_listener],
+            **workload_options(profile)
         )
         
+        if lazy:
+            logger.info(f"Cliente MongoDB local criado (conexão diferida) - Database: {database_name}")
+            return client
+        
         client.admin.command('ping')
         logger.info(f"Conectado ao MongoDB local - Database: {database_name}")
         return client
@@ -119,48 +287,128 @@ def get_local_mongo_connection():
         logger.warning(f"Erro na conexão local: {str(e)[:100]}...")
         return None
 
+def get_database_name():
+    """Nome do database de acordo com o ambiente (MONGODB_DATABASE sobrepõe)"""
+    if os.environ.get('MONGODB_DATABASE'):
+        return os.environ['MONGODB_DATABASE']
+    
+    flask_env = os.environ.get('FLASK_ENV', 'development')
+    return 'txunajob' if flask_env == 'production' else 'txunajob_dev'
+
 def configure_collections(app):
-    """Configura e verifica todas as collections necessárias"""
+    """Torna as collections acessíveis pela app (sem operações no database)
+
+    A criação de collections e índices fica em bootstrap_schema, executada
+    apenas quando o marcador de versão do schema está desatualizado.
+    """
     if app.mongo_client:
-        flask_env = os.environ.get('FLASK_ENV', 'development')
-        db_name = 'txunajob' if flask_env == 'production' else 'txunajob_dev'
-        
-        db = app.mongo_client[db_name]
-        
-        collections_to_create = [
-            'users', 'clients', 'professionals', 'admins', 
-            'services', 'chats', 'messages'
-        ]
-        
-        existing_collections = db.list_collection_names()
-        collections_created = 0
-        
-        for collection_name in collections_to_create:
-            if collection_name not in existing_collections:
-                db.create_collection(collection_name)
-                collections_created += 1
-                logger.info(f"Collection criada: {collection_name}")
-        
-        # Tornar collections acessíveis globalmente
-        app.users_collection = db.users
-        app.clients_collection = db.clients
-        app.professionals_collection = db.professionals
-        app.admins_collection = db.admins
-        app.services_collection = db.services
-        app.chats_collection = db.chats
-        app.messages_collection = db.messages
-        
-        logger.info(f"Database '{db_name}' configurado - Collections: {len(existing_collections)} existentes, {collections_created} criadas")
-        
+        install_database(app, app.mongo_client)
     else:
         logger.error("Modo manutenção - Sem conexão com database")
-        app.users_collection = None
-        app.clients_collection = None
-        app.professionals_collection = None
-        app.admins_collection = None
-        app.services_collection = None
-        app.chats_collection = None
-        app.messages_collection = None
+        app.mongo_db = None
+        app.collections = {collection_name: None for collection_name in COLLECTIONS}
+        for collection_name in COLLECTIONS:
+            setattr(app, f'{collection_name}_collection', None)
+
+def install_database(app, client):
+    """Instala cliente, database e collections na app
+
+    app.collections é trocado por inteiro e app.mongo_client (usado pelas
+    rotas para decidir o modo manutenção) é o último a mudar, para que um
+    request concorrente nunca veja a instalação pela metade.
+    """
+    db = client[get_database_name()]
+    for collection_name in COLLECTIONS:
+        setattr(app, f'{collection_name}_collection', db[collection_name])
+    app.collections = {collection_name: db[collection_name] for collection_name in COLLECTIONS}
+    app.mongo_db = db
+    app.mongo_client = client
+    logger.info(f"Database '{db.name}' configurado")
+
+def start_background_reconnect(app, on_connected=None):
+    """Tenta reconectar em segundo plano (backoff exponencial com jitter)
+
+    Ao conectar instala as collections na app e chama on_connected(app).
+    O estado fica em app.mongo_state (exposto em /health).
+    """
+    def reconnect_loop():
+        global _mongo_client
+        attempt = 0
+        while True:
+            # Jitter "equal": metade fixa + metade aleatória, para que vários
+            # workers não tentem todos ao mesmo tempo
+            delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            app.mongo_state['next_retry_in'] = round(delay, 1)
+            time.sleep(delay)
+            
+            attempt += 1
+            app.mongo_state.update({'status': 'connecting', 'attempts': attempt, 'last_error': None})
+            try:
+                client = get_mongo_connection()
+            except Exception as e:
+                client = None
+                app.mongo_state['last_error'] = str(e)[:100]
+            
+            if client:
+                _mongo_client = client
+                install_database(app, client)
+                app.mongo_state.update({
+                    'status': 'connected',
+                    'last_error': None,
+                    'next_retry_in': None,
+                    'since': datetime.utcnow().isoformat() + 'Z'
+                })
+                logger.info(f"Reconectado ao MongoDB após {attempt} tentativas")
+                if on_connected:
+                    try:
+                        on_connected(app)
+                    except Exception as e:
+                        logger.error(f"Erro após reconexão: {str(e)[:100]}...")
+                return
+            
+            app.mongo_state['status'] = 'disconnected'
+            app.mongo_state['last_error'] = app.mongo_state['last_error'] or 'MongoDB inacessível'
+            logger.warning(f"Reconexão ao MongoDB falhou (tentativa {attempt})")
+    
+    thread = threading.Thread(target=reconnect_loop, name='mongo-reconnect', daemon=True)
+    thread.start()
+    return thread
+
+def read_schema_marker(db):
+    """Marcador persistido do último bootstrap ({} se nunca executado)"""
+    return db.meta.find_one({'_id': 'schema'}) or {}
+
+def write_schema_marker(db, **fields):
+    db.meta.update_one(
+        {'_id': 'schema'},
+        {'$set': {**fields, 'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+def bootstrap_schema(db):
+    """Cria collections em falta e aplica o registro de índices
+
+    Retorna as divergências que ficaram por resolver ({collection: relatório},
+    só com índices em falta ou divergentes); vazio quando o schema está
+    completo. Erros de conexão propagam para quem chama.
+    """
+    existing_collections = db.list_collection_names()
+    collections_created = 0
+    
+    for collection_name in COLLECTIONS:
+        if collection_name not in existing_collections:
+            db.create_collection(collection_name)
+            collections_created += 1
+            logger.info(f"Collection criada: {collection_name}")
+    
+    # Aplicar registro de índices (idempotente); os únicos de users garantem
+    # a unicidade no registro (registration.create_account)
+    remaining = ensure_indexes(db)
+    pending = {name: report for name, report in remaining.items() if report['missing'] or report['changed']}
+    
+    logger.info(f"Schema {SCHEMA_VERSION} aplicado - Collections: {len(existing_collections)} existentes, {collections_created} criadas")
+    return pending
 
 def security_checks():
     """Middleware para verificações de segurança"""
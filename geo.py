@@ -0,0 +1,204 @@
+import os
+import logging
+import unicodedata
+from datetime import datetime
+from pymongo.errors import PyMongoError
+from cache import LRUCache
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Gazetteer offline: cidades e vilas de Moçambique -> (longitude, latitude).
+# Cobre as capitais provinciais e os maiores centros urbanos; nomes fora da
+# lista ficam pendentes em geocodes e são resolvidos por 'flask geo refresh'.
+GAZETTEER = {
+    'maputo': (32.5732, -25.9692),
+    'matola': (32.4589, -25.9622),
+    'boane': (32.3269, -26.0456),
+    'marracuene': (32.6753, -25.7383),
+    'namaacha': (32.0197, -25.9822),
+    'xai-xai': (33.6442, -25.0519),
+    'chokwe': (33.0053, -24.5328),
+    'chibuto': (33.5306, -24.6867),
+    'inhambane': (35.3833, -23.8650),
+    'maxixe': (35.3473, -23.8597),
+    'massinga': (35.3758, -23.3206),
+    'vilankulo': (35.3139, -21.9947),
+    'beira': (34.8389, -19.8436),
+    'dondo': (34.7425, -19.6094),
+    'chimoio': (33.4833, -19.1164),
+    'manica': (32.8738, -18.9364),
+    'tete': (33.5867, -16.1564),
+    'moatize': (33.7333, -16.1167),
+    'quelimane': (36.8883, -17.8786),
+    'mocuba': (36.9856, -16.8392),
+    'gurue': (36.9833, -15.4667),
+    'nampula': (39.2666, -15.1165),
+    'nacala': (40.6728, -14.5428),
+    'angoche': (39.9086, -16.2325),
+    'ilha de mocambique': (40.7356, -15.0342),
+    'cuamba': (36.5372, -14.8031),
+    'lichinga': (35.2433, -13.3128),
+    'pemba': (40.5178, -12.9742),
+    'montepuez': (38.9997, -13.1256),
+    'mocimboa da praia': (40.3542, -11.3167),
+}
+
+# Nomes alternativos comuns
+ALIASES = {
+    'lourenco marques': 'maputo',
+    'cidade de maputo': 'maputo',
+    'vilanculos': 'vilankulo',
+    'xai xai': 'xai-xai',
+    'ilha': 'ilha de mocambique',
+}
+
+GEOCODES_COLLECTION = 'geocodes'
+
+# Resultados já consultados no processo (inclusive "desconhecido"), para não
+# repetir a leitura em geocodes a cada registro; o TTL deixa ver os nomes
+# resolvidos entretanto pelo job offline
+_resolved = LRUCache(
+    maxsize=int(os.environ.get('GEOCODE_MEMORY_SIZE', 5000)),
+    ttl=int(os.environ.get('GEOCODE_MEMORY_TTL', 300))
+)
+_UNKNOWN = object()
+
+def normalize_location(name):
+    """Chave de busca: minúsculas, sem acentos, só a parte antes da vírgula ('Beira, Sofala')"""
+    if not name:
+        return ''
+    name = name.split(',')[0]
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    name = ' '.join(name.lower().split())
+    return ALIASES.get(name, name)
+
+def geo_point(longitude, latitude):
+    """Ponto GeoJSON (ordem longitude, latitude)"""
+    return {'type': 'Point', 'coordinates': [float(longitude), float(latitude)]}
+
+def resolve_location(db, name, record_pending=False):
+    """Ponto GeoJSON de um nome de local, sem chamadas a serviços externos
+
+    Ordem: gazetteer, memória do processo, collection geocodes (resultados
+    de 'flask geo refresh'). Nomes desconhecidos retornam None; com
+    record_pending=True (registro, criação de serviço, backfill) ficam
+    pendentes para o job offline. Buscas anónimas só leem, para não encher
+    geocodes (e o Nominatim) com texto livre.
+    """
+    key = normalize_location(name)
+    if not key:
+        return None
+    if key in GAZETTEER:
+        return geo_point(*GAZETTEER[key])
+    point = _resolved.get(key, _UNKNOWN)
+    if point is not _UNKNOWN:
+        return point
+
+    point = None
+    try:
+        cached = db[GEOCODES_COLLECTION].find_one({'_id': key}, {'point': 1})
+        if cached is None:
+            if not record_pending:
+                # Não guardar em memória: um registro posterior com o mesmo nome tem de o deixar pendente
+                return None
+            db[GEOCODES_COLLECTION].update_one(
+                {'_id': key},
+                {'$setOnInsert': {'name': name.strip(), 'point': None, 'status': 'pending', 'created_at': datetime.utcnow()}},
+                upsert=True
+            )
+        else:
+            point = cached.get('point')
+    except PyMongoError as e:
+        # Sem coordenadas o registro segue; o backfill completa depois
+        logger.warning(f"Geocode de '{key}' indisponível: {str(e)[:100]}...")
+        return None
+
+    _resolved.set(key, point)
+    return point
+
+def refresh_geocodes(db, geocoder=None, limit=500):
+    """Resolve os nomes pendentes com um geocoder externo (job offline, fora dos requests)
+
+    geocoder(nome) -> (longitude, latitude) ou None; por padrão Nominatim via
+    geopy, restrito a Moçambique e a 1 pedido por segundo. Retorna
+    {'resolved': n, 'not_found': n}.
+    """
+    if geocoder is None:
+        from geopy.geocoders import Nominatim
+        from geopy.extra.rate_limiter import RateLimiter
+
+        nominatim = RateLimiter(Nominatim(user_agent='txunajob-geocoder').geocode, min_delay_seconds=1)
+
+        def geocoder(name):
+            found = nominatim(name, country_codes='mz')
+            return (found.longitude, found.latitude) if found else None
+
+    summary = {'resolved': 0, 'not_found': 0}
+    for pending in db[GEOCODES_COLLECTION].find({'status': 'pending'}).limit(limit):
+        coordinates = geocoder(pending.get('name') or pending['_id'])
+        update = {'status': 'resolved' if coordinates else 'not_found', 'updated_at': datetime.utcnow()}
+        if coordinates:
+            update['point'] = geo_point(*coordinates)
+        db[GEOCODES_COLLECTION].update_one({'_id': pending['_id']}, {'$set': update})
+        summary[update['status']] += 1
+    return summary
+
+def backfill_points(db):
+    """Preenche 'geo' em perfis de profissionais e serviços que ainda não têm coordenadas
+
+    Retorna {'professionals': n, 'services': n} documentos atualizados.
+    """
+    summary = {'professionals': 0, 'services': 0}
+
+    # O local do profissional está no documento de users
+    for professional in db.professionals.find({'geo': {'$exists': False}}, {'user_id': 1}):
+        user = db.users.find_one({'_id': professional['user_id']}, {'location': 1})
+        point = resolve_location(db, (user or {}).get('location'), record_pending=True)
+        if point:
+            db.professionals.update_one({'_id': professional['_id']}, {'$set': {'geo': point}})
+            summary['professionals'] += 1
+
+    for location in db.services.distinct('location', {'geo': {'$exists': False}}):
+        point = resolve_location(db, location, record_pending=True)
+        if point:
+            result = db.services.update_many({'location': location, 'geo': {'$exists': False}}, {'$set': {'geo': point}})
+            summary['services'] += result.modified_count
+
+    return summary
+
+NEARBY_PROJECTION = {
+    'user_id': 1,
+    'full_name': 1,
+    'specialty': 1,
+    'experience': 1,
+    'description': 1,
+    'hourly_rate': 1,
+    'geo': 1,
+    'distance': 1
+}
+
+def nearby_professionals(collection, point, specialty=None, max_distance_km=50, limit=20):
+    """Profissionais verificados mais próximos de point, por distância crescente
+
+    $geoNear usa professionals_geo_verified_specialty (2dsphere); 'distance'
+    vem em metros.
+    """
+    query = {'is_verified': True}
+    if specialty:
+        query['specialty'] = specialty
+
+    return list(collection.aggregate([
+        {
+            '$geoNear': {
+                'near': point,
+                'key': 'geo',
+                'distanceField': 'distance',
+                'maxDistance': max_distance_km * 1000,
+                'query': query,
+                'spherical': True
+            }
+        },
+        {'$limit': limit},
+        {'$project': NEARBY_PROJECTION}
+    ]))
@@ -0,0 +1,98 @@
+# =============================================
+# CONFIGURAÇÃO DO GUNICORN
+# =============================================
+#
+#   gunicorn -c gunicorn.conf.py server:app
+#
+# Variáveis de ambiente:
+#   WEB_WORKER_CLASS        sync | eventlet (padrão: eventlet, necessário para WebSocket)
+#   WEB_CONCURRENCY         número de workers (padrão: derivado dos cores)
+#   WEB_THREADS             threads por worker sync (padrão: 1; 2*cores+1 com um único worker)
+#   SOCKETIO_MESSAGE_QUEUE  message queue do Socket.IO (obrigatória com mais de um worker)
+#   WEB_WORKER_CONNECTIONS  conexões simultâneas por worker eventlet (padrão: 1000)
+#   MONGO_MAX_POOL_SIZE     pool MongoDB por worker (padrão: derivado da concorrência)
+#   PASSWORD_HASH_EXECUTOR  process | tpool | inline (padrão: process; tpool em eventlet)
+
+import os
+import multiprocessing
+
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'eventlet')
+if worker_class not in ('sync', 'eventlet'):
+    raise RuntimeError(f"WEB_WORKER_CLASS inválido: {worker_class} (use sync ou eventlet)")
+
+if worker_class == 'eventlet':
+    # preload_app importa a app no master: o patch tem de vir antes de
+    # qualquer import de rede/threading para valer também nos workers
+    import eventlet
+    eventlet.monkey_patch()
+    # multiprocessing não convive com o monkey patch: hashing de senhas em threads nativas
+    os.environ.setdefault('PASSWORD_HASH_EXECUTOR', 'tpool')
+else:
+    # Socket.IO sem eventlet: long-polling em threads (o dashboard volta a
+    # fazer polling quando não há WebSocket)
+    os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+
+cores = multiprocessing.cpu_count()
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', 1000))
+
+# Socket.IO com vários workers exige message queue partilhada (e sessões
+# sticky no balanceador): sem ela o long-polling cai noutro worker a cada
+# pedido e a sessão falha com "Invalid session"
+message_queue = bool(os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
+
+def derive_workers():
+    if os.environ.get('WEB_CONCURRENCY'):
+        requested = int(os.environ['WEB_CONCURRENCY'])
+        if requested > 1 and not message_queue:
+            raise RuntimeError("WEB_CONCURRENCY > 1 exige SOCKETIO_MESSAGE_QUEUE (e sessões sticky no balanceador)")
+        return requested
+    # Sem message queue, um único worker (em sync, com threads: ver derive_threads)
+    if not message_queue:
+        return 1
+    if worker_class == 'sync':
+        # Workers bloqueantes: a espera por I/O do MongoDB é coberta por mais processos
+        return 2 * cores + 1
+    return cores
+
+def derive_threads(workers):
+    if os.environ.get('WEB_THREADS'):
+        return int(os.environ['WEB_THREADS'])
+    # Worker sync único: a concorrência passa para threads (gunicorn usa gthread)
+    if worker_class == 'sync' and workers == 1:
+        return 2 * cores + 1
+    return 1
+
+def derive_pool_size():
+    """Pool por worker: o máximo de operações MongoDB simultâneas que o worker gera"""
+    dashboard_workers = int(os.environ.get('DASHBOARD_QUERY_WORKERS', 8))
+    if worker_class == 'sync':
+        # Uma conexão por thread de request + o fan-out do dashboard
+        return threads + dashboard_workers
+    # Em eventlet a concorrência é de worker_connections greenlets; limitar o
+    # pool evita abrir centenas de conexões ao Atlas por worker
+    return min(worker_connections, 50)
+
+workers = derive_workers()
+threads = derive_threads(workers)
+
+# Lido por config.py ao importar a app (por isso antes do preload)
+os.environ.setdefault('MONGO_MAX_POOL_SIZE', str(derive_pool_size()))
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+def post_worker_init(worker):
+    """Após o fork (e, em eventlet, após o monkey patch do worker): cliente MongoDB próprio"""
+    from server import connect_worker
+    connect_worker(worker.wsgi)
+
+def when_ready(server):
+    pool_size = int(os.environ['MONGO_MAX_POOL_SIZE'])
+    server.log.info(
+        f"TxunaJob: {workers} workers {worker_class} ({cores} cores), "
+        f"pool MongoDB {pool_size}/worker, até {workers * pool_size} conexões no total"
+    )
@@ -0,0 +1,22 @@
+from functools import wraps
+from flask import request, make_response
+
+def conditional_response(view):
+    """Adiciona ETag forte à resposta e responde 304 a If-None-Match
+
+    O ETag é o hash do corpo serializado, portanto muda sempre que o
+    payload muda. Com 'Cache-Control: no-cache' o navegador revalida a
+    cada polling e, quando nada mudou, recebe 304 sem corpo e reutiliza
+    a cópia em cache.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        
+        if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.direct_passthrough:
+            response.add_etag()
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.make_conditional(request)
+        
+        return response
+    return wrapper
@@ -0,0 +1,205 @@
+import logging
+from pymongo import ASCENDING, DESCENDING, TEXT, GEOSPHERE, IndexModel
+from pymongo.errors import PyMongoError
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# =============================================
+# REGISTRO DECLARATIVO DE ÍNDICES
+# =============================================
+# Cada entrada corresponde a uma query real das rotas. Ao adicionar uma
+# query nova, declare aqui o índice que a serve.
+
+INDEX_REGISTRY = {
+    'users': [
+        # User.find_by_username / duplicados no registro (registration.create_account)
+        {'name': 'users_username_unique', 'keys': [('username', ASCENDING)], 'unique': True},
+        # User.find_by_email / duplicados no registro (registration.create_account)
+        {'name': 'users_email_unique', 'keys': [('email', ASCENDING)], 'unique': True},
+        # admin_api: lista paginada de usuários (keyset em created_at, _id),
+        # novos usuários do mês, relatório de crescimento
+        {'name': 'users_created_at_id', 'keys': [('created_at', DESCENDING), ('_id', DESCENDING)]},
+        # admin_api: lista paginada filtrada por tipo, contagem por tipo e busca de admin existente
+        {'name': 'users_type_created_at_id', 'keys': [('user_type', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]},
+    ],
+    'clients': [
+        {'name': 'clients_user_id', 'keys': [('user_id', ASCENDING)]},
+    ],
+    'professionals': [
+        {'name': 'professionals_user_id', 'keys': [('user_id', ASCENDING)]},
+        # admin_api: verificações pendentes (apenas profissionais não verificados)
+        {
+            'name': 'professionals_unverified',
+            'keys': [('is_verified', ASCENDING)],
+            'partialFilterExpression': {'is_verified': False}
+        },
+        # public_api.api_nearby_professionals ($geoNear por especialidade, só verificados)
+        {'name': 'professionals_geo_verified_specialty', 'keys': [('geo', GEOSPHERE), ('is_verified', ASCENDING), ('specialty', ASCENDING)]},
+        # public_api.api_list_professionals: verificados por ranking_score (keyset), com e sem especialidade
+        {'name': 'professionals_verified_ranking', 'keys': [('is_verified', ASCENDING), ('ranking_score', DESCENDING), ('_id', DESCENDING)]},
+        {'name': 'professionals_verified_specialty_ranking', 'keys': [('is_verified', ASCENDING), ('specialty', ASCENDING), ('ranking_score', DESCENDING), ('_id', DESCENDING)]},
+    ],
+    'admins': [
+        {'name': 'admins_user_id', 'keys': [('user_id', ASCENDING)]},
+    ],
+    'services': [
+        # professional_api.api_professional_stats (serviços ativos) e ações de status
+        {'name': 'services_professional_status', 'keys': [('professional_id', ASCENDING), ('status', ASCENDING)]},
+        # professional_api: lista de serviços, avaliações e clientes do mês
+        {'name': 'services_professional_created_at', 'keys': [('professional_id', ASCENDING), ('created_at', DESCENDING)]},
+        # professional_api.api_professional_schedule
+        {'name': 'services_professional_scheduled_date', 'keys': [('professional_id', ASCENDING), ('scheduled_date', ASCENDING)]},
+        # admin_api: lista paginada de serviços (keyset em created_at, _id) e serviços do mês
+        {'name': 'services_created_at_id', 'keys': [('created_at', DESCENDING), ('_id', DESCENDING)]},
+        # admin_api: lista paginada filtrada por status
+        {'name': 'services_status_created_at_id', 'keys': [('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]},
+        # admin_api: contagens por status, atividades e relatório financeiro
+        {'name': 'services_status_completed_at', 'keys': [('status', ASCENDING), ('completed_at', DESCENDING)]},
+        # rollups.refresh_rollups: serviços alterados desde o último refresh
+        {'name': 'services_updated_at', 'keys': [('updated_at', DESCENDING)]},
+        # search.search_services: busca por relevância (título pesa mais que tags e descrição)
+        {
+            'name': 'services_text',
+            'keys': [('title', TEXT), ('tags', TEXT), ('description', TEXT)],
+            'weights': {'title': 10, 'tags': 5, 'description': 1},
+            'default_language': 'portuguese'
+        },
+        # search.search_services: listagem sem termo filtrada por categoria
+        {'name': 'services_status_category_created_at_id', 'keys': [('status', ASCENDING), ('category', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]},
+    ],
+    'chats': [
+        # chat_api.api_chat_conversations (lista de conversas do usuário)
+        {'name': 'chats_participants_last_message', 'keys': [('participants', ASCENDING), ('last_message_at', DESCENDING)]},
+        # chat_api.api_chat_start_conversation (uma conversa por par de usuários)
+        {
+            'name': 'chats_participants_key_unique',
+            'keys': [('participants_key', ASCENDING)],
+            'unique': True,
+            'partialFilterExpression': {'participants_key': {'$exists': True}}
+        },
+    ],
+    'rollups': [
+        # rollups.read_rollups (relatórios) e limpeza de buckets recalculados
+        {'name': 'rollups_metric_granularity_period', 'keys': [('metric', ASCENDING), ('granularity', ASCENDING), ('period', ASCENDING)]},
+    ],
+    'messages': [
+        # professional_api.api_professional_stats (mensagens não lidas)
+        {'name': 'messages_receiver_is_read', 'keys': [('receiver_id', ASCENDING), ('is_read', ASCENDING)]},
+        # chat_api: histórico paginado e marcação de leitura por conversa
+        {'name': 'messages_chat_id', 'keys': [('chat_id', ASCENDING), ('_id', DESCENDING)]},
+    ],
+}
+
+# Opções de índice comparadas ao detectar divergências
+INDEX_OPTIONS = ('unique', 'partialFilterExpression', 'sparse', 'expireAfterSeconds', 'weights', 'default_language')
+
+def _declared_options(spec):
+    """Opções relevantes de um índice declarado"""
+    return {option: spec[option] for option in INDEX_OPTIONS if option in spec}
+
+def _actual_options(info):
+    """Opções relevantes de um índice existente (index_information)"""
+    options = {option: info[option] for option in INDEX_OPTIONS if option in info}
+    # O servidor omite unique=False; normalizar para comparar com o registro
+    if options.get('unique') is False:
+        options.pop('unique')
+    return options
+
+def _normalize_keys(keys):
+    normalized = []
+    for field, direction in keys:
+        if field == '_ftsx':
+            continue
+        if direction == TEXT:
+            # O servidor guarda os campos de texto como ('_fts', 'text'), ('_ftsx', 1);
+            # os campos e pesos ficam em 'weights'
+            if ('_fts', TEXT) not in normalized:
+                normalized += [('_fts', TEXT), ('_ftsx', 1)]
+            continue
+        normalized.append((field, int(direction) if isinstance(direction, (int, float)) else direction))
+    return normalized
+
+def _index_model(spec):
+    """Converte uma entrada do registro em IndexModel"""
+    options = _declared_options(spec)
+    return IndexModel(spec['keys'], name=spec['name'], **options)
+
+def index_drift(db):
+    """Compara índices declarados com os existentes no database
+
+    Retorna um dict por collection com as chaves 'missing', 'changed' e
+    'extra' (apenas collections com divergência aparecem no resultado).
+    """
+    drift = {}
+
+    for collection_name, specs in INDEX_REGISTRY.items():
+        try:
+            existing = db[collection_name].index_information()
+        except PyMongoError as e:
+            logger.warning(f"Não foi possível ler índices de {collection_name}: {str(e)[:100]}...")
+            continue
+
+        existing.pop('_id_', None)
+        declared_names = set()
+        report = {'missing': [], 'changed': [], 'extra': []}
+
+        for spec in specs:
+            declared_names.add(spec['name'])
+            info = existing.get(spec['name'])
+
+            if info is None:
+                report['missing'].append(spec['name'])
+                continue
+
+            same_keys = _normalize_keys(info['key']) == _normalize_keys(spec['keys'])
+            same_options = _actual_options(info) == _declared_options(spec)
+            if not same_keys or not same_options:
+                report['changed'].append(spec['name'])
+
+        report['extra'] = sorted(set(existing) - declared_names)
+
+        if any(report.values()):
+            drift[collection_name] = report
+
+    return drift
+
+def ensure_indexes(db, drop_changed=False):
+    """Aplica o registro de índices de forma idempotente
+
+    Cria apenas os índices em falta. Índices com definição divergente são
+    reportados e só são recriados quando drop_changed=True.
+    Retorna o relatório de divergências restante após a aplicação.
+    """
+    drift = index_drift(db)
+
+    for collection_name, report in drift.items():
+        specs = {spec['name']: spec for spec in INDEX_REGISTRY[collection_name]}
+        to_create = list(report['missing'])
+
+        if drop_changed:
+            for name in report['changed']:
+                try:
+                    db[collection_name].drop_index(name)
+                    to_create.append(name)
+                    logger.info(f"Índice divergente removido: {collection_name}.{name}")
+                except PyMongoError as e:
+                    logger.error(f"Erro ao remover índice {collection_name}.{name}: {str(e)[:100]}...")
+
+        # Criar um índice por vez: uma falha (ex: duplicados num índice único)
+        # não deve impedir os restantes
+        for name in to_create:
+            try:
+                db[collection_name].create_indexes([_index_model(specs[name])])
+                logger.info(f"Índice criado: {collection_name}.{name}")
+            except PyMongoError as e:
+                logger.error(f"Erro ao criar índice {collection_name}.{name}: {str(e)[:100]}...")
+
+    remaining = index_drift(db)
+    for collection_name, report in remaining.items():
+        if report['missing'] or report['changed']:
+            logger.warning(f"Divergência de índices em {collection_name}: {report}")
+        elif report['extra']:
+            logger.info(f"Índices não declarados em {collection_name}: {report['extra']}")
+
+    return remaining
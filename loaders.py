@@ -0,0 +1,62 @@
+import threading
+from flask import g
+from models import get_all_collections, find_profiles_by_user_ids
+
+# Collections de perfil que podem ser carregadas por user_id
+PROFILE_COLLECTIONS = ('clients', 'professionals', 'admins')
+
+class ProfileLoader:
+    """Carrega perfis por user_id em lote e memoiza o resultado
+
+    Uso típico numa rota que itera sobre serviços:
+        loader = get_profile_loader('clients')
+        loader.prime(service.get('client_id') for service in services)
+        client = loader.get(service.get('client_id'))
+
+    prime() faz uma única query $in para os ids ainda não carregados;
+    get() só consulta o MongoDB se o id nunca foi pedido.
+    """
+
+    def __init__(self, collection, projection=None):
+        self.collection = collection
+        self.projection = projection
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def prime(self, user_ids):
+        """Carrega numa única query todos os ids ainda não memoizados"""
+        if self.collection is None:
+            return
+
+        with self._lock:
+            missing = {user_id for user_id in user_ids if user_id is not None and user_id not in self._profiles}
+            if not missing:
+                return
+
+            found = find_profiles_by_user_ids(self.collection, missing, self.projection)
+            for user_id in missing:
+                # Memoizar também os ausentes para não repetir a query
+                self._profiles[user_id] = found.get(user_id)
+
+    def get(self, user_id):
+        """Perfil de um usuário (None se não existir)"""
+        if user_id is None:
+            return None
+        self.prime([user_id])
+        return self._profiles.get(user_id)
+
+    def load_many(self, user_ids):
+        """Dict {user_id: perfil} para os ids pedidos"""
+        user_ids = [user_id for user_id in user_ids if user_id is not None]
+        self.prime(user_ids)
+        return {user_id: self._profiles.get(user_id) for user_id in user_ids}
+
+def get_profile_loader(collection_name):
+    """Loader com escopo de request (flask.g) para uma collection de perfis"""
+    if collection_name not in PROFILE_COLLECTIONS:
+        raise ValueError(f"Collection sem loader de perfis: {collection_name}")
+
+    loaders = g.setdefault('profile_loaders', {})
+    if collection_name not in loaders:
+        loaders[collection_name] = ProfileLoader(get_all_collections()[collection_name])
+    return loaders[collection_name]
@@ -1,8 +1,15 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
 from datetime import datetime
 from flask import current_app
+from cache import tiered_cache_from_env
+from passwords import verify_password
+from config import COLLECTIONS, get_workload_database
+
+# Documentos de usuário usados pelo Flask-Login a cada request autenticado.
+# O hash da senha não entra no cache (login usa find_by_username).
+user_cache = tiered_cache_from_env('users', 'USER_CACHE', maxsize=4096, ttl=30)
+USER_CACHE_PROJECTION = {'password_hash': 0}
 
 class User(UserMixin):
     def __init__(self, user_data):
@@ -12,7 +19,8 @@ class User(UserMixin):
         self.user_type = user_data['user_type']
         self.phone = user_data.get('phone', '')
         self.location = user_data.get('location', '')
-        self.password_hash = user_data['password_hash']
+        self.password_hash = user_data.get('password_hash')
+        self.status = user_data.get('status', 'active')
         self.created_at = user_data.get('created_at', datetime.utcnow())
     
     @staticmethod
@@ -20,11 +28,19 @@ class User(UserMixin):
         try:
             if not current_app or not hasattr(current_app, 'users_collection'):
                 return None
-            user_data = current_app.users_collection.find_one({'_id': ObjectId(user_id)})
+            user_data = user_cache.get_or_load(
+                str(user_id),
+                lambda: current_app.users_collection.find_one({'_id': ObjectId(user_id)}, USER_CACHE_PROJECTION)
+            )
             return User(user_data) if user_data else None
         except:
             return None
     
+    @staticmethod
+    def invalidate(user_id):
+        """Descartar o usuário do cache após alterações no documento"""
+        user_cache.invalidate(str(user_id))
+    
     @staticmethod
     def find_by_username(username):
         if not current_app or not hasattr(current_app, 'users_collection'):
@@ -40,7 +56,8 @@ class User(UserMixin):
         return User(user_data) if user_data else None
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # No pool de hashing (levanta passwords.HashingBusy com a fila cheia)
+        return verify_password(self.password_hash, password)
 
 # Funções auxiliares para acessar collections
 def get_users_collection():
@@ -64,25 +81,38 @@ def get_chats_collection():
 def get_messages_collection():
     return current_app.messages_collection if current_app and hasattr(current_app, 'messages_collection') else None
 
-def get_all_collections():
-    """Só funciona dentro do contexto da aplicação"""
+def find_profiles_by_user_ids(collection, user_ids, projection=None):
+    """Busca perfis (clients/professionals/admins) de vários usuários numa única query
+
+    Retorna um dict {user_id: perfil}. Ids repetidos ou None são ignorados.
+    """
+    unique_ids = list({user_id for user_id in user_ids if user_id is not None})
+    if collection is None or not unique_ids:
+        return {}
+    
+    if projection is not None:
+        projection = {**projection, 'user_id': 1}
+    
+    cursor = collection.find({'user_id': {'$in': unique_ids}}, projection)
+    return {profile['user_id']: profile for profile in cursor}
+
+def get_all_collections(workload='interactive'):
+    """Só funciona dentro do contexto da aplicação
+
+    workload escolhe o perfil de carga (config.WORKLOAD_PROFILES): 'analytics'
+    para relatórios, 'bulk' para jobs em lote. Sem cliente próprio disponível,
+    usa as collections do perfil interativo.
+    """
+    if workload != 'interactive' and current_app and getattr(current_app, 'mongo_client', None):
+        db = get_workload_database(workload)
+        if db is not None:
+            return {collection_name: db[collection_name] for collection_name in COLLECTIONS}
+    
     if not current_app or not hasattr(current_app, 'users_collection'):
-        return {
-            'users': None,
-            'clients': None,
-            'professionals': None,
-            'admins': None,
-            'services': None,
-            'chats': None,
-            'messages': None
-        }
+        return {collection_name: None for collection_name in COLLECTIONS}
+    
+    # Snapshot instalado de uma vez por config.install_database
+    if hasattr(current_app, 'collections'):
+        return dict(current_app.collections)
     
-    return {
-        'users': current_app.users_collection,
-        'clients': current_app.clients_collection,
-        'professionals': current_app.professionals_collection,
-        'admins': current_app.admins_collection,
-        'services': current_app.services_collection,
-        'chats': current_app.chats_collection,
-        'messages': current_app.messages_collection
-    }
\ No newline at end of file
+    return {collection_name: getattr(current_app, f'{collection_name}_collection', None) for collection_name in COLLECTIONS}
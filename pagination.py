@@ -0,0 +1,83 @@
+import base64
+from bson import json_util
+from flask import jsonify
+
+class InvalidCursor(ValueError):
+    """Cursor de paginação malformado ou adulterado"""
+
+def encode_cursor(values):
+    """Cursor opaco a partir dos valores de ordenação do último item da página"""
+    raw = json_util.dumps(values).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Valores de ordenação codificados por encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise InvalidCursor(cursor)
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+def keyset_filter(sort, values):
+    """Filtro que posiciona a query logo após o item (values) na ordenação sort
+
+    sort é a lista [(campo, direção)] usada no .sort(); o último campo deve
+    ser único (normalmente _id) para a ordem ser estável. Com um índice na
+    mesma ordem, qualquer página custa o mesmo que a primeira.
+
+    Campos nulos ou ausentes ordenam antes de qualquer valor e $lt/$gt nunca
+    os alcançam: em ordem decrescente vêm depois de qualquer valor (ramo
+    {campo: None}); em crescente, depois de um cursor nulo vem tudo o que não
+    é nulo.
+    """
+    clauses = []
+    for position, (field, direction) in enumerate(sort):
+        prefix = {previous: values[index] for index, (previous, _) in enumerate(sort[:position])}
+        value = values[position]
+        if value is None:
+            if direction > 0:
+                clauses.append({**prefix, field: {'$ne': None}})
+            continue
+        clauses.append({**prefix, field: {'$lt' if direction < 0 else '$gt': value}})
+        if direction < 0:
+            clauses.append({**prefix, field: None})
+    return {'$or': clauses}
+
+def parse_page_size(value, default, maximum=100):
+    """Tamanho de página do query string, limitado a [1, maximum]"""
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+def paginate(collection, query, sort, page_size, cursor=None, projection=None):
+    """Executa uma página keyset
+
+    Retorna (documentos, próximo_cursor); próximo_cursor é None na última página.
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(sort))
+        query = {'$and': [query, keyset_filter(sort, values)]} if query else keyset_filter(sort, values)
+
+    # Um item a mais indica se existe próxima página sem uma contagem extra
+    documents = list(collection.find(query, projection).sort(sort).limit(page_size + 1))
+    has_more = len(documents) > page_size
+    documents = documents[:page_size]
+
+    next_cursor = None
+    if has_more and documents:
+        last = documents[-1]
+        next_cursor = encode_cursor([last.get(field) for field, _ in sort])
+
+    return documents, next_cursor
+
+def page_response(items, next_cursor):
+    """Lista JSON com o cursor da próxima página no cabeçalho X-Next-Cursor"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
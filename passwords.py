@@ -0,0 +1,104 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Método/custo no formato do werkzeug: 'scrypt' (= scrypt:32768:8:1),
+# 'scrypt:16384:8:1', 'pbkdf2:sha256:600000'... Hashes guardados com outro
+# método são regerados no próximo login bem-sucedido.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+# Onde o hash é calculado:
+#   process  pool de processos (padrão; não prende o GIL do worker)
+#   tpool    threads nativas do eventlet (workers eventlet, onde multiprocessing não convive com o monkey patch)
+#   inline   na própria thread do request (testes, scripts)
+PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'process')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Hashes em curso ou em fila por worker; acima disto o pedido é recusado (429)
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', PASSWORD_HASH_WORKERS * 4))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+def _canonical_method(method):
+    """Prefixo que o werkzeug grava no hash ('scrypt' -> 'scrypt:32768:8:1'), sem calcular um hash"""
+    name, *params = method.split(':')
+    defaults = {'scrypt': ['32768', '8', '1'], 'pbkdf2': ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]}.get(name, [])
+    return ':'.join([name, *params, *defaults[len(params):]])
+
+PASSWORD_HASH_PREFIX = _canonical_method(PASSWORD_HASH_METHOD)
+
+class HashingBusy(Exception):
+    """Fila de hashing cheia: responder 429 em vez de esperar"""
+
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    # Pool criado no processo que o usa: após o fork do gunicorn cada worker tem o seu
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # forkserver: os processos de hashing não herdam o cliente MongoDB nem as threads do worker
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+            _executor_pid = os.getpid()
+        return _executor
+
+def _run(function, *args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    if PASSWORD_HASH_EXECUTOR == 'process':
+        return _run_in_pool(function, *args)
+    try:
+        if PASSWORD_HASH_EXECUTOR == 'inline':
+            return function(*args)
+        from eventlet import tpool
+        return tpool.execute(function, *args)
+    finally:
+        _slots.release()
+
+def _run_in_pool(function, *args):
+    try:
+        future = _get_executor().submit(function, *args)
+    except Exception:
+        _slots.release()
+        raise
+    # A vaga só é devolvida quando a tarefa termina (ou é cancelada ainda na
+    # fila): um request que desiste por timeout não abre espaço além da fila
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise HashingBusy()
+
+def hash_password(password):
+    """Hash com o método configurado (fora da thread do request)"""
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    """Compara a senha com o hash guardado (fora da thread do request)"""
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """True quando o hash foi gerado com método/custo diferente do configurado"""
+    return bool(password_hash) and password_hash.split('$', 1)[0] != PASSWORD_HASH_PREFIX
+
+def metrics():
+    return {
+        'method': PASSWORD_HASH_METHOD,
+        'executor': PASSWORD_HASH_EXECUTOR,
+        'workers': PASSWORD_HASH_WORKERS,
+        'queue_limit': PASSWORD_HASH_QUEUE,
+        # Valor interno do semáforo: vagas livres na fila
+        'queue_free': _slots._value
+    }
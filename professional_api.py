@@ -1,13 +1,46 @@
+import os
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime, timedelta
+from cache import invalidate_tags
+from geo import resolve_location
+from http_cache import conditional_response
 from models import get_all_collections
+from loaders import get_profile_loader
+from ranking import record_completion
+from realtime import publish_service_update
+from resilience import db_guard, mongo_breaker, CLOSED
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
 
 professional_api_routes = Blueprint('professional_api', __name__, url_prefix='/api')
 
+# Pool limitado para as queries paralelas do dashboard
+DASHBOARD_QUERY_WORKERS = int(os.environ.get('DASHBOARD_QUERY_WORKERS', 8))
+_dashboard_executor = ThreadPoolExecutor(
+    max_workers=DASHBOARD_QUERY_WORKERS,
+    thread_name_prefix='dashboard-query'
+)
+
+def professional_fallback(build):
+    """Fallback de db_guard: dados de demonstração, apenas para profissionais"""
+    def fallback(**kwargs):
+        if current_user.user_type != 'professional':
+            return jsonify({'error': 'Acesso não autorizado'}), 403
+        return jsonify(build())
+    return fallback
+
 @professional_api_routes.route('/professional/current')
 @login_required
+@conditional_response
+@db_guard()
 def api_professional_current():
     if current_user.user_type != 'professional':
         return jsonify({'error': 'Acesso não autorizado'}), 403
@@ -43,36 +76,30 @@ def api_professional_current():
         print(f"Erro em api_professional_current: {e}")
         return jsonify({'error': 'Erro ao carregar dados'}), 500
 
-@professional_api_routes.route('/professional/stats')
-@login_required
-def api_professional_stats():
-    if current_user.user_type != 'professional':
-        return jsonify({'error': 'Acesso não autorizado'}), 403
-    
-    collections = get_all_collections()
-    
+def build_professional_stats(collections, user_id):
+    """Estatísticas do dashboard profissional (com fallback de demonstração)"""
     try:
-        professional_id = ObjectId(current_user.id)
+        professional_id = ObjectId(user_id)
         
         # Contar serviços ativos
         active_services = collections['services'].count_documents({
             'professional_id': professional_id,
             'status': {'$in': ['pending', 'in_progress', 'accepted', 'confirmed']}
-        }) if collections['services'] else 0
+        }) if collections['services'] is not None else 0
         
-        # Calcular avaliação média
+        # Calcular avaliação média (no servidor, sem carregar os serviços)
         average_rating = 0.0
-        if collections['services']:
-            reviews_cursor = collections['services'].find({
-                'professional_id': professional_id,
-                'rating': {'$exists': True, '$ne': None}
-            })
-            ratings = [service.get('rating', 0) for service in reviews_cursor]
-            average_rating = round(sum(ratings) / len(ratings), 1) if ratings else 0.0
+        if collections['services'] is not None:
+            rating_result = list(collections['services'].aggregate([
+                {'$match': {'professional_id': professional_id, 'rating': {'$exists': True, '$ne': None}}},
+                {'$group': {'_id': None, 'average': {'$avg': '$rating'}}}
+            ]))
+            if rating_result and rating_result[0]['average'] is not None:
+                average_rating = round(rating_result[0]['average'], 1)
         
         # Contar clientes deste mês
         monthly_clients = 0
-        if collections['services']:
+        if collections['services'] is not None:
             current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             monthly_clients = collections['services'].count_documents({
                 'professional_id': professional_id,
@@ -83,50 +110,38 @@ def api_professional_stats():
         unread_messages = collections['messages'].count_documents({
             'receiver_id': professional_id,
             'is_read': False
-        }) if collections['messages'] else 0
+        }) if collections['messages'] is not None else 0
         
-        stats = {
+        return {
             'activeServices': active_services,
             'averageRating': average_rating,
             'monthlyClients': monthly_clients,
             'unreadMessages': unread_messages
         }
         
-        return jsonify({'success': True, 'stats': stats})
-        
     except Exception as e:
-        print(f"Erro em api_professional_stats: {e}")
+        print(f"Erro em build_professional_stats: {e}")
         # Fallback para dados de demonstração
-        stats = {
-            'activeServices': 8,
-            'averageRating': 4.8,
-            'monthlyClients': 12,
-            'unreadMessages': 3
-        }
-        return jsonify({'success': True, 'stats': stats})
+        return get_fallback_stats()
 
-@professional_api_routes.route('/professional/services')
-@login_required
-def api_professional_services():
-    if current_user.user_type != 'professional':
-        return jsonify({'error': 'Acesso não autorizado'}), 403
-    
-    collections = get_all_collections()
-    
+def build_professional_services(collections, user_id):
+    """Últimos serviços do profissional (com fallback de demonstração)"""
     try:
-        professional_id = ObjectId(current_user.id)
+        professional_id = ObjectId(user_id)
         
         services_list = []
-        if collections['services']:
+        if collections['services'] is not None:
             services_data = list(collections['services'].find({
                 'professional_id': professional_id
             }).sort('created_at', -1).limit(10))
             
+            # Nomes dos clientes da página numa única query
+            clients = get_profile_loader('clients')
+            clients.prime(service.get('client_id') for service in services_data)
+            
             for service in services_data:
-                client_name = 'Cliente'
-                if collections['clients'] and 'client_id' in service:
-                    client_data = collections['clients'].find_one({'_id': service.get('client_id')})
-                    client_name = client_data.get('full_name', 'Cliente') if client_data else 'Cliente'
+                client_data = clients.get(service.get('client_id'))
+                client_name = client_data.get('full_name', 'Cliente') if client_data else 'Cliente'
                 
                 service_date = service.get('scheduled_date', service.get('created_at'))
                 if hasattr(service_date, 'isoformat'):
@@ -147,61 +162,21 @@ def api_professional_services():
                 })
         
         if not services_list:
-            services_list = get_fallback_services(current_user.id, collections)
+            services_list = get_fallback_services(user_id, collections)
         
-        return jsonify(services_list)
+        return services_list
         
     except Exception as e:
-        print(f"Erro em api_professional_services: {e}")
-        services_list = get_fallback_services(current_user.id, collections)
-        return jsonify(services_list)
-
-def get_fallback_services(user_id, collections):
-    professional_data = None
-    if collections['professionals']:
-        professional_data = collections['professionals'].find_one({'user_id': ObjectId(user_id)})
-    
-    specialty = professional_data.get('specialty', 'Eletricista') if professional_data else 'Eletricista'
-    location = 'Maputo'
-    
-    return [
-        {
-            'id': '1',
-            'title': f'Instalação {specialty} - Casa Silva',
-            'description': f'Instalação completa do sistema em {location}',
-            'client_name': 'Maria Silva',
-            'date': datetime.utcnow().isoformat(),
-            'status': 'in_progress',
-            'price': 2500.00,
-            'address': f'Bairro Central, {location}',
-            'category': specialty
-        },
-        {
-            'id': '2',
-            'title': f'Manutenção {specialty} - Empresa ABC',
-            'description': 'Manutenção preventiva do sistema',
-            'client_name': 'João Carlos',
-            'date': (datetime.utcnow() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0).isoformat(),
-            'status': 'pending',
-            'price': 1800.00,
-            'address': f'Zona Industrial, {location}',
-            'category': specialty
-        }
-    ]
+        print(f"Erro em build_professional_services: {e}")
+        return get_fallback_services(user_id, collections)
 
-@professional_api_routes.route('/professional/schedule')
-@login_required
-def api_professional_schedule():
-    if current_user.user_type != 'professional':
-        return jsonify({'error': 'Acesso não autorizado'}), 403
-    
-    collections = get_all_collections()
-    
+def build_professional_schedule(collections, user_id):
+    """Agenda dos próximos 7 dias (com fallback de demonstração)"""
     try:
-        professional_id = ObjectId(current_user.id)
+        professional_id = ObjectId(user_id)
         
         schedule_list = []
-        if collections['services']:
+        if collections['services'] is not None:
             next_week = datetime.utcnow() + timedelta(days=7)
             
             schedule_data = list(collections['services'].find({
@@ -210,11 +185,13 @@ def api_professional_schedule():
                 'status': {'$in': ['pending', 'confirmed', 'accepted', 'in_progress']}
             }).sort('scheduled_date', 1).limit(5))
             
+            # Nomes dos clientes da página numa única query
+            clients = get_profile_loader('clients')
+            clients.prime(service.get('client_id') for service in schedule_data)
+            
             for service in schedule_data:
-                client_name = 'Cliente'
-                if collections['clients'] and 'client_id' in service:
-                    client_data = collections['clients'].find_one({'_id': service.get('client_id')})
-                    client_name = client_data.get('full_name', 'Cliente') if client_data else 'Cliente'
+                client_data = clients.get(service.get('client_id'))
+                client_name = client_data.get('full_name', 'Cliente') if client_data else 'Cliente'
                 
                 schedule_list.append({
                     'id': str(service['_id']),
@@ -225,63 +202,34 @@ def api_professional_schedule():
                 })
         
         if not schedule_list:
-            schedule_list = get_fallback_schedule(current_user.id, collections)
+            schedule_list = get_fallback_schedule(user_id, collections)
         
-        return jsonify(schedule_list)
+        return schedule_list
         
     except Exception as e:
-        print(f"Erro em api_professional_schedule: {e}")
-        schedule_list = get_fallback_schedule(current_user.id, collections)
-        return jsonify(schedule_list)
+        print(f"Erro em build_professional_schedule: {e}")
+        return get_fallback_schedule(user_id, collections)
 
-def get_fallback_schedule(user_id, collections):
-    professional_data = None
-    if collections['professionals']:
-        professional_data = collections['professionals'].find_one({'user_id': ObjectId(user_id)})
-    
-    specialty = professional_data.get('specialty', 'Eletricista') if professional_data else 'Eletricista'
-    
-    return [
-        {
-            'id': '1',
-            'title': f'Instalação {specialty}',
-            'client_name': 'Casa Silva',
-            'date': datetime.utcnow().replace(hour=14, minute=0, second=0, microsecond=0).isoformat(),
-            'description': 'Instalação completa'
-        },
-        {
-            'id': '2',
-            'title': f'Manutenção {specialty}',
-            'client_name': 'Empresa ABC',
-            'date': (datetime.utcnow() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0).isoformat(),
-            'description': 'Manutenção preventiva'
-        }
-    ]
-
-@professional_api_routes.route('/professional/reviews')
-@login_required
-def api_professional_reviews():
-    if current_user.user_type != 'professional':
-        return jsonify({'error': 'Acesso não autorizado'}), 403
-    
-    collections = get_all_collections()
-    
+def build_professional_reviews(collections, user_id):
+    """Últimas avaliações recebidas (com fallback de demonstração)"""
     try:
-        professional_id = ObjectId(current_user.id)
+        professional_id = ObjectId(user_id)
         
         reviews_list = []
-        if collections['services']:
+        if collections['services'] is not None:
             reviews_data = list(collections['services'].find({
                 'professional_id': professional_id,
                 'rating': {'$exists': True, '$ne': None},
                 'review_comment': {'$exists': True, '$ne': ''}
             }).sort('created_at', -1).limit(5))
             
+            # Nomes dos clientes da página numa única query
+            clients = get_profile_loader('clients')
+            clients.prime(service.get('client_id') for service in reviews_data)
+            
             for service in reviews_data:
-                client_name = 'Cliente'
-                if collections['clients'] and 'client_id' in service:
-                    client_data = collections['clients'].find_one({'_id': service.get('client_id')})
-                    client_name = client_data.get('full_name', 'Cliente') if client_data else 'Cliente'
+                client_data = clients.get(service.get('client_id'))
+                client_name = client_data.get('full_name', 'Cliente') if client_data else 'Cliente'
                 
                 reviews_list.append({
                     'id': str(service['_id']),
@@ -295,12 +243,172 @@ def api_professional_reviews():
         if not reviews_list:
             reviews_list = get_fallback_reviews()
         
-        return jsonify(reviews_list)
+        return reviews_list
         
     except Exception as e:
-        print(f"Erro em api_professional_reviews: {e}")
-        reviews_list = get_fallback_reviews()
-        return jsonify(reviews_list)
+        print(f"Erro em build_professional_reviews: {e}")
+        return get_fallback_reviews()
+
+@professional_api_routes.route('/professional/stats')
+@login_required
+@conditional_response
+@db_guard(fallback=professional_fallback(lambda: {'success': True, 'stats': get_fallback_stats()}))
+def api_professional_stats():
+    if current_user.user_type != 'professional':
+        return jsonify({'error': 'Acesso não autorizado'}), 403
+    
+    stats = build_professional_stats(get_all_collections(), current_user.id)
+    return jsonify({'success': True, 'stats': stats})
+
+@professional_api_routes.route('/professional/services')
+@login_required
+@conditional_response
+@db_guard(fallback=professional_fallback(lambda: get_fallback_services(current_user.id, None)))
+def api_professional_services():
+    if current_user.user_type != 'professional':
+        return jsonify({'error': 'Acesso não autorizado'}), 403
+    
+    return jsonify(build_professional_services(get_all_collections(), current_user.id))
+
+@professional_api_routes.route('/professional/schedule')
+@login_required
+@conditional_response
+@db_guard(fallback=professional_fallback(lambda: get_fallback_schedule(current_user.id, None)))
+def api_professional_schedule():
+    if current_user.user_type != 'professional':
+        return jsonify({'error': 'Acesso não autorizado'}), 403
+    
+    return jsonify(build_professional_schedule(get_all_collections(), current_user.id))
+
+@professional_api_routes.route('/professional/reviews')
+@login_required
+@conditional_response
+@db_guard(fallback=professional_fallback(lambda: get_fallback_reviews()))
+def api_professional_reviews():
+    if current_user.user_type != 'professional':
+        return jsonify({'error': 'Acesso não autorizado'}), 403
+    
+    return jsonify(build_professional_reviews(get_all_collections(), current_user.id))
+
+@professional_api_routes.route('/professional/dashboard')
+@login_required
+@conditional_response
+@db_guard(fallback=professional_fallback(lambda: get_fallback_dashboard(current_user.id)))
+def api_professional_dashboard():
+    """Dados completos do dashboard numa única resposta
+
+    As quatro secções são independentes e correm em paralelo no pool
+    limitado _dashboard_executor, partilhando o contexto do request
+    (current_user, flask.g e os loaders de perfis).
+    """
+    if current_user.user_type != 'professional':
+        return jsonify({'error': 'Acesso não autorizado'}), 403
+    
+    started = time.perf_counter()
+    collections = get_all_collections()
+    user_id = current_user.id
+    
+    # Criar os loaders antes do fan-out: as threads partilham o mesmo flask.g
+    get_profile_loader('clients')
+    get_profile_loader('professionals')
+    
+    sections = {
+        'stats': build_professional_stats,
+        'services': build_professional_services,
+        'reviews': build_professional_reviews,
+        'schedule': build_professional_schedule
+    }
+    futures = {
+        name: _dashboard_executor.submit(contextvars.copy_context().run, builder, collections, user_id)
+        for name, builder in sections.items()
+    }
+    
+    payload = {'success': True}
+    payload.update({name: future.result() for name, future in futures.items()})
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"api_professional_dashboard: {elapsed_ms:.1f}ms")
+    
+    response = jsonify(payload)
+    response.headers['Server-Timing'] = f"app;dur={elapsed_ms:.1f}"
+    return response
+
+def get_fallback_stats():
+    return {
+        'activeServices': 8,
+        'averageRating': 4.8,
+        'monthlyClients': 12,
+        'unreadMessages': 3
+    }
+
+def get_fallback_dashboard(user_id):
+    """Dashboard de demonstração servido com o database indisponível"""
+    return {
+        'success': True,
+        'stats': get_fallback_stats(),
+        'services': get_fallback_services(user_id, None),
+        'reviews': get_fallback_reviews(),
+        'schedule': get_fallback_schedule(user_id, None)
+    }
+
+def _fallback_profile(user_id):
+    # Com o breaker aberto o fallback não deve voltar a tocar no database
+    if mongo_breaker.state != CLOSED:
+        return None
+    return get_profile_loader('professionals').get(ObjectId(user_id))
+
+def get_fallback_services(user_id, collections):
+    professional_data = _fallback_profile(user_id)
+    
+    specialty = professional_data.get('specialty', 'Eletricista') if professional_data else 'Eletricista'
+    location = 'Maputo'
+    
+    return [
+        {
+            'id': '1',
+            'title': f'Instalação {specialty} - Casa Silva',
+            'description': f'Instalação completa do sistema em {location}',
+            'client_name': 'Maria Silva',
+            'date': datetime.utcnow().isoformat(),
+            'status': 'in_progress',
+            'price': 2500.00,
+            'address': f'Bairro Central, {location}',
+            'category': specialty
+        },
+        {
+            'id': '2',
+            'title': f'Manutenção {specialty} - Empresa ABC',
+            'description': 'Manutenção preventiva do sistema',
+            'client_name': 'João Carlos',
+            'date': (datetime.utcnow() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0).isoformat(),
+            'status': 'pending',
+            'price': 1800.00,
+            'address': f'Zona Industrial, {location}',
+            'category': specialty
+        }
+    ]
+
+def get_fallback_schedule(user_id, collections):
+    professional_data = _fallback_profile(user_id)
+    
+    specialty = professional_data.get('specialty', 'Eletricista') if professional_data else 'Eletricista'
+    
+    return [
+        {
+            'id': '1',
+            'title': f'Instalação {specialty}',
+            'client_name': 'Casa Silva',
+            'date': datetime.utcnow().replace(hour=14, minute=0, second=0, microsecond=0).isoformat(),
+            'description': 'Instalação completa'
+        },
+        {
+            'id': '2',
+            'title': f'Manutenção {specialty}',
+            'client_name': 'Empresa ABC',
+            'date': (datetime.utcnow() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0).isoformat(),
+            'description': 'Manutenção preventiva'
+        }
+    ]
 
 def get_fallback_reviews():
     return [
@@ -326,6 +434,7 @@ def get_fallback_reviews():
 
 @professional_api_routes.route('/professional/services/<service_id>/accept', methods=['POST'])
 @login_required
+@db_guard()
 def api_accept_service(service_id):
     """Aceitar um serviço pendente"""
     if current_user.user_type != 'professional':
@@ -334,7 +443,7 @@ def api_accept_service(service_id):
     collections = get_all_collections()
     
     try:
-        result = collections['services'].update_one(
+        service = collections['services'].find_one_and_update(
             {
                 '_id': ObjectId(service_id),
                 'professional_id': ObjectId(current_user.id),
@@ -346,10 +455,13 @@ def api_accept_service(service_id):
                     'accepted_at': datetime.utcnow(),
                     'updated_at': datetime.utcnow()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 1:
+        if service:
+            invalidate_tags('services')
+            publish_service_update(service)
             return jsonify({'success': True, 'message': 'Serviço aceito com sucesso'})
         else:
             return jsonify({'error': 'Serviço não encontrado ou já foi processado'}), 404
@@ -360,6 +472,7 @@ def api_accept_service(service_id):
 
 @professional_api_routes.route('/professional/services/<service_id>/reject', methods=['POST'])
 @login_required
+@db_guard()
 def api_reject_service(service_id):
     """Rejeitar um serviço pendente"""
     if current_user.user_type != 'professional':
@@ -368,7 +481,7 @@ def api_reject_service(service_id):
     collections = get_all_collections()
     
     try:
-        result = collections['services'].update_one(
+        service = collections['services'].find_one_and_update(
             {
                 '_id': ObjectId(service_id),
                 'professional_id': ObjectId(current_user.id),
@@ -380,10 +493,13 @@ def api_reject_service(service_id):
                     'rejected_at': datetime.utcnow(),
                     'updated_at': datetime.utcnow()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 1:
+        if service:
+            invalidate_tags('services')
+            publish_service_update(service)
             return jsonify({'success': True, 'message': 'Serviço recusado'})
         else:
             return jsonify({'error': 'Serviço não encontrado ou já foi processado'}), 404
@@ -394,6 +510,7 @@ def api_reject_service(service_id):
 
 @professional_api_routes.route('/professional/services/<service_id>/complete', methods=['POST'])
 @login_required
+@db_guard()
 def api_complete_service(service_id):
     """Marcar serviço como concluído"""
     if current_user.user_type != 'professional':
@@ -402,7 +519,7 @@ def api_complete_service(service_id):
     collections = get_all_collections()
     
     try:
-        result = collections['services'].update_one(
+        service = collections['services'].find_one_and_update(
             {
                 '_id': ObjectId(service_id),
                 'professional_id': ObjectId(current_user.id),
@@ -414,10 +531,19 @@ def api_complete_service(service_id):
                     'completed_at': datetime.utcnow(),
                     'updated_at': datetime.utcnow()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 1:
+        if service:
+            # Só a transição para 'completed' chega aqui: o score soma cada serviço uma vez.
+            # Uma falha não desfaz a conclusão; 'flask ranking recompute' corrige à noite
+            try:
+                record_completion(collections['professionals'], service['professional_id'], service['completed_at'], service.get('rating'))
+            except Exception as e:
+                logger.warning(f"Falha ao atualizar ranking: {str(e)[:100]}...")
+            invalidate_tags('services')
+            publish_service_update(service)
             return jsonify({'success': True, 'message': 'Serviço concluído com sucesso'})
         else:
             return jsonify({'error': 'Serviço não encontrado ou não pode ser concluído'}), 404
@@ -428,6 +554,7 @@ def api_complete_service(service_id):
 
 @professional_api_routes.route('/professional/services/<service_id>/start', methods=['POST'])
 @login_required
+@db_guard()
 def api_start_service(service_id):
     """Iniciar um serviço aceito"""
     if current_user.user_type != 'professional':
@@ -436,7 +563,7 @@ def api_start_service(service_id):
     collections = get_all_collections()
     
     try:
-        result = collections['services'].update_one(
+        service = collections['services'].find_one_and_update(
             {
                 '_id': ObjectId(service_id),
                 'professional_id': ObjectId(current_user.id),
@@ -448,10 +575,13 @@ def api_start_service(service_id):
                     'started_at': datetime.utcnow(),
                     'updated_at': datetime.utcnow()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 1:
+        if service:
+            invalidate_tags('services')
+            publish_service_update(service)
             return jsonify({'success': True, 'message': 'Serviço iniciado'})
         else:
             return jsonify({'error': 'Serviço não encontrado ou não pode ser iniciado'}), 404
@@ -464,6 +594,7 @@ def api_start_service(service_id):
 
 @professional_api_routes.route('/professional/services/create', methods=['POST'])
 @login_required
+@db_guard()
 def api_create_service():
     """Criar um novo serviço"""
     if current_user.user_type != 'professional':
@@ -510,8 +641,13 @@ def api_create_service():
             'updated_at': datetime.utcnow()
         }
         
+        point = resolve_location(collections['services'].database, new_service['location'], record_pending=True)
+        if point:
+            new_service['geo'] = point
+        
         # Inserir no banco de dados
         result = collections['services'].insert_one(new_service)
+        invalidate_tags('services')
         
         return jsonify({
             'success': True, 
@@ -0,0 +1,309 @@
+import os
+import logging
+from flask import Blueprint, jsonify, request
+from models import get_all_collections
+from availability import identity_filter, is_available
+from pagination import InvalidCursor, paginate, parse_page_size, page_response
+from search import MAX_QUERY_LENGTH, search_services, facet_services
+from geo import geo_point, resolve_location, nearby_professionals
+from ranking import RANKING_SORT
+from cache import response_cache
+from resilience import db_guard, RateLimiter, rate_limit
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Rotas sem autenticação (formulários de registro e página de serviços)
+public_api_routes = Blueprint('public_api', __name__)
+
+# Verificações por IP: os formulários chamam a cada pausa na digitação
+check_limiter = RateLimiter(
+    rate=int(os.environ.get('CHECK_USERNAME_RATE_PER_MINUTE', 60)),
+    period=60,
+    burst=int(os.environ.get('CHECK_USERNAME_BURST', 20))
+)
+
+# Buscas por IP (página de serviços, sem autenticação)
+search_limiter = RateLimiter(
+    rate=int(os.environ.get('SEARCH_RATE_PER_MINUTE', 120)),
+    period=60,
+    burst=int(os.environ.get('SEARCH_BURST', 30))
+)
+
+# Facetas da página de serviços sem filtros (a mesma para todos os visitantes)
+LANDING_FACETS_TTL = int(os.environ.get('LANDING_FACETS_CACHE_TTL', 60))
+DEFAULT_PAGE_SIZE = 20
+
+# Raio da busca por proximidade (km)
+NEARBY_DEFAULT_KM = float(os.environ.get('NEARBY_DEFAULT_KM', 25))
+NEARBY_MAX_KM = float(os.environ.get('NEARBY_MAX_KM', 200))
+
+MAX_IDENTITY_LENGTH = 254
+
+AVAILABILITY_MESSAGES = {
+    'username': 'Nome de usuário já está em uso.',
+    'email': 'Email já está em uso.'
+}
+
+def _availability_fallback():
+    """Breaker aberto: responder só quando o pré-filtro garante que está livre"""
+    field, value = _identity_param()
+    if field and not identity_filter.might_exist(field, value):
+        return jsonify({'available': True, 'field': field})
+    return jsonify({'available': None, 'error': 'Serviço temporariamente indisponível. Tente novamente em instantes.'}), 503
+
+def _identity_param():
+    for field in ('username', 'email'):
+        value = request.args.get(field, '').strip()
+        if value:
+            return field, value
+    return None, None
+
+@public_api_routes.route('/check-username')
+@rate_limit(check_limiter)
+@db_guard(fallback=_availability_fallback)
+def api_check_username():
+    """Disponibilidade de um username (?username=) ou email (?email=)"""
+    field, value = _identity_param()
+    if not field or len(value) < 3 or len(value) > MAX_IDENTITY_LENGTH:
+        return jsonify({'available': None, 'error': 'Informe um username ou email válido'}), 400
+
+    collections = get_all_collections()
+    if collections['users'] is None:
+        return jsonify({'available': None, 'error': 'Sistema em manutenção'}), 503
+
+    try:
+        available = is_available(collections['users'], field, value)
+        response = {'available': available, 'field': field}
+        if not available:
+            response['message'] = AVAILABILITY_MESSAGES[field]
+        return jsonify(response)
+
+    except Exception as e:
+        print(f"Erro em api_check_username: {e}")
+        return jsonify({'available': None, 'error': 'Erro ao verificar disponibilidade'}), 500
+
+def serialize_search_result(service):
+    result = {
+        'id': str(service['_id']),
+        'title': service.get('title', ''),
+        'description': service.get('description', ''),
+        'category': service.get('category', ''),
+        'price': service.get('price', 0),
+        'location': service.get('location', ''),
+        'duration': service.get('duration', ''),
+        'tags': service.get('tags', []),
+        'professional_id': str(service['professional_id']) if service.get('professional_id') else None,
+        'professional_name': service.get('professional_name', ''),
+        'professional_specialty': service.get('professional_specialty', ''),
+        'created_at': service['created_at'].isoformat() if service.get('created_at') else None
+    }
+    if 'score' in service:
+        result['score'] = round(service['score'], 4)
+    return result
+
+@public_api_routes.route('/services/search')
+@rate_limit(search_limiter)
+@db_guard()
+def api_search_services():
+    """Busca de serviços (?q=&category=&location=&limit=&cursor=)
+
+    Com q ordena por relevância; sem q, pelos mais recentes. O cursor da
+    próxima página vem no cabeçalho X-Next-Cursor.
+    """
+    text = request.args.get('q', '').strip()
+    if len(text) > MAX_QUERY_LENGTH:
+        return jsonify({'error': 'Termo de busca muito longo'}), 400
+    
+    collections = get_all_collections()
+    if collections['services'] is None:
+        return jsonify({'error': 'Sistema em manutenção'}), 503
+    
+    try:
+        services, next_cursor = search_services(
+            collections['services'],
+            text=text or None,
+            category=request.args.get('category', '').strip() or None,
+            location=request.args.get('location', '').strip() or None,
+            page_size=parse_page_size(request.args.get('limit'), default=DEFAULT_PAGE_SIZE, maximum=50),
+            cursor=request.args.get('cursor')
+        )
+        return page_response([serialize_search_result(service) for service in services], next_cursor)
+    
+    except InvalidCursor:
+        return jsonify({'error': 'Cursor de paginação inválido'}), 400
+    except Exception as e:
+        print(f"Erro em api_search_services: {e}")
+        return jsonify({'error': 'Erro ao buscar serviços'}), 500
+
+@response_cache.cached('landing_facets', ttl=LANDING_FACETS_TTL, tags=('services',))
+def build_landing_facets(page_size):
+    """Resultados e facetas sem filtros (percorre todos os anúncios: em cache)"""
+    services, next_cursor, facets = facet_services(get_all_collections()['services'], page_size=page_size)
+    return [serialize_search_result(service) for service in services], next_cursor, facets
+
+@public_api_routes.route('/services/facets')
+@rate_limit(search_limiter)
+@db_guard()
+def api_services_facets():
+    """Primeira página da busca com contagens por categoria, preço e local (?q=&category=&location=&limit=)
+
+    Uma única agregação $facet; as páginas seguintes vêm de /services/search
+    com o cursor do cabeçalho X-Next-Cursor e os mesmos filtros.
+    """
+    text = request.args.get('q', '').strip()
+    if len(text) > MAX_QUERY_LENGTH:
+        return jsonify({'error': 'Termo de busca muito longo'}), 400
+    
+    category = request.args.get('category', '').strip() or None
+    location = request.args.get('location', '').strip() or None
+    page_size = parse_page_size(request.args.get('limit'), default=DEFAULT_PAGE_SIZE, maximum=50)
+    
+    collections = get_all_collections()
+    if collections['services'] is None:
+        return jsonify({'error': 'Sistema em manutenção'}), 503
+    
+    try:
+        if not (text or category or location):
+            results, next_cursor, facets = build_landing_facets(page_size)
+        else:
+            services, next_cursor, facets = facet_services(
+                collections['services'], text=text or None, category=category, location=location, page_size=page_size
+            )
+            results = [serialize_search_result(service) for service in services]
+        
+        response = jsonify({'success': True, 'results': results, 'facets': facets})
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    
+    except Exception as e:
+        print(f"Erro em api_services_facets: {e}")
+        return jsonify({'error': 'Erro ao carregar facetas'}), 500
+
+def _nearby_point():
+    """Ponto de origem: ?lat=&lng= ou ?location= (nome resolvido sem serviços externos)"""
+    lat, lng = request.args.get('lat'), request.args.get('lng')
+    if lat or lng:
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return None, 'Coordenadas inválidas'
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return None, 'Coordenadas inválidas'
+        return geo_point(lng, lat), None
+    
+    location = request.args.get('location', '').strip()
+    if not location:
+        return None, 'Informe lat e lng ou location'
+    point = resolve_location(get_all_collections()['professionals'].database, location)
+    if point is None:
+        return None, 'Local desconhecido'
+    return point, None
+
+@public_api_routes.route('/professionals/nearby')
+@rate_limit(search_limiter)
+@db_guard()
+def api_nearby_professionals():
+    """Profissionais verificados mais próximos (?lat=&lng= ou ?location=, &specialty=&max_km=&limit=)"""
+    collections = get_all_collections()
+    if collections['professionals'] is None:
+        return jsonify({'error': 'Sistema em manutenção'}), 503
+    
+    point, error = _nearby_point()
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        max_km = min(float(request.args.get('max_km', NEARBY_DEFAULT_KM)), NEARBY_MAX_KM)
+    except ValueError:
+        return jsonify({'error': 'Raio inválido'}), 400
+    if not max_km > 0:
+        return jsonify({'error': 'Raio inválido'}), 400
+    
+    try:
+        professionals = nearby_professionals(
+            collections['professionals'],
+            point,
+            specialty=request.args.get('specialty', '').strip() or None,
+            max_distance_km=max_km,
+            limit=parse_page_size(request.args.get('limit'), default=DEFAULT_PAGE_SIZE, maximum=50)
+        )
+        results = [{
+            'id': str(professional['user_id']),
+            'full_name': professional.get('full_name', ''),
+            'specialty': professional.get('specialty', ''),
+            'experience': professional.get('experience', 0),
+            'description': professional.get('description', ''),
+            'hourly_rate': professional.get('hourly_rate', 0.0),
+            'coordinates': professional['geo']['coordinates'],
+            'distance_km': round(professional['distance'] / 1000, 2)
+        } for professional in professionals]
+        return jsonify({'success': True, 'origin': point['coordinates'], 'max_km': max_km, 'results': results})
+    
+    except Exception as e:
+        print(f"Erro em api_nearby_professionals: {e}")
+        return jsonify({'error': 'Erro ao buscar profissionais próximos'}), 500
+
+PROFESSIONAL_LISTING_PROJECTION = {
+    'user_id': 1,
+    'full_name': 1,
+    'specialty': 1,
+    'experience': 1,
+    'description': 1,
+    'hourly_rate': 1,
+    'ranking_score': 1,
+    'ranking.completed': 1,
+    'ranking.rating_sum': 1,
+    'ranking.rating_count': 1
+}
+
+@public_api_routes.route('/professionals')
+@rate_limit(search_limiter)
+@db_guard()
+def api_list_professionals():
+    """Profissionais verificados por ranking_score (?specialty=&limit=&cursor=)
+
+    Ordena pelo score mantido em professionals (ranking.py), servido pelos
+    índices professionals_verified_*ranking. O cursor da próxima página vem
+    no cabeçalho X-Next-Cursor.
+    """
+    collections = get_all_collections()
+    if collections['professionals'] is None:
+        return jsonify({'error': 'Sistema em manutenção'}), 503
+    
+    query = {'is_verified': True}
+    specialty = request.args.get('specialty', '').strip()
+    if specialty:
+        query['specialty'] = specialty
+    
+    try:
+        professionals, next_cursor = paginate(
+            collections['professionals'], query, RANKING_SORT,
+            parse_page_size(request.args.get('limit'), default=DEFAULT_PAGE_SIZE, maximum=50),
+            cursor=request.args.get('cursor'),
+            projection=PROFESSIONAL_LISTING_PROJECTION
+        )
+        results = []
+        for professional in professionals:
+            ranking = professional.get('ranking', {})
+            rating_count = ranking.get('rating_count', 0)
+            results.append({
+                'id': str(professional['user_id']),
+                'full_name': professional.get('full_name', ''),
+                'specialty': professional.get('specialty', ''),
+                'experience': professional.get('experience', 0),
+                'description': professional.get('description', ''),
+                'hourly_rate': professional.get('hourly_rate', 0.0),
+                'score': professional.get('ranking_score'),
+                'completed_services': ranking.get('completed', 0),
+                'average_rating': round(ranking['rating_sum'] / rating_count, 1) if rating_count else None,
+                'review_count': rating_count
+            })
+        return page_response(results, next_cursor)
+    
+    except InvalidCursor:
+        return jsonify({'error': 'Cursor de paginação inválido'}), 400
+    except Exception as e:
+        print(f"Erro em api_list_professionals: {e}")
+        return jsonify({'error': 'Erro ao carregar profissionais'}), 500
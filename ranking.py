@@ -0,0 +1,144 @@
+import os
+import math
+import logging
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Média bayesiana das avaliações (0-5): PRIOR_WEIGHT avaliações fictícias de
+# valor PRIOR_MEAN, para que poucas notas altas não passem à frente de um
+# histórico longo
+RANKING_PRIOR_MEAN = float(os.environ.get('RANKING_PRIOR_MEAN', 4.0))
+RANKING_PRIOR_WEIGHT = float(os.environ.get('RANKING_PRIOR_WEIGHT', 5))
+
+# Serviços concluídos a partir dos quais o volume conta por inteiro (escala logarítmica)
+RANKING_VOLUME_TARGET = int(os.environ.get('RANKING_VOLUME_TARGET', 50))
+
+# Meia-vida (dias) do peso do último serviço concluído
+RANKING_RECENCY_HALF_LIFE_DAYS = float(os.environ.get('RANKING_RECENCY_HALF_LIFE_DAYS', 30))
+
+# Peso de cada componente (normalizados em [0, 1]); score final em [0, 100]
+RANKING_WEIGHTS = {
+    'rating': 0.5,
+    'volume': 0.2,
+    'recency': 0.15,
+    'verified': 0.15
+}
+
+# Listagens de profissionais (índices professionals_verified_*ranking)
+RANKING_SORT = [('ranking_score', -1), ('_id', -1)]
+
+# Entradas do score guardadas em professionals.ranking
+EMPTY_RANKING = {'completed': 0, 'last_completed_at': None, 'rating_sum': 0, 'rating_count': 0}
+
+def _input(name):
+    return {'$ifNull': [f'$ranking.{name}', 0]}
+
+def score_stage():
+    """Estágio $set que recalcula ranking_score a partir de professionals.ranking e is_verified
+
+    A mesma expressão serve às atualizações incrementais (update com
+    pipeline) e ao recálculo noturno ($merge); a recência usa $$NOW, por
+    isso o score decai entre recálculos só quando o documento é reescrito.
+    """
+    rating = {'$divide': [
+        {'$add': [RANKING_PRIOR_MEAN * RANKING_PRIOR_WEIGHT, _input('rating_sum')]},
+        {'$multiply': [5, {'$add': [RANKING_PRIOR_WEIGHT, _input('rating_count')]}]}
+    ]}
+    volume = {'$min': [1, {'$divide': [{'$ln': {'$add': [1, _input('completed')]}}, math.log1p(RANKING_VOLUME_TARGET)]}]}
+    recency = {'$cond': [
+        {'$eq': [{'$type': '$ranking.last_completed_at'}, 'date']},
+        {'$min': [1, {'$exp': {'$multiply': [
+            -math.log(2) / (RANKING_RECENCY_HALF_LIFE_DAYS * 86400000),
+            {'$subtract': ['$$NOW', '$ranking.last_completed_at']}
+        ]}}]},
+        0
+    ]}
+    verified = {'$cond': [{'$eq': ['$is_verified', True]}, 1, 0]}
+
+    components = {'rating': rating, 'volume': volume, 'recency': recency, 'verified': verified}
+    return {'$set': {
+        'ranking_score': {'$round': [
+            {'$multiply': [100, {'$add': [{'$multiply': [RANKING_WEIGHTS[name], expression]}
+                                          for name, expression in components.items()]}]},
+            4
+        ]},
+        'ranking.updated_at': '$$NOW'
+    }}
+
+def score_unranked(collection):
+    """Score para perfis sem ranking_score (criados antes do ranking)
+
+    O cursor das listagens filtra por ranking_score < último valor, o que
+    nunca alcança documentos sem o campo. Executado no bootstrap do schema;
+    retorna o número de perfis atualizados.
+    """
+    return collection.update_many({'ranking_score': None}, [score_stage()]).modified_count
+
+def refresh_score(collection, professional_id):
+    """Recalcula o score de um profissional sem mudar as entradas (ex: após verificação)"""
+    collection.update_one({'user_id': professional_id}, [score_stage()])
+
+def record_completion(collection, professional_id, completed_at, rating=None):
+    """Soma um serviço concluído (e a avaliação, se já existir) e recalcula o score numa só escrita"""
+    inputs = {
+        'ranking.completed': {'$add': [_input('completed'), 1]},
+        'ranking.last_completed_at': {'$max': ['$ranking.last_completed_at', completed_at]}
+    }
+    if isinstance(rating, (int, float)):
+        inputs['ranking.rating_sum'] = {'$add': [_input('rating_sum'), rating]}
+        inputs['ranking.rating_count'] = {'$add': [_input('rating_count'), 1]}
+    collection.update_one({'user_id': professional_id}, [{'$set': inputs}, score_stage()])
+
+def record_review(collection, professional_id, rating, previous_rating=None):
+    """Soma uma avaliação nova (ou substitui previous_rating, na edição) e recalcula o score"""
+    if previous_rating is None:
+        inputs = {
+            'ranking.rating_sum': {'$add': [_input('rating_sum'), rating]},
+            'ranking.rating_count': {'$add': [_input('rating_count'), 1]}
+        }
+    else:
+        inputs = {'ranking.rating_sum': {'$add': [_input('rating_sum'), rating - previous_rating]}}
+    collection.update_one({'user_id': professional_id}, [{'$set': inputs}, score_stage()])
+
+def recompute_rankings(db):
+    """Recalcula entradas e score de todos os profissionais a partir dos serviços (job noturno)
+
+    Corrige desvios das atualizações incrementais e aplica o decaimento da
+    recência. Tudo no servidor: $lookup por profissional (índice
+    services_professional_status) e $merge de volta em professionals.
+    Retorna o número de profissionais recalculados.
+    """
+    completed = {'$eq': ['$status', 'completed']}
+    rated = {'$isNumber': '$rating'}
+
+    db.professionals.aggregate([
+        {'$project': {'user_id': 1}},
+        {'$lookup': {
+            'from': 'services',
+            'localField': 'user_id',
+            'foreignField': 'professional_id',
+            'pipeline': [
+                {'$group': {
+                    '_id': None,
+                    'completed': {'$sum': {'$cond': [completed, 1, 0]}},
+                    'last_completed_at': {'$max': {'$cond': [completed, {'$ifNull': ['$completed_at', '$updated_at']}, None]}},
+                    'rating_sum': {'$sum': {'$cond': [rated, '$rating', 0]}},
+                    'rating_count': {'$sum': {'$cond': [rated, 1, 0]}}
+                }},
+                {'$project': {'_id': 0}}
+            ],
+            'as': 'stats'
+        }},
+        {'$project': {'ranking': {'$ifNull': [{'$first': '$stats'}, {'$literal': EMPTY_RANKING}]}}},
+        {'$merge': {
+            'into': 'professionals',
+            'on': '_id',
+            'whenMatched': [{'$set': {'ranking': '$$new.ranking'}}, score_stage()],
+            'whenNotMatched': 'discard'
+        }}
+    ], allowDiskUse=True)
+
+    total = db.professionals.count_documents({})
+    logger.info(f"Ranking recalculado para {total} profissionais")
+    return total
@@ -0,0 +1,81 @@
+import os
+import logging
+from datetime import datetime
+from flask_login import current_user
+from flask_socketio import SocketIO, join_room
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Instância única partilhada pelos blueprints
+socketio = SocketIO()
+
+# Sala com todos os administradores conectados
+ADMIN_ROOM = 'admins'
+
+def user_room(user_id):
+    """Sala privada de um usuário (todas as abas/dispositivos dele)"""
+    return f"user:{user_id}"
+
+def init_realtime(app):
+    """Inicializa o Socket.IO na aplicação
+
+    Com vários workers, defina SOCKETIO_MESSAGE_QUEUE (ex: redis://...) para
+    que eventos emitidos num worker cheguem aos clientes ligados aos outros.
+    SOCKETIO_ASYNC_MODE força o modo (server.py usa 'threading' com workers sync).
+    """
+    socketio.init_app(
+        app,
+        async_mode=os.environ.get('SOCKETIO_ASYNC_MODE') or None,
+        message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None,
+        cors_allowed_origins=os.environ.get('SOCKETIO_CORS_ORIGINS') or None
+    )
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    """Associa a conexão às salas do usuário autenticado"""
+    if not current_user.is_authenticated:
+        return False
+
+    join_room(user_room(current_user.id))
+    if current_user.user_type == 'admin':
+        join_room(ADMIN_ROOM)
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def publish_service_update(service):
+    """Notifica profissional, cliente e admins sobre mudança de status de um serviço"""
+    try:
+        rooms = [ADMIN_ROOM]
+        if service.get('professional_id'):
+            rooms.append(user_room(service['professional_id']))
+        if service.get('client_id'):
+            rooms.append(user_room(service['client_id']))
+
+        payload = {
+            'id': str(service['_id']),
+            'title': service.get('title', 'Serviço'),
+            'status': service.get('status', 'pending'),
+            'price': service.get('price', 0),
+            'updated_at': _isoformat(service.get('updated_at', datetime.utcnow()))
+        }
+        socketio.emit('service_updated', payload, to=rooms)
+    except Exception as e:
+        # Notificação é best-effort: nunca deve falhar a rota que a originou
+        logger.warning(f"Erro ao publicar service_updated: {str(e)[:100]}...")
+
+def publish_user_registered(user_data):
+    """Notifica os admins sobre um novo registro"""
+    try:
+        payload = {
+            'id': str(user_data['_id']),
+            'username': user_data.get('username', ''),
+            'email': user_data.get('email', ''),
+            'user_type': user_data.get('user_type', 'client'),
+            'full_name': user_data.get('full_name', ''),
+            'created_at': _isoformat(user_data.get('created_at', datetime.utcnow()))
+        }
+        socketio.emit('user_registered', payload, to=ADMIN_ROOM)
+    except Exception as e:
+        logger.warning(f"Erro ao publicar user_registered: {str(e)[:100]}...")
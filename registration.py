@@ -0,0 +1,79 @@
+import os
+import logging
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Escrita de usuário + perfil:
+#   auto         transação quando o cluster suporta (replica set / sharded), senão two_phase
+#   transaction  sempre numa transação (falha num MongoDB standalone)
+#   two_phase    insere o usuário, depois o perfil; remove o usuário se o perfil falhar
+REGISTRATION_WRITE_MODE = os.environ.get('REGISTRATION_WRITE_MODE', 'auto')
+
+_TRANSACTION_TOPOLOGIES = {'ReplicaSetWithPrimary', 'Sharded', 'LoadBalanced'}
+
+class IdentityTaken(Exception):
+    """Username ou email já registrado (violação do índice único)"""
+
+    def __init__(self, field):
+        super().__init__(field)
+        self.field = field
+
+def duplicate_field(error):
+    """Campo ('username' ou 'email') que violou o índice único de users"""
+    details = error.details or {}
+    keys = details.get('keyPattern') or details.get('keyValue') or {}
+    for field in ('username', 'email'):
+        if field in keys:
+            return field
+    # Servidores antigos só informam o índice na mensagem
+    return 'email' if 'email' in str(error) else 'username'
+
+def _use_transaction(client):
+    if REGISTRATION_WRITE_MODE == 'transaction':
+        return True
+    if REGISTRATION_WRITE_MODE == 'two_phase':
+        return False
+    return client.topology_description.topology_type_name in _TRANSACTION_TOPOLOGIES
+
+def create_account(collections, user_data, profile_name, profile_data):
+    """Cria o usuário e o seu perfil (clients/professionals/admins) sem verificação prévia
+
+    Os índices únicos de username e email decidem: um registro concorrente com
+    os mesmos dados falha com IdentityTaken, sem janela entre verificar e
+    inserir. Num registro bem-sucedido são duas escritas (três em transação) em
+    vez de duas leituras e duas escritas. Retorna o _id do usuário.
+    """
+    users = collections['users']
+    profiles = collections[profile_name]
+    user_data['_id'] = ObjectId()
+    if profiles is not None:
+        profile_data['user_id'] = user_data['_id']
+
+    try:
+        if profiles is not None and _use_transaction(users.database.client):
+            with users.database.client.start_session() as session:
+                session.with_transaction(lambda session: (
+                    users.insert_one(user_data, session=session),
+                    profiles.insert_one(profile_data, session=session)
+                ))
+            return user_data['_id']
+
+        users.insert_one(user_data)
+    except DuplicateKeyError as e:
+        raise IdentityTaken(duplicate_field(e))
+
+    if profiles is not None:
+        try:
+            profiles.insert_one(profile_data)
+        except Exception:
+            # Compensação: não deixar um usuário sem perfil
+            try:
+                users.delete_one({'_id': user_data['_id']})
+            except Exception as e:
+                logger.error(f"Usuário {user_data['_id']} ficou sem perfil: {str(e)[:100]}...")
+            raise
+
+    return user_data['_id']
@@ -0,0 +1,259 @@
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from collections import OrderedDict
+import pymongo
+from pymongo import monitoring
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError, WaitQueueTimeoutError
+from flask import jsonify, request
+from flask_socketio import emit
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Prazo padrão por rota: bem abaixo do serverSelectionTimeoutMS do cliente
+# (10s Atlas / 5s local), para que um database lento não prenda os workers
+ROUTE_DEADLINE_MS = int(os.environ.get('MONGO_ROUTE_DEADLINE_MS', 3000))
+
+# Erros do servidor que indicam sobrecarga/lentidão (não erros da query)
+_TIMEOUT_CODES = {50, 89, 91, 189, 262}  # MaxTimeMSExpired, NetworkTimeout, ShutdownInProgress, PrimarySteppedDown, ExceededTimeLimit
+_NETWORK_ERROR_TYPES = {'AutoReconnect', 'NetworkTimeout', 'ConnectionFailure', 'NotPrimaryError', 'WaitQueueTimeoutError'}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Circuit breaker clássico: closed -> open -> half_open -> closed
+
+    Abre após failure_threshold falhas consecutivas. Aberto, rejeita tudo até
+    reset_timeout; em half_open deixa passar um pedido de teste a cada
+    reset_timeout e fecha no primeiro sucesso (ou reabre na primeira falha).
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=15):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._next_probe_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._next_probe_at = 0.0
+            return self._state
+
+    def allow(self):
+        """True se o pedido pode usar o database (em half_open: só o de teste)"""
+        state = self.state
+        if state == CLOSED:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN and now >= self._next_probe_at:
+                self._next_probe_at = now + self.reset_timeout
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                logger.info(f"Circuit breaker '{self.name}' fechado")
+                self._state = CLOSED
+            if self._state == CLOSED:
+                self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+                logger.warning(f"Circuit breaker '{self.name}' aberto após {self._failures} falhas consecutivas")
+
+    def retry_after(self):
+        """Segundos até o próximo pedido de teste"""
+        with self._lock:
+            if self._state == OPEN:
+                return max(1, int(self.reset_timeout - (time.monotonic() - self._opened_at)))
+            return max(1, int(self._next_probe_at - time.monotonic()))
+
+    def metrics(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
+
+mongo_breaker = CircuitBreaker(
+    'mongodb',
+    failure_threshold=int(os.environ.get('MONGO_BREAKER_THRESHOLD', 5)),
+    reset_timeout=float(os.environ.get('MONGO_BREAKER_RESET_SECONDS', 15))
+)
+
+def is_infrastructure_error(error):
+    """Falha sem evento de comando do driver: conta para o breaker em db_guard/socket_guard
+
+    Falhas de comandos enviados (rede, timeout no servidor) chegam ao breaker
+    pelo BreakerListener; aqui ficam só as que acontecem antes do envio:
+    nenhum servidor selecionável ou pool de conexões esgotado.
+    """
+    return isinstance(error, (ServerSelectionTimeoutError, WaitQueueTimeoutError))
+
+class BreakerListener(monitoring.CommandListener, monitoring.ServerHeartbeatListener, monitoring.TopologyListener):
+    """Alimenta o breaker com os eventos do driver
+
+    Comandos: sucesso fecha/zera, falha de rede ou timeout conta como falha
+    (único ponto de contagem para comandos enviados).
+    Heartbeats: só contam quando nenhuma topologia conhecida (um cliente por
+    perfil de carga) tem um servidor com escrita — um secundário inacessível
+    com o primário saudável não abre o breaker.
+    """
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self._writable = {}
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if isinstance(event, monitoring.CommandSucceededEvent):
+            self.breaker.record_success()
+
+    def failed(self, event):
+        if isinstance(event, monitoring.ServerHeartbeatFailedEvent):
+            if self._writable and not any(self._writable.values()):
+                self.breaker.record_failure()
+            return
+
+        failure = event.failure or {}
+        if failure.get('errtype') in _NETWORK_ERROR_TYPES or failure.get('code') in _TIMEOUT_CODES:
+            self.breaker.record_failure()
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        if isinstance(event, monitoring.TopologyDescriptionChangedEvent):
+            self._writable[event.topology_id] = event.new_description.has_writable_server()
+
+    def closed(self, event):
+        self._writable.pop(event.topology_id, None)
+
+mongo_breaker_listener = BreakerListener(mongo_breaker)
+
+def db_guard(fallback=None, deadline_ms=None):
+    """Decorator de rota: falha rápida com o breaker aberto e prazo por rota
+
+    Com o breaker aberto devolve fallback(**kwargs da rota) ou 503 com
+    Retry-After, sem tocar no database. Caso contrário executa a rota dentro
+    de pymongo.timeout(), que limita todas as operações do request
+    (incluindo seleção de servidor) ao prazo da rota.
+    """
+    deadline = (deadline_ms or ROUTE_DEADLINE_MS) / 1000
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not mongo_breaker.allow():
+                if fallback is not None:
+                    return fallback(**kwargs)
+                response = jsonify({'error': 'Serviço temporariamente indisponível. Tente novamente em instantes.'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(mongo_breaker.retry_after())
+                return response
+
+            try:
+                with pymongo.timeout(deadline):
+                    return view(*args, **kwargs)
+            except PyMongoError as e:
+                if is_infrastructure_error(e):
+                    mongo_breaker.record_failure()
+                raise
+        return wrapper
+    return decorator
+
+def socket_guard(error_event='chat_error'):
+    """Decorator de handler Socket.IO: o equivalente de db_guard para eventos
+
+    Com o breaker aberto ou numa falha do database emite error_event ao
+    próprio cliente e devolve o ack {'success': False, 'error'}, em vez de
+    deixar a exceção escapar do handler.
+    """
+    deadline = ROUTE_DEADLINE_MS / 1000
+    unavailable = {'success': False, 'error': 'Chat temporariamente indisponível. Tente novamente em instantes.'}
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            if not mongo_breaker.allow():
+                emit(error_event, {**unavailable, 'retry_after': mongo_breaker.retry_after()})
+                return unavailable
+
+            try:
+                with pymongo.timeout(deadline):
+                    return handler(*args, **kwargs)
+            except PyMongoError as e:
+                if is_infrastructure_error(e):
+                    mongo_breaker.record_failure()
+                logger.error(f"Erro em {handler.__name__}: {str(e)[:100]}...")
+                emit(error_event, unavailable)
+                return unavailable
+        return wrapper
+    return decorator
+
+class RateLimiter:
+    """Token bucket por chave (ex: IP do cliente), em memória do processo
+
+    Cada chave recebe rate pedidos por period segundos, com rajadas até burst.
+    Guarda no máximo maxsize chaves (as menos recentes são descartadas).
+    """
+
+    def __init__(self, rate, period=60, burst=None, maxsize=10000):
+        self.rate = rate / period
+        self.burst = burst or rate
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Consome um pedido de key; retorna 0 se permitido, ou os segundos até haver saldo"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+def rate_limit(limiter):
+    """Decorator de rota: 429 com Retry-After quando o IP excede o limiter"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            retry_after = limiter.allow(request.remote_addr)
+            if retry_after:
+                response = jsonify({'error': 'Muitos pedidos. Tente novamente em instantes.'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, round(retry_after)))
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
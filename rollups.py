@@ -0,0 +1,211 @@
+import logging
+from datetime import datetime, timedelta
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+ROLLUPS_COLLECTION = 'rollups'
+
+# Margem de sobreposição entre execuções: escritas em curso durante a
+# execução anterior (ou pequenas diferenças de relógio) voltam a ser vistas
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+# Acima disto um refresh incremental sai mais caro que um rebuild completo
+MAX_INCREMENTAL_DAYS = 366
+
+# Cada métrica gera um documento por (granularidade, período) com o total e
+# o detalhe por chave em 'values': {chave: {'count', 'revenue'}}.
+#   changed    documentos alterados desde o último refresh (marcam dias a recalcular)
+#   date_field data que define o bucket
+#   match      filtro dos documentos contados
+#   key        expressão da dimensão
+#   revenue    expressão somada em 'revenue' (None: sem receita)
+METRICS = {
+    'users_by_type': {
+        'collection': 'users',
+        'changed': lambda since: {'created_at': {'$gte': since}},
+        'date_field': 'created_at',
+        'match': {},
+        'key': '$user_type',
+        'revenue': None
+    },
+    'services_by_status': {
+        'collection': 'services',
+        'changed': lambda since: {'$or': [{'created_at': {'$gte': since}}, {'updated_at': {'$gte': since}}]},
+        'date_field': 'created_at',
+        'match': {},
+        'key': '$status',
+        'revenue': None
+    },
+    'revenue_by_category': {
+        'collection': 'services',
+        'changed': lambda since: {'$or': [{'created_at': {'$gte': since}}, {'updated_at': {'$gte': since}}]},
+        'date_field': 'completed_at',
+        'match': {'status': 'completed'},
+        'key': '$category',
+        'revenue': '$price'
+    },
+}
+
+GRANULARITIES = ('day', 'month')
+
+def bucket_start(value, granularity):
+    """Início do bucket (dia ou mês, UTC) que contém value"""
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(day=1) if granularity == 'month' else value
+
+def _next_bucket(value, granularity):
+    if granularity == 'day':
+        return value + timedelta(days=1)
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _ranges_filter(field, starts, granularity):
+    return {'$or': [{field: {'$gte': start, '$lt': _next_bucket(start, granularity)}} for start in starts]}
+
+def _bucket_stages(metric_name, granularity, run_at):
+    """Agrupa pares (período, chave) num documento por período e grava com $merge"""
+    id_format = '%Y-%m-%d' if granularity == 'day' else '%Y-%m'
+    return [
+        {'$group': {
+            '_id': '$_id.period',
+            'values': {'$push': {'k': '$_id.key', 'v': {'count': '$count', 'revenue': '$revenue'}}},
+            'count': {'$sum': '$count'},
+            'revenue': {'$sum': '$revenue'}
+        }},
+        {'$project': {
+            '_id': {'$concat': [f'{metric_name}:{granularity}:', {'$dateToString': {'format': id_format, 'date': '$_id'}}]},
+            'metric': metric_name,
+            'granularity': granularity,
+            'period': '$_id',
+            'values': {'$arrayToObject': '$values'},
+            'count': 1,
+            'revenue': 1,
+            'updated_at': run_at
+        }},
+        {'$merge': {'into': ROLLUPS_COLLECTION, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ]
+
+def _rebuild_days(db, metric_name, metric, days, run_at):
+    """Recalcula os buckets diários (todos, se days=None) a partir dos dados brutos"""
+    date_field = metric['date_field']
+    match = {**metric['match'], date_field: {'$type': 'date'}}
+    if days is not None:
+        match = {'$and': [match, _ranges_filter(date_field, days, 'day')]}
+
+    db[metric['collection']].aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': {
+                'period': {'$dateTrunc': {'date': f'${date_field}', 'unit': 'day'}},
+                'key': {'$toString': {'$ifNull': [metric['key'], 'unknown']}}
+            },
+            'count': {'$sum': 1},
+            'revenue': {'$sum': {'$ifNull': [metric['revenue'], 0]}} if metric['revenue'] else {'$sum': 0}
+        }},
+        *_bucket_stages(metric_name, 'day', run_at)
+    ])
+    _delete_stale(db, metric_name, 'day', days, run_at)
+
+def _rebuild_months(db, metric_name, months, run_at):
+    """Recalcula os buckets mensais (todos, se months=None) a partir dos diários"""
+    match = {'metric': metric_name, 'granularity': 'day'}
+    if months is not None:
+        match.update(_ranges_filter('period', months, 'month'))
+
+    db[ROLLUPS_COLLECTION].aggregate([
+        {'$match': match},
+        {'$project': {
+            'month': {'$dateTrunc': {'date': '$period', 'unit': 'month'}},
+            'values': {'$objectToArray': '$values'}
+        }},
+        {'$unwind': '$values'},
+        {'$group': {
+            '_id': {'period': '$month', 'key': '$values.k'},
+            'count': {'$sum': '$values.v.count'},
+            'revenue': {'$sum': '$values.v.revenue'}
+        }},
+        *_bucket_stages(metric_name, 'month', run_at)
+    ])
+    _delete_stale(db, metric_name, 'month', months, run_at)
+
+def _delete_stale(db, metric_name, granularity, periods, run_at):
+    """Remove buckets recalculados que deixaram de ter dados (não tocados nesta execução)"""
+    query = {'metric': metric_name, 'granularity': granularity, 'updated_at': {'$lt': run_at}}
+    if periods is not None:
+        query['period'] = {'$in': periods}
+    db[ROLLUPS_COLLECTION].delete_many(query)
+
+def _changed_days(db, metric, since):
+    """Dias (do date_field) com documentos alterados desde since"""
+    date_field = metric['date_field']
+    result = db[metric['collection']].aggregate([
+        {'$match': {'$and': [metric['changed'](since), {date_field: {'$type': 'date'}}]}},
+        {'$group': {'_id': {'$dateTrunc': {'date': f'${date_field}', 'unit': 'day'}}}}
+    ])
+    return sorted(item['_id'] for item in result)
+
+def refresh_rollups(db, full=False):
+    """Atualiza os buckets diários e mensais de todas as métricas
+
+    Incremental por padrão: só recalcula os dias com documentos criados ou
+    alterados desde o refresh anterior (marcador em meta.rollups) e os meses
+    que os contêm. full=True reconstrói tudo. Retorna {métrica: dias recalculados
+    ou 'full'}.
+    """
+    # Precisão de milissegundos, como o BSON: updated_at == run_at marca os
+    # buckets escritos nesta execução
+    now = datetime.utcnow()
+    run_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    state = db.meta.find_one({'_id': 'rollups'}) or {}
+    since = None if full or not state.get('started_at') else state['started_at'] - REFRESH_OVERLAP
+    summary = {}
+
+    for metric_name, metric in METRICS.items():
+        days = None if since is None else _changed_days(db, metric, since)
+        if days is not None and len(days) > MAX_INCREMENTAL_DAYS:
+            days = None
+        if days == []:
+            summary[metric_name] = 0
+            continue
+
+        _rebuild_days(db, metric_name, metric, days, run_at)
+        months = None if days is None else sorted({bucket_start(day, 'month') for day in days})
+        _rebuild_months(db, metric_name, months, run_at)
+        summary[metric_name] = 'full' if days is None else len(days)
+
+    db.meta.update_one(
+        {'_id': 'rollups'},
+        {'$set': {'started_at': run_at, 'finished_at': datetime.utcnow()}},
+        upsert=True
+    )
+    logger.info(f"Rollups atualizados: {summary}")
+    return summary
+
+def exact_granularity(start=None, end=None):
+    """Granularidade cujos buckets somam exatamente [start, end]
+
+    read_rollups arredonda start para o início do bucket e inclui o bucket
+    que contém end: meses só servem para intervalos de meses inteiros.
+    """
+    month_aligned = (start is None or start == bucket_start(start, 'month')) and \
+                    (end is None or (end + timedelta(days=1)).day == 1)
+    return 'month' if month_aligned else 'day'
+
+def read_rollups(collection, metric_name, granularity, start=None, end=None):
+    """Buckets de uma métrica no intervalo [start, end], em ordem cronológica"""
+    query = {'metric': metric_name, 'granularity': granularity}
+    period = {}
+    if start is not None:
+        period['$gte'] = bucket_start(start, granularity)
+    if end is not None:
+        period['$lte'] = end
+    if period:
+        query['period'] = period
+
+    return list(collection.find(query, {'_id': 0, 'updated_at': 0}).sort('period', 1))
+
+def period_label(period, granularity):
+    """Rótulo do período no formato usado pelos relatórios (M/AAAA ou DD/MM/AAAA)"""
+    if granularity == 'month':
+        return f"{period.month}/{period.year}"
+    return period.strftime('%d/%m/%Y')
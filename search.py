@@ -0,0 +1,132 @@
+from pagination import decode_cursor, encode_cursor, keyset_filter, paginate
+
+# Apenas anúncios de serviço (api_create_service) aparecem na busca; os
+# pedidos de clientes na mesma collection têm outros status
+SEARCHABLE_STATUS = 'available'
+
+# Ordem por relevância (score do índice de texto) e, sem termo, por recência
+RELEVANCE_SORT = [('score', -1), ('_id', -1)]
+RECENT_SORT = [('created_at', -1), ('_id', -1)]
+
+MAX_QUERY_LENGTH = 100
+
+SEARCH_PROJECTION = {
+    'title': 1,
+    'description': 1,
+    'category': 1,
+    'price': 1,
+    'location': 1,
+    'duration': 1,
+    'tags': 1,
+    'professional_id': 1,
+    'professional_name': 1,
+    'professional_specialty': 1,
+    'created_at': 1
+}
+
+def search_filter(category=None, location=None):
+    """Filtros exatos combinados com a busca (servidos por services_status_category_created_at_id)"""
+    query = {'status': SEARCHABLE_STATUS}
+    if category:
+        query['category'] = category
+    if location:
+        query['location'] = location
+    return query
+
+def search_services(collection, text=None, category=None, location=None, page_size=20, cursor=None):
+    """Uma página da busca de serviços
+
+    Com text usa o índice de texto services_text (pesos: título > tags >
+    descrição) e ordena por relevância; o cursor guarda (score, _id) do último
+    item. Sem text lista os mais recentes com os filtros. Retorna (documentos,
+    próximo_cursor); levanta pagination.InvalidCursor.
+    """
+    query = search_filter(category, location)
+    if not text:
+        return paginate(collection, query, RECENT_SORT, page_size, cursor, SEARCH_PROJECTION)
+
+    pipeline = [
+        {'$match': {'$text': {'$search': text}, **query}},
+        {'$addFields': {'score': {'$meta': 'textScore'}}}
+    ]
+    if cursor:
+        # O score de um documento é o mesmo para o mesmo termo: posição estável entre páginas
+        pipeline.append({'$match': keyset_filter(RELEVANCE_SORT, decode_cursor(cursor, len(RELEVANCE_SORT)))})
+    pipeline += [
+        # $sort seguido de $limit: o servidor mantém só os primeiros page_size + 1
+        {'$sort': {'score': -1, '_id': -1}},
+        {'$limit': page_size + 1},
+        {'$project': {**SEARCH_PROJECTION, 'score': 1}}
+    ]
+
+    documents = list(collection.aggregate(pipeline))
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        last = documents[-1]
+        next_cursor = encode_cursor([last['score'], last['_id']])
+
+    return documents, next_cursor
+
+# Limites (inclusive, exclusive) das faixas de preço mostradas na página de serviços
+PRICE_BOUNDARIES = [0, 1000, 2500, 5000, 10000, 20000]
+MAX_LOCATION_FACETS = 20
+
+def facet_services(collection, text=None, category=None, location=None, page_size=20):
+    """Primeira página de resultados e contagens por categoria, preço e local numa só agregação
+
+    As contagens refletem o conjunto filtrado atual. Os estágios dentro de
+    $facet não usam índices (só o $match inicial usa), por isso a página sem
+    filtros, que percorre todos os anúncios, deve ser servida em cache.
+    Retorna (documentos, próximo_cursor, facetas); o cursor continua em
+    search_services com os mesmos filtros.
+    """
+    sort = RELEVANCE_SORT if text else RECENT_SORT
+    match = search_filter(category, location)
+    if text:
+        match['$text'] = {'$search': text}
+
+    pipeline = [{'$match': match}]
+    if text:
+        pipeline.append({'$addFields': {'score': {'$meta': 'textScore'}}})
+    pipeline.append({'$facet': {
+        'results': [
+            {'$sort': dict(sort)},
+            {'$limit': page_size + 1},
+            {'$project': {**SEARCH_PROJECTION, **({'score': 1} if text else {})}}
+        ],
+        'total': [{'$count': 'count'}],
+        'categories': [{'$sortByCount': '$category'}],
+        'locations': [{'$sortByCount': '$location'}, {'$limit': MAX_LOCATION_FACETS}],
+        'prices': [{
+            '$bucket': {
+                'groupBy': '$price',
+                'boundaries': PRICE_BOUNDARIES,
+                # Acima do último limite (ou sem preço numérico)
+                'default': 'other',
+                'output': {'count': {'$sum': 1}}
+            }
+        }]
+    }})
+
+    result = next(collection.aggregate(pipeline, allowDiskUse=True))
+    documents = result['results']
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        last = documents[-1]
+        next_cursor = encode_cursor([last.get(field) for field, _ in sort])
+
+    facets = {
+        'total': result['total'][0]['count'] if result['total'] else 0,
+        'categories': [{'value': item['_id'], 'count': item['count']} for item in result['categories'] if item['_id']],
+        'locations': [{'value': item['_id'], 'count': item['count']} for item in result['locations'] if item['_id']],
+        'prices': [_price_facet(item) for item in result['prices']]
+    }
+    return documents, next_cursor, facets
+
+def _price_facet(item):
+    if item['_id'] == 'other':
+        return {'min': PRICE_BOUNDARIES[-1], 'max': None, 'count': item['count']}
+    upper = PRICE_BOUNDARIES[PRICE_BOUNDARIES.index(item['_id']) + 1]
+    return {'min': item['_id'], 'max': upper, 'count': item['count']}
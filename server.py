@@ -0,0 +1,34 @@
+# =============================================
+# ENTRY POINT DE PRODUÇÃO (GUNICORN, MULTI-WORKER)
+# =============================================
+#
+#   gunicorn -c gunicorn.conf.py server:app
+#
+# Com preload_app a app é carregada uma única vez no master: imports,
+# blueprints, configuração e templates compilados ficam partilhados pelos
+# workers (copy-on-write). O cliente MongoDB NÃO é criado aqui: pymongo não
+# é fork-safe, por isso cada worker cria o seu em connect_worker(), chamado
+# pelo hook post_worker_init do gunicorn.conf.py.
+
+import logging
+from app import init_app, start_database
+
+logger = logging.getLogger('txunajob')
+
+def preload_templates(application):
+    """Compila todos os templates Jinja antes do fork"""
+    env = application.jinja_env
+    templates = env.list_templates()
+    for name in templates:
+        try:
+            env.get_template(name)
+        except Exception as e:
+            logger.warning(f"Template não pré-carregado {name}: {str(e)[:100]}...")
+    logger.info(f"{len(templates)} templates pré-carregados")
+
+def connect_worker(application):
+    """Cria o cliente MongoDB do worker (após o fork) e executa o bootstrap"""
+    start_database(application)
+
+app = init_app(connect_database=False)
+preload_templates(app)
@@ -0,0 +1,150 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from pymongo import ReturnDocument
+
+# Configurar logging
+logger = logging.getLogger('txunajob')
+
+# Documento único da collection settings
+SETTINGS_ID = 'system'
+
+# Intervalo entre verificações da versão pelos workers (segundos)
+SETTINGS_POLL_SECONDS = float(os.environ.get('SETTINGS_POLL_SECONDS', 5))
+
+# Valores padrão (e tipos aceites) das configurações do painel do admin
+DEFAULT_SETTINGS = {
+    'siteName': 'TxunaJob',
+    'siteDescription': 'Plataforma de serviços profissionais em Moçambique',
+    'adminEmail': 'admin@txunajob.com',
+    'comissionRate': 15,
+    'maxServices': 10,
+    'autoApprove': False,
+    'passwordMinLength': 8,
+    'maxLoginAttempts': 5,
+    'sessionTimeout': 120,
+    'emailNotifications': True,
+    'pushNotifications': True,
+    'smsNotifications': False,
+    'maintenanceMode': False,
+    'maintenanceMessage': 'Sistema em manutenção. Volte em breve!'
+}
+
+def clean_settings(data):
+    """Mantém só chaves conhecidas, convertidas para o tipo do valor padrão
+
+    Levanta ValueError, com a chave e o valor recebido na mensagem, para
+    valores que não convertem ou números negativos.
+    """
+    cleaned = {}
+    for key, value in data.items():
+        default = DEFAULT_SETTINGS.get(key)
+        if default is None:
+            continue
+        if isinstance(default, bool):
+            cleaned[key] = value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'on', 'yes')
+        elif isinstance(default, (int, float)):
+            expected = 'número inteiro' if isinstance(default, int) else 'número'
+            try:
+                number = type(default)(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key}: {value!r} não é um {expected}")
+            if number < 0:
+                raise ValueError(f"{key}: {value!r} deve ser um {expected} maior ou igual a 0")
+            cleaned[key] = number
+        else:
+            cleaned[key] = str(value)[:500]
+    return cleaned
+
+class SettingsStore:
+    """Snapshot das configurações em memória do processo, identificado pela versão
+
+    O documento settings.system tem {'version', 'values'}; cada gravação
+    incrementa a versão. Os workers verificam só a versão (leitura por _id com
+    projeção) a cada SETTINGS_POLL_SECONDS, numa thread, e recarregam os
+    valores quando ela muda. Quem lê o snapshot (before_request, rotas) nunca
+    toca no database.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.values = dict(DEFAULT_SETTINGS)
+        self.loaded_at = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def get(self, key):
+        return self.values.get(key, DEFAULT_SETTINGS.get(key))
+
+    def snapshot(self):
+        return {'version': self.version, 'settings': dict(self.values)}
+
+    def on_change(self, listener):
+        """listener(values) é chamado sempre que um snapshot novo é instalado"""
+        self._listeners.append(listener)
+
+    def _install(self, document):
+        with self._lock:
+            version = document.get('version', 0) if document else 0
+            if self.loaded_at is not None and version == self.version:
+                return False
+            self.values = {**DEFAULT_SETTINGS, **((document or {}).get('values') or {})}
+            self.version = version
+            self.loaded_at = datetime.utcnow()
+        for listener in self._listeners:
+            listener(self.values)
+        return True
+
+    def load(self, collection):
+        """Carrega o documento completo (arranque do worker)"""
+        self._install(collection.find_one({'_id': SETTINGS_ID}))
+
+    def refresh(self, collection):
+        """Recarrega apenas se a versão no database mudou; retorna True se mudou"""
+        current = collection.find_one({'_id': SETTINGS_ID}, {'version': 1})
+        if (current or {}).get('version', 0) == self.version and self.loaded_at is not None:
+            return False
+        changed = self._install(collection.find_one({'_id': SETTINGS_ID}))
+        if changed:
+            logger.info(f"Configurações atualizadas para a versão {self.version}")
+        return changed
+
+    def save(self, collection, values, updated_by=None):
+        """Grava valores (já validados), incrementa a versão e instala o resultado localmente"""
+        document = collection.find_one_and_update(
+            {'_id': SETTINGS_ID},
+            {
+                '$set': {**{f'values.{key}': value for key, value in values.items()},
+                         'updated_at': datetime.utcnow(), 'updated_by': updated_by},
+                '$inc': {'version': 1}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._install(document)
+        return self.version
+
+    def start_watcher(self, get_collection):
+        """Thread que verifica a versão periodicamente (uma por processo)"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(get_collection,), name='settings-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self, get_collection):
+        while True:
+            time.sleep(SETTINGS_POLL_SECONDS)
+            collection = get_collection()
+            if collection is None:
+                continue
+            try:
+                self.refresh(collection)
+            except Exception as e:
+                # Mantém o último snapshot; tenta de novo no próximo ciclo
+                logger.warning(f"Falha ao verificar configurações: {str(e)[:100]}...")
+
+settings_store = SettingsStore()
@@ -23,16 +23,96 @@ class AdminDashboard {
         await this.loadDashboardData();
         this.setupEventListeners();
         this.setupModalHandlers();
+        this.setupRealtime();
         this.updateUI();
         
-        // Atualização automática a cada 30 segundos
+        // Atualização automática a cada 30 segundos (apenas sem tempo real)
         setInterval(() => {
+            if (this.socket && this.socket.connected) return;
             if (!this.isLoading) {
                 this.loadDashboardData().then(() => this.updateUI());
             }
         }, 30000);
     }
 
+    setupRealtime() {
+        // Socket.IO indisponível (ex: serverless): o polling continua a funcionar
+        if (typeof io === 'undefined') return;
+
+        this.socket = io({ withCredentials: true });
+        let wasDisconnected = false;
+
+        this.socket.on('connect', () => {
+            // Ressincronizar uma vez após uma queda para recuperar eventos perdidos
+            if (wasDisconnected) {
+                this.loadDashboardData().then(() => this.updateUI());
+            }
+        });
+        this.socket.on('disconnect', () => { wasDisconnected = true; });
+        this.socket.on('service_updated', (update) => this.applyServiceUpdate(update));
+        this.socket.on('user_registered', (user) => this.applyUserRegistered(user));
+    }
+
+    applyServiceUpdate(update) {
+        const service = this.services.find(s => s.id === update.id);
+        const previousStatus = service ? service.status : null;
+
+        if (service) {
+            service.status = update.status;
+        }
+
+        if (update.status === 'completed' && previousStatus !== 'completed') {
+            this.stats.completedServices = (this.stats.completedServices || 0) + 1;
+            this.stats.activeServices = Math.max(0, (this.stats.activeServices || 0) - 1);
+            this.stats.totalRevenue = (this.stats.totalRevenue || 0) + (update.price || 0);
+
+            this.addActivity({
+                type: 'service_completed',
+                title: 'Serviço concluído',
+                description: `${update.title} - ${update.price || 0} MT`,
+                timestamp: update.updated_at,
+                service_id: update.id
+            });
+        }
+
+        this.updateUI();
+    }
+
+    applyUserRegistered(user) {
+        const isProfessional = user.user_type === 'professional';
+
+        this.users.unshift({
+            ...user,
+            status: isProfessional ? 'pending' : 'active'
+        });
+        this.users = this.users.slice(0, 20);
+
+        this.stats.totalUsers = (this.stats.totalUsers || 0) + 1;
+        this.stats.newUsersMonth = (this.stats.newUsersMonth || 0) + 1;
+        if (isProfessional) {
+            this.stats.totalProfessionals = (this.stats.totalProfessionals || 0) + 1;
+            this.stats.pendingVerifications = (this.stats.pendingVerifications || 0) + 1;
+        } else if (user.user_type === 'client') {
+            this.stats.totalClients = (this.stats.totalClients || 0) + 1;
+        }
+
+        const userType = user.user_type.charAt(0).toUpperCase() + user.user_type.slice(1);
+        this.addActivity({
+            type: 'user_registered',
+            title: 'Novo usuário registrado',
+            description: `${user.username} (${userType})`,
+            timestamp: user.created_at,
+            user_id: user.id
+        });
+
+        this.updateUI();
+    }
+
+    addActivity(activity) {
+        this.activities.unshift(activity);
+        this.activities = this.activities.slice(0, 10);
+    }
+
     async loadDashboardData() {
         if (this.isLoading) return;
         
@@ -100,8 +180,11 @@ class AdminDashboard {
         const timeoutId = setTimeout(() => controller.abort(), 10000);
         
         try {
+            // cache 'no-cache': o navegador revalida com If-None-Match e,
+            // se o servidor responder 304, reutiliza o corpo em cache
             const response = await fetch(url, {
                 credentials: 'include',
+                cache: 'no-cache',
                 signal: controller.signal,
                 ...options
             });
@@ -1,27 +1,46 @@
 /**
  * TxunaJob - Sistema de Chat
- * Autor: EgoBrain-Dev  
- * Versão: 1.0.0
+ * Conversas reais via /api/chat e Socket.IO
+ * Autor: EgoBrain-Dev
+ * Versão: 2.0.0 - Backend real com confirmações de entrega/leitura
  */
 
 class ChatSystem {
     static init() {
-        Logger.log('CHAT', 'Inicializando sistema de chat');
-        
-        // Configurar event listeners do chat
+        // Página /chat ou widget da página inicial
+        this.root = document.querySelector('[data-chat-user-id]');
+        if (!this.root) return;
+
+        this.currentUserId = this.root.dataset.chatUserId;
+        this.conversations = [];
+        this.activeChatId = null;
+        this.socket = null;
+        this.started = false;
+
+        if (!this.currentUserId) {
+            this.setStatus('Faça login para usar o chat', 'disconnected');
+            return;
+        }
+
         this.setupEventListeners();
-        
-        // Carregar estado inicial se usuário estiver logado
-        if (AuthSystem.isLoggedIn()) {
-            this.loadInitialState();
+
+        // O widget só conecta quando for aberto
+        if (!this.root.classList.contains('hidden')) {
+            this.start();
         }
     }
-    
+
+    static start() {
+        if (this.started) return;
+        this.started = true;
+        this.connect();
+        this.loadConversations();
+    }
+
     static setupEventListeners() {
-        // Input de mensagem
         const messageInput = document.getElementById('chatMessageInput');
         const sendButton = document.getElementById('sendMessageBtn');
-        
+
         if (messageInput && sendButton) {
             // Enviar com Enter
             messageInput.addEventListener('keypress', (e) => {
@@ -29,109 +48,142 @@ class ChatSystem {
                     this.sendMessage();
                 }
             });
-            
+
             // Enviar com botão
             sendButton.addEventListener('click', () => {
                 this.sendMessage();
             });
         }
-        
-        // Fechar chat
-        const closeBtn = document.querySelector('.chat-close');
-        if (closeBtn) {
-            closeBtn.addEventListener('click', () => {
-                this.close();
+
+        // Filtrar conversas
+        const searchInput = document.getElementById('chatSearch');
+        if (searchInput) {
+            searchInput.addEventListener('input', () => this.displayConversations());
+        }
+
+        // Marcar como lidas ao voltar para a aba
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden && this.activeChatId) {
+                this.markRead(this.activeChatId);
+            }
+        });
+    }
+
+    // =========================================================================
+    // CONEXÃO EM TEMPO REAL
+    // =========================================================================
+
+    static connect() {
+        if (typeof io === 'undefined') {
+            this.setStatus('Tempo real indisponível', 'disconnected');
+            return;
+        }
+
+        this.socket = io({ withCredentials: true });
+
+        this.socket.on('connect', () => {
+            this.setStatus('Conectado', 'connected');
+            // Após reconexão, voltar a entrar na sala da conversa ativa
+            if (this.activeChatId) {
+                this.socket.emit('join_chat', { chat_id: this.activeChatId });
+            }
+        });
+
+        this.socket.on('disconnect', () => {
+            this.setStatus('Reconectando...', 'disconnected');
+        });
+
+        this.socket.on('new_message', (message) => this.handleIncomingMessage(message));
+
+        // Database indisponível no servidor: a ligação continua, só as operações falham
+        this.socket.on('chat_error', (data) => {
+            this.setStatus(data.error || 'Chat indisponível', 'disconnected');
+        });
+
+        this.socket.on('messages_delivered', (data) => {
+            if (data.chat_id !== this.activeChatId) return;
+            data.message_ids.forEach(id => this.setMessageState(id, 'delivered'));
+        });
+
+        this.socket.on('messages_read', (data) => {
+            if (data.chat_id !== this.activeChatId) return;
+            document.querySelectorAll('#chatMessages .message.sent').forEach(el => {
+                this.setMessageState(el.dataset.messageId, 'read');
             });
+        });
+    }
+
+    static setStatus(text, state) {
+        const statusElement = document.getElementById('chatStatus');
+        if (statusElement) {
+            statusElement.textContent = text;
+            statusElement.className = `chat-status ${state}`;
         }
     }
-    
-    static async loadInitialState() {
+
+    // =========================================================================
+    // CONVERSAS
+    // =========================================================================
+
+    static async loadConversations() {
         try {
-            // Carregar conversas
-            await this.loadConversations();
-            
-            // Simular conexão WebSocket
-            this.simulateWebSocketConnection();
-            
+            const response = await fetch('/api/chat/conversations', { credentials: 'include' });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+            this.conversations = await response.json();
+            this.displayConversations();
         } catch (error) {
-            Logger.error('CHAT', 'Erro ao carregar estado inicial', error);
+            console.error('Erro ao carregar conversas:', error);
+            NotificationSystem.show('Erro ao carregar conversas', 'error');
         }
     }
-    
-    static async loadConversations() {
-        // Simular carregamento de conversas
-        const conversations = await this.getMockConversations();
-        this.displayConversations(conversations);
-    }
-    
-    static async getMockConversations() {
-        await Utils.sleep(1000); // Simular delay
-        
-        return [
-            {
-                id: 1,
-                otherUser: 'João Eletricista',
-                lastMessage: 'Olá! Posso começar o serviço amanhã às 9h...',
-                timestamp: new Date(Date.now() - 300000), // 5 minutos atrás
-                unread: 3,
-                userType: 'professional'
-            },
-            {
-                id: 2, 
-                otherUser: 'Maria Encanadora',
-                lastMessage: 'O material já chegou, podemos marcar...',
-                timestamp: new Date(Date.now() - 86400000), // 1 dia atrás
-                unread: 0,
-                userType: 'professional'
-            },
-            {
-                id: 3,
-                otherUser: 'Carlos Cliente',
-                lastMessage: 'Preciso verificar o orçamento...',
-                timestamp: new Date(Date.now() - 172800000), // 2 dias atrás
-                unread: 1,
-                userType: 'client'
-            }
-        ];
-    }
-    
-    static displayConversations(conversations) {
+
+    static displayConversations() {
         const chatList = document.getElementById('chatList');
         if (!chatList) return;
-        
-        if (!conversations || conversations.length === 0) {
+
+        const searchInput = document.getElementById('chatSearch');
+        const term = searchInput ? searchInput.value.trim().toLowerCase() : '';
+        const conversations = this.conversations.filter(conv =>
+            !term || conv.other_user.toLowerCase().includes(term)
+        );
+
+        if (conversations.length === 0) {
             chatList.innerHTML = this.getEmptyConversationsHTML();
             return;
         }
-        
+
         chatList.innerHTML = conversations.map(conv => this.getConversationHTML(conv)).join('');
-        
+
         // Adicionar event listeners para as conversas
-        this.setupConversationListeners();
+        chatList.querySelectorAll('.conversation-item').forEach(item => {
+            item.addEventListener('click', () => this.openConversation(item.dataset.chatId));
+        });
     }
-    
+
     static getConversationHTML(conversation) {
-        const time = Utils.formatTime(conversation.timestamp);
-        const unreadBadge = conversation.unread > 0 ? 
+        const time = this.formatTime(conversation.timestamp);
+        const activeClass = conversation.id === this.activeChatId ? ' active' : '';
+        const unreadBadge = conversation.unread > 0 ?
             `<span class="unread-badge">${conversation.unread}</span>` : '';
-        
+
         return `
-            <div class="conversation-item" data-chat-id="${conversation.id}">
+            <div class="conversation-item${activeClass}" data-chat-id="${conversation.id}">
                 <div class="conversation-avatar">
                     <i class="fas fa-user"></i>
                 </div>
                 <div class="conversation-info">
                     <div class="conversation-header">
-                        <h3>${conversation.otherUser}</h3>
+                        <h3>${this.escapeHTML(conversation.other_user)}</h3>
                         <span class="conversation-time">${time}</span>
                     </div>
-                    <p class="conversation-preview">${conversation.lastMessage}</p>
+                    <p class="conversation-preview">${this.escapeHTML(conversation.last_message)}</p>
                     ${unreadBadge}
                 </div>
             </div>
         `;
     }
-    
+
     static getEmptyConversationsHTML() {
         return `
             <div class="chat-list-empty">
@@ -143,107 +195,123 @@ class ChatSystem {
             </div>
         `;
     }
-    
-    static setupConversationListeners() {
-        const conversationItems = document.querySelectorAll('.conversation-item');
-        conversationItems.forEach(item => {
-            item.addEventListener('click', () => {
-                const chatId = item.dataset.chatId;
-                this.openConversation(chatId);
-            });
-        });
-    }
-    
+
     static async openConversation(chatId) {
-        Logger.log('CHAT', `Abrindo conversa ${chatId}`);
-        
-        // Marcar como ativa
-        document.querySelectorAll('.conversation-item').forEach(item => {
-            item.classList.remove('active');
-        });
-        document.querySelector(`[data-chat-id="${chatId}"]`).classList.add('active');
-        
-        // Carregar mensagens
+        if (this.socket && this.activeChatId && this.activeChatId !== chatId) {
+            this.socket.emit('leave_chat', { chat_id: this.activeChatId });
+        }
+        this.activeChatId = chatId;
+
+        const conversation = this.conversations.find(conv => conv.id === chatId);
+        const title = document.getElementById('chatTitle');
+        if (title && conversation) {
+            title.textContent = conversation.other_user;
+        }
+
+        // Entrar na sala antes de carregar o histórico para não perder mensagens
+        if (this.socket) {
+            this.socket.emit('join_chat', { chat_id: chatId }, (ack) => {
+                if (ack && ack.success) {
+                    this.markRead(chatId);
+                    this.activateChatArea();
+                } else {
+                    NotificationSystem.show((ack && ack.error) || 'Erro ao abrir conversa', 'error');
+                }
+            });
+        }
+
         await this.loadMessages(chatId);
-        
-        // Ativar área de mensagens
-        this.activateChatArea();
+        this.displayConversations();
     }
-    
-    static async loadMessages(chatId) {
-        // Simular carregamento de mensagens
-        const messages = await this.getMockMessages(chatId);
-        this.displayMessages(messages);
-    }
-    
-    static async getMockMessages(chatId) {
-        await Utils.sleep(800); // Simular delay
-        
-        const currentUser = AuthSystem.getCurrentUser();
-        
-        return [
-            {
-                id: 1,
-                content: 'Olá! Gostaria de saber se você está disponível para um serviço de instalação elétrica.',
-                sender_id: currentUser.id === 2 ? 2 : 1,
-                created_at: new Date(Date.now() - 3600000) // 1 hora atrás
-            },
-            {
-                id: 2,
-                content: 'Bom dia! Sim, estou disponível. Pode me dar mais detalhes sobre o serviço?',
-                sender_id: currentUser.id === 2 ? 1 : 2,
-                created_at: new Date(Date.now() - 3540000) // 59 minutos atrás
-            },
-            {
-                id: 3,
-                content: 'Preciso instalar o quadro elétrico e pontos de luz na minha nova casa. São 3 quartos, sala e cozinha.',
-                sender_id: currentUser.id === 2 ? 2 : 1,
-                created_at: new Date(Date.now() - 3480000) // 58 minutos atrás
-            },
-            {
-                id: 4,
-                content: 'Perfeito! Posso fazer uma visita técnica hoje à tarde para ver o local e passar o orçamento.',
-                sender_id: currentUser.id === 2 ? 1 : 2,
-                created_at: new Date(Date.now() - 3420000) // 57 minutos atrás
+
+    static async startNewConversation() {
+        const username = prompt('Nome de usuário com quem deseja conversar:');
+        if (!username) return;
+
+        try {
+            const response = await fetch('/api/chat/conversations', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                credentials: 'include',
+                body: JSON.stringify({ username: username.trim() })
+            });
+            const result = await response.json();
+
+            if (!response.ok || !result.success) {
+                NotificationSystem.show(result.error || 'Erro ao iniciar conversa', 'error');
+                return;
             }
-        ];
+
+            await this.loadConversations();
+            this.openConversation(result.chat_id);
+        } catch (error) {
+            console.error('Erro ao iniciar conversa:', error);
+            NotificationSystem.show('Erro de conexão', 'error');
+        }
     }
-    
+
+    // =========================================================================
+    // MENSAGENS
+    // =========================================================================
+
+    static async loadMessages(chatId) {
+        try {
+            const response = await fetch(`/api/chat/conversations/${chatId}/messages`, { credentials: 'include' });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+            const messages = await response.json();
+            this.displayMessages(messages);
+        } catch (error) {
+            console.error('Erro ao carregar mensagens:', error);
+            NotificationSystem.show('Erro ao carregar mensagens', 'error');
+        }
+    }
+
     static displayMessages(messages) {
         const chatMessages = document.getElementById('chatMessages');
         if (!chatMessages) return;
-        
+
         if (!messages || messages.length === 0) {
             chatMessages.innerHTML = this.getWelcomeMessageHTML();
             return;
         }
-        
-        const currentUser = AuthSystem.getCurrentUser();
-        const messagesHTML = messages.map(msg => 
-            this.getMessageHTML(msg, currentUser.id)
-        ).join('');
-        
-        chatMessages.innerHTML = messagesHTML;
-        
-        // Scroll para baixo
+
+        chatMessages.innerHTML = messages.map(msg => this.getMessageHTML(msg)).join('');
         this.scrollToBottom();
     }
-    
-    static getMessageHTML(message, currentUserId) {
-        const isOwn = message.sender_id === currentUserId;
-        const messageClass = isOwn ? 'message own' : 'message other';
-        const time = Utils.formatTime(message.created_at);
-        
+
+    static getMessageHTML(message) {
+        const isOwn = message.sender_id === this.currentUserId;
+        const messageClass = isOwn ? 'message sent' : 'message received';
+        const time = this.formatTime(message.created_at);
+        const state = isOwn ? this.getStateIcon(message.is_read ? 'read' : (message.delivered_at ? 'delivered' : 'sent')) : '';
+
         return `
-            <div class="${messageClass}">
+            <div class="${messageClass}" data-message-id="${message.id}">
                 <div class="message-content">
-                    <div class="message-text">${message.content}</div>
-                    <div class="message-time">${time}</div>
+                    <p class="message-text">${this.escapeHTML(message.content)}</p>
+                    <span class="message-time">${time} <span class="message-state">${state}</span></span>
                 </div>
             </div>
         `;
     }
-    
+
+    static getStateIcon(state) {
+        const icons = {
+            'sent': '<i class="fas fa-check"></i>',
+            'delivered': '<i class="fas fa-check-double"></i>',
+            'read': '<i class="fas fa-check-double" style="color: var(--primary-color, #2563eb)"></i>'
+        };
+        return icons[state] || '';
+    }
+
+    static setMessageState(messageId, state) {
+        const element = document.querySelector(`[data-message-id="${messageId}"] .message-state`);
+        if (element) {
+            element.innerHTML = this.getStateIcon(state);
+        }
+    }
+
     static getWelcomeMessageHTML() {
         return `
             <div class="chat-welcome">
@@ -253,114 +321,143 @@ class ChatSystem {
             </div>
         `;
     }
-    
+
     static activateChatArea() {
         const messageInput = document.getElementById('chatMessageInput');
         const sendButton = document.getElementById('sendMessageBtn');
-        
+
         if (messageInput && sendButton) {
             messageInput.disabled = false;
             sendButton.disabled = false;
             messageInput.focus();
         }
     }
-    
+
     static sendMessage() {
         const messageInput = document.getElementById('chatMessageInput');
-        const message = messageInput.value.trim();
-        
-        if (!message) return;
-        
-        // Adicionar mensagem localmente
-        this.addMessageToChat(message, true);
-        
-        // Limpar input
+        const content = messageInput.value.trim();
+
+        if (!content || !this.activeChatId || !this.socket) return;
+
         messageInput.value = '';
-        
-        // Simular resposta após delay
-        setTimeout(() => {
-            this.simulateReply();
-        }, 1000 + Math.random() * 2000);
+
+        // O ack confirma que a mensagem foi persistida no servidor
+        this.socket.emit('send_message', { chat_id: this.activeChatId, content }, (ack) => {
+            if (ack && ack.success) {
+                this.appendMessage(ack.message);
+                this.updateConversationPreview(ack.message, false);
+            } else {
+                messageInput.value = content;
+                NotificationSystem.show((ack && ack.error) || 'Erro ao enviar mensagem', 'error');
+            }
+        });
     }
-    
-    static addMessageToChat(content, isOwn = true) {
+
+    static handleIncomingMessage(message) {
+        // Confirmar entrega ao remetente
+        this.socket.emit('message_delivered', { chat_id: message.chat_id, message_ids: [message.id] });
+
+        const isActive = message.chat_id === this.activeChatId;
+        if (isActive) {
+            this.appendMessage(message);
+            if (!document.hidden) {
+                this.markRead(message.chat_id);
+            }
+        }
+
+        if (!this.conversations.some(conv => conv.id === message.chat_id)) {
+            // Conversa nova iniciada pelo outro usuário
+            this.loadConversations();
+            return;
+        }
+        this.updateConversationPreview(message, !isActive || document.hidden);
+    }
+
+    static appendMessage(message) {
         const chatMessages = document.getElementById('chatMessages');
         if (!chatMessages) return;
-        
+
         // Remover mensagem de boas-vindas se existir
         const welcomeMsg = chatMessages.querySelector('.chat-welcome');
         if (welcomeMsg) {
             welcomeMsg.remove();
         }
-        
-        const currentUser = AuthSystem.getCurrentUser();
-        const message = {
-            id: Date.now(),
-            content: content,
-            sender_id: isOwn ? currentUser.id : (currentUser.id === 2 ? 1 : 2),
-            created_at: new Date()
-        };
-        
-        const messageHTML = this.getMessageHTML(message, currentUser.id);
-        chatMessages.insertAdjacentHTML('beforeend', messageHTML);
-        
-        // Scroll para baixo
+
+        chatMessages.insertAdjacentHTML('beforeend', this.getMessageHTML(message));
         this.scrollToBottom();
     }
-    
-    static simulateReply() {
-        const replies = [
-            'Entendi! Posso ajudar com isso.',
-            'Que ótimo! Quando você gostaria de agendar?',
-            'Preciso de mais algumas informações para orçar o serviço.',
-            'Posso verificar isso e retorno em breve.',
-            'Excelente! Vamos combinar os detalhes.'
-        ];
-        
-        const randomReply = replies[Math.floor(Math.random() * replies.length)];
-        this.addMessageToChat(randomReply, false);
+
+    static updateConversationPreview(message, incrementUnread) {
+        const conversation = this.conversations.find(conv => conv.id === message.chat_id);
+        if (!conversation) return;
+
+        conversation.last_message = message.content;
+        conversation.timestamp = message.created_at;
+        if (incrementUnread) {
+            conversation.unread = (conversation.unread || 0) + 1;
+        }
+
+        // Conversa com atividade recente sobe para o topo
+        this.conversations = [conversation, ...this.conversations.filter(conv => conv !== conversation)];
+        this.displayConversations();
+    }
+
+    static markRead(chatId) {
+        if (!this.socket) return;
+        this.socket.emit('mark_read', { chat_id: chatId });
+
+        const conversation = this.conversations.find(conv => conv.id === chatId);
+        if (conversation && conversation.unread) {
+            conversation.unread = 0;
+            this.displayConversations();
+        }
     }
-    
+
     static scrollToBottom() {
         const chatMessages = document.getElementById('chatMessages');
         if (chatMessages) {
             chatMessages.scrollTop = chatMessages.scrollHeight;
         }
     }
-    
-    static simulateWebSocketConnection() {
-        // Simular status de conexão
-        const statusElement = document.getElementById('chatStatus');
-        if (statusElement) {
-            statusElement.textContent = 'Conectado';
-            statusElement.className = 'chat-status connected';
-        }
-    }
-    
-    static startNewConversation() {
-        NotificationSystem.info('Funcionalidade de nova conversa em desenvolvimento');
-    }
-    
+
     static open() {
-        if (!AuthSystem.isLoggedIn()) {
-            NotificationSystem.warning('Faça login para usar o chat');
-            ModalSystem.open('loginModal');
+        if (!this.root) return;
+
+        if (!this.currentUserId) {
+            NotificationSystem.show('Faça login para usar o chat', 'warning');
             return;
         }
-        
-        const chatInterface = document.getElementById('chatInterface');
-        if (chatInterface) {
-            chatInterface.classList.remove('hidden');
-            this.loadInitialState();
-        }
+
+        this.root.classList.remove('hidden');
+        this.start();
     }
-    
+
     static close() {
-        const chatInterface = document.getElementById('chatInterface');
-        if (chatInterface) {
-            chatInterface.classList.add('hidden');
+        if (this.root) {
+            this.root.classList.add('hidden');
         }
     }
+
+    // =========================================================================
+    // UTILITÁRIOS
+    // =========================================================================
+
+    static formatTime(value) {
+        if (!value) return '';
+        const date = new Date(value.endsWith && !value.endsWith('Z') ? `${value}Z` : value);
+        const now = new Date();
+
+        if (date.toDateString() === now.toDateString()) {
+            return date.toLocaleTimeString('pt-MZ', { hour: '2-digit', minute: '2-digit' });
+        }
+        return date.toLocaleDateString('pt-MZ', { day: '2-digit', month: 'short' });
+    }
+
+    static escapeHTML(text) {
+        const div = document.createElement('div');
+        div.textContent = text || '';
+        return div.innerHTML;
+    }
 }
 
 // Inicializar chat quando o DOM estiver pronto
@@ -369,6 +466,7 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 // Funções globais para HTML
+window.ChatSystem = ChatSystem;
 window.showChat = () => ChatSystem.open();
 window.closeChat = () => ChatSystem.close();
-window.startNewChat = () => ChatSystem.startNewConversation();
\ No newline at end of file
+window.startNewChat = () => ChatSystem.startNewConversation();
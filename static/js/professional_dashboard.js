@@ -23,6 +23,49 @@ class ProfessionalDashboard {
         await this.loadCategories();
         this.setupEventListeners();
         this.setupModalHandlers();
+        this.setupRealtime();
+        this.updateUI();
+    }
+
+    setupRealtime() {
+        // Socket.IO indisponível (ex: serverless): o polling continua a funcionar
+        if (typeof io === 'undefined') return;
+
+        this.socket = io({ withCredentials: true });
+        let wasDisconnected = false;
+
+        this.socket.on('connect', () => {
+            // Ressincronizar uma vez após uma queda para recuperar eventos perdidos
+            if (wasDisconnected) {
+                this.loadDashboardData().then(() => this.updateUI());
+            }
+        });
+        this.socket.on('disconnect', () => { wasDisconnected = true; });
+        this.socket.on('service_updated', (update) => this.applyServiceUpdate(update));
+    }
+
+    applyServiceUpdate(update) {
+        const service = this.services.find(s => s.id === update.id);
+        if (!service) {
+            // Serviço fora da lista atual: recarregar os dados
+            this.loadDashboardData().then(() => this.updateUI());
+            return;
+        }
+
+        const activeStatuses = ['pending', 'in_progress', 'accepted', 'confirmed'];
+        const wasActive = activeStatuses.includes(service.status);
+        const isActive = activeStatuses.includes(update.status);
+
+        service.status = update.status;
+        if (this.stats && wasActive !== isActive) {
+            this.stats.activeServices = Math.max(0, (this.stats.activeServices || 0) + (isActive ? 1 : -1));
+        }
+
+        // Serviços que saíram do estado ativo deixam a agenda
+        if (!isActive) {
+            this.schedule = this.schedule.filter(item => item.id !== update.id);
+        }
+
         this.updateUI();
     }
 
@@ -50,29 +93,19 @@ class ProfessionalDashboard {
 
     async loadDashboardData() {
         try {
-            // Carregar todos os dados em paralelo
-            const [statsResponse, servicesResponse, reviewsResponse, scheduleResponse] = await Promise.all([
-                fetch('/api/professional/stats', { credentials: 'include' }),
-                fetch('/api/professional/services', { credentials: 'include' }),
-                fetch('/api/professional/reviews', { credentials: 'include' }),
-                fetch('/api/professional/schedule', { credentials: 'include' })
-            ]);
-
-            if (statsResponse.ok) {
-                const statsData = await statsResponse.json();
-                this.stats = statsData.stats || {};
-            }
-
-            if (servicesResponse.ok) {
-                this.services = await servicesResponse.json();
-            }
-
-            if (reviewsResponse.ok) {
-                this.reviews = await reviewsResponse.json();
-            }
+            // Stats, serviços, avaliações e agenda numa única requisição
+            // Revalidação condicional (ETag): respostas 304 reutilizam o cache do navegador
+            const response = await fetch('/api/professional/dashboard', {
+                credentials: 'include',
+                cache: 'no-cache'
+            });
 
-            if (scheduleResponse.ok) {
-                this.schedule = await scheduleResponse.json();
+            if (response.ok) {
+                const data = await response.json();
+                this.stats = data.stats || {};
+                this.services = data.services || [];
+                this.reviews = data.reviews || [];
+                this.schedule = data.schedule || [];
             }
 
         } catch (error) {
@@ -131,8 +164,9 @@ class ProfessionalDashboard {
             }
         });
 
-        // Atualização automática a cada 30 segundos
+        // Atualização automática a cada 30 segundos (apenas sem tempo real)
         setInterval(() => {
+            if (this.socket && this.socket.connected) return;
             this.loadDashboardData().then(() => this.updateUI());
         }, 30000);
 
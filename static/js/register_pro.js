@@ -455,13 +455,34 @@ class RegisterProfessionalSystem {
         if (username.length < 3) return;
 
         try {
-            // Simulação de verificação - implementar chamada API real
             const response = await fetch(`/api/check-username?username=${encodeURIComponent(username)}`);
             const data = await response.json();
             
+            // Limite de pedidos (429), servidor degradado (503) ou erro: sem
+            // resposta definitiva, o campo fica neutro (o registro valida de novo)
+            if (!response.ok || typeof data.available !== 'boolean') {
+                this.clearFieldValidation('username');
+                return;
+            }
+            
             this.toggleFieldValidation('username', data.available, data.message || 'Nome de usuário já está em uso.');
         } catch (error) {
             console.error('Erro ao verificar username:', error);
+            this.clearFieldValidation('username');
+        }
+    }
+
+    /**
+     * Remove o estado de validação de um campo
+     */
+    static clearFieldValidation(fieldId) {
+        const field = document.getElementById(fieldId);
+        if (!field) return;
+
+        field.classList.remove('is-valid', 'is-invalid');
+        const existingError = field.parentNode.querySelector('.invalid-feedback');
+        if (existingError) {
+            existingError.remove();
         }
     }
 }
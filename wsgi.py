@@ -4,7 +4,9 @@
 
 from app import init_app  # ✅ importa a função que cria o app Flask
 
-# Inicializa a aplicação Flask configurada
+# Inicializa a aplicação Flask configurada. Na Vercel (ou com DEFERRED_INIT=true)
+# não há I/O no database aqui: o cliente MongoDB conecta sob demanda e o
+# bootstrap do schema acontece no primeiro request
 app = init_app()
 
 # ✅ Exporta o app para o Vercel